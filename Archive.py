@@ -0,0 +1,336 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+from Classes import LazyTable, save_data
+from Columnar import load_guest_table
+from Indexes import parse_date
+from RecordFormat import FormatError, dumps, loads
+from Storage import file_lock, save_table_locked
+
+# Records of past seasons live in guests.pkl.archive next to guests.pkl and are never rewritten
+# record by record: archiving more of them writes a new archive file and swaps it in.
+ARCHIVE_SUFFIX = ".archive"
+
+# An archive is ARCHIVE_MAGIC, every record encoded with RecordFormat back to back, the sorted record
+# IDs (int64) and the offset of every record plus the end of the last one (uint64), and a footer of
+# (offset of the IDs, record count, CRC32 of IDs and offsets). Numbers are little-endian.
+ARCHIVE_MAGIC = b"RFARCH1\n"
+_FOOTER = struct.Struct("<QQI")
+
+
+class ArchiveError(Exception):
+    """An archived record was about to be deleted; archived records are read-only."""
+
+
+def archive_path(file_path):
+    return file_path + ARCHIVE_SUFFIX
+
+
+class ArchiveFile:
+    """Read-only, memory-mapped archive answering lookups by record ID without loading the records.
+
+    Opening it maps the file and checks its index; a record is only decoded when it is read, so an
+    archive costs about 16 bytes of address space per record until then, and no Python objects.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            self.stat = os.fstat(file.fileno())
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC or len(self.map) < len(ARCHIVE_MAGIC) + _FOOTER.size:
+            self.map.close()
+            raise FormatError(f"{file_path} is not an archive")
+        index_offset, self.count, checksum = _FOOTER.unpack_from(self.map, len(self.map) - _FOOTER.size)
+        index_end = index_offset + 8 * (2 * self.count + 1)
+        if index_end != len(self.map) - _FOOTER.size or zlib.crc32(self.map[index_offset:index_end]) != checksum:
+            self.map.close()
+            raise FormatError(f"The index of {file_path} is corrupt")
+        self.keys = self._numbers(index_offset, self.count, 'q')
+        self.offsets = self._numbers(index_offset + 8 * self.count, self.count + 1, 'Q')
+
+    def _numbers(self, offset, count, typecode):
+        view = memoryview(self.map)[offset:offset + 8 * count]
+        if sys.byteorder == "little":
+            return view.cast(typecode)  # read straight from the mapped file
+        numbers = array(typecode, view)
+        view.release()
+        numbers.byteswap()
+        return numbers
+
+    def position(self, key):
+        # Index of key in self.keys, or None
+        if type(key) is not int:
+            return None
+        index = bisect_left(self.keys, key)
+        return index if index < self.count and self.keys[index] == key else None
+
+    def __contains__(self, key):
+        return self.position(key) is not None
+
+    def __getitem__(self, key):
+        index = self.position(key)
+        if index is None:
+            raise KeyError(key)
+        return loads(self.map[self.offsets[index]:self.offsets[index + 1]])
+
+    def encoded(self, index):
+        return self.map[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self):
+        return self.count
+
+    def changed_on_disk(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) != (self.stat.st_ino, self.stat.st_mtime_ns,
+                                                                  self.stat.st_size)
+
+    def close(self):
+        # Closing twice is harmless, see archive_records
+        for numbers in (self.keys, self.offsets):
+            if isinstance(numbers, memoryview):
+                numbers.release()
+        self.map.close()
+
+
+def write_archive(file_path, records):
+    """Write (key, RecordFormat-encoded record) pairs as a new archive, replacing any old one at once.
+
+    Returns the number of bytes written.
+    """
+    records = sorted(records, key=lambda item: item[0])
+    keys, offsets = array('q'), array('Q')
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(ARCHIVE_MAGIC)
+        for key, encoded in records:
+            keys.append(key)
+            offsets.append(file.tell())
+            file.write(encoded)
+        offsets.append(file.tell())
+        index_offset = file.tell()
+        if sys.byteorder != "little":
+            keys.byteswap()
+            offsets.byteswap()
+        index = keys.tobytes() + offsets.tobytes()
+        file.write(index)
+        file.write(_FOOTER.pack(index_offset, len(records), zlib.crc32(index)))
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(temporary_path, file_path)
+    return size
+
+
+class ArchivedTable(MutableMapping):
+    """A table's live records layered over its read-only archive of older ones.
+
+    Reads look in the live table first, then in the archive. Writes go to the live table, so a
+    modified archived record becomes live again and shadows its archived copy; archived records
+    cannot be deleted. Saving only ever writes the live table.
+    """
+    def __init__(self, live, file_path):
+        self.live = live
+        self.file_path = file_path
+        self.archive = ArchiveFile(archive_path(file_path))
+        self._shadowed = None  # live keys that are archived too, see shadowed
+
+    @property
+    def shadowed(self):
+        # Counted once, when first needed, then kept up to date by every write that can change it;
+        # records merged in from other processes are accounted for when they are drained
+        if self._shadowed is None:
+            archive = self.archive
+            self._shadowed = {key for key in self.live if key in archive}
+        return self._shadowed
+
+    def _reshadow(self, keys):
+        if self._shadowed is not None:
+            for key in keys:
+                if key in self.live and key in self.archive:
+                    self._shadowed.add(key)
+                else:
+                    self._shadowed.discard(key)
+
+    @property
+    def loaded(self):
+        return getattr(self.live, "loaded", True)
+
+    def is_archived(self, key):
+        # Stored only in the archive, i.e. not modified since it was archived
+        return key in self.archive and key not in self.live
+
+    def __getitem__(self, key):
+        try:
+            return self.live[key]
+        except KeyError:
+            return self.archive[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self.live[key] = value
+        if self._shadowed is not None and key in self.archive:
+            self._shadowed.add(key)
+
+    def __delitem__(self, key):
+        if key in self.archive:
+            raise ArchiveError(f"Record {key} is archived and cannot be deleted")
+        del self.live[key]
+
+    def __contains__(self, key):
+        return key in self.live or key in self.archive
+
+    def __iter__(self):
+        # Archived records first, oldest ID first, then the live ones
+        archive = self.archive
+        yield from archive.keys
+        for key in self.live:
+            if key not in archive:
+                yield key
+
+    def __len__(self):
+        return len(self.archive) + len(self.live) - len(self.shadowed)
+
+    def items(self):
+        # The live records are copied in one step (see JournaledDict.items), so a record merged in
+        # by the save thread cannot disappear between listing its key and reading it
+        live = dict(self.live.items())
+        archive = self.archive
+        for key in archive.keys:
+            yield key, live[key] if key in live else archive[key]
+        for key, record in live.items():
+            if key not in archive:
+                yield key, record
+
+    def values(self):
+        return (record for _, record in self.items())
+
+    # Saving and change tracking apply to the live records only
+
+    def commit(self):
+        # save_table calls this instead of writing the view (and with it the archive) to the live file
+        return save_data(self.live, self.file_path)
+
+    def pending_changes(self):
+        return self.live.pending_changes() if self.loaded else 0
+
+    def touch(self, key):
+        self.live.touch(key)
+
+    def drain_merged(self):
+        # Another process may have archived more records: switch to the new archive file first
+        if self.archive.changed_on_disk():
+            self.reopen()
+        merged = self.live.drain_merged() if self.loaded else set()
+        self._reshadow(merged)
+        return merged
+
+    def reopen(self):
+        old, self.archive = self.archive, ArchiveFile(archive_path(self.file_path))
+        old.close()
+        self._shadowed = None
+
+
+def with_archive(data, file_path):
+    """Return data layered over file_path's archive if one exists, otherwise data itself."""
+    if os.path.exists(archive_path(file_path)):
+        return ArchivedTable(data, file_path)
+    return data
+
+
+def archive_records(data, file_path, keys):
+    """Move the records of data with the given IDs from the live table into file_path's archive.
+
+    data is the table as the GUI holds it (live, or already an ArchivedTable); returns the
+    ArchivedTable to use from now on. Everything from catching up with other processes to saving
+    the moved records' deletion happens under the table's exclusive lock, so no other archiver or
+    save can come in between. Records no longer live by then are skipped. Raises ConflictError,
+    before anything is moved, when edits made here lost a conflict while catching up.
+    """
+    path = archive_path(file_path)
+    table = data if isinstance(data, ArchivedTable) else None
+    live = table.live if table is not None else data
+    journaled = live.data if isinstance(live, LazyTable) else live
+    with file_lock(file_path):
+        save_table_locked(journaled, file_path)  # local edits, and what other processes saved meanwhile
+        if table is None and os.path.exists(path):
+            table = ArchivedTable(live, file_path)  # another process archived first
+        elif table is not None and table.archive.changed_on_disk():
+            table.reopen()
+        keys = [key for key in keys if key in live]
+        records = {}
+        if table is not None:
+            records = {key: table.archive.encoded(index) for index, key in enumerate(table.archive.keys)}
+        records.update((key, dumps(live[key])) for key in keys)
+        if table is not None:
+            table.archive.close()  # a mapped file cannot be replaced on Windows
+        try:
+            write_archive(path, records.items())
+        finally:
+            if table is not None:
+                table.reopen()  # the new archive, or the old one again if writing failed
+        if table is None:
+            table = ArchivedTable(live, file_path)
+        for key in keys:
+            del live[key]
+        save_table_locked(journaled, file_path)
+    return table
+
+
+def live_records(data):
+    """The records of data that are live: data itself, or the live table under an ArchivedTable.
+
+    Indexes summing over a table's records (capacity, costs, rollups) cover only these, so building
+    them never decodes the archive: archived records belong to past seasons.
+    """
+    return data.live if isinstance(data, ArchivedTable) else data
+
+
+def past_season_keys(events, guests, cutoff):
+    """IDs of the live events dated before cutoff (YYYY-MM-DD) and of the live guests of those events."""
+    cutoff_day = parse_date(cutoff)
+    if cutoff_day is None:
+        raise ValueError(f"{cutoff!r} is not a YYYY-MM-DD date")
+    events, guests = live_records(events), live_records(guests)
+    event_keys = []
+    for key, event in events.items():
+        day = parse_date(event.get('date', ''))
+        if day is not None and day < cutoff_day:
+            event_keys.append(key)
+    archived = set(event_keys)
+    guest_keys = [key for key, guest in guests.items() if guest.event_id in archived]
+    return event_keys, guest_keys
+
+
+if __name__ == "__main__":
+    # python Archive.py YYYY-MM-DD: archive the events before that date and their guests
+    if len(sys.argv) != 2:
+        print("Usage: python Archive.py YYYY-MM-DD")
+        sys.exit(2)
+    tables = {"events": with_archive(LazyTable("events.pkl"), "events.pkl"),
+              "guests": with_archive(LazyTable("guests.pkl", loader=load_guest_table), "guests.pkl")}
+    try:
+        event_keys, guest_keys = past_season_keys(tables["events"], tables["guests"], sys.argv[1])
+    except ValueError as error:
+        print(error)
+        sys.exit(2)
+    for name, keys in (("events", event_keys), ("guests", guest_keys)):
+        if keys:
+            archive_records(tables[name], f"{name}.pkl", keys)
+        print(f"Archived {len(keys)} {name}")
@@ -0,0 +1,312 @@
+import json
+import os
+import pickle
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from Classes import (TABLE_FIELDS, Client, Employee, Event, EventType, Guest, JobTitle, Supplier, Venue,
+                     load_data, record_to_row, save_data)
+from Columnar import GuestTable, load_guest_table
+from Indexes import SEARCH_FIELDS, TableIndex
+import RecordFormat
+from Storage import JournaledDict, SequenceAllocator
+
+# Arguments used to build the i-th synthetic record of each entity class
+SAMPLE_RECORDS = {
+    Employee: lambda i: (i, f"Employee {i}", "Operations", JobTitle.DESIGNER, 30000 + i),
+    Guest: lambda i: (i, f"First {i}", f"Last {i}", f"guest{i}@example.com"),
+    Supplier: lambda i: (i, f"Supplier {i}", f"supplier{i}@example.com", "Catering Company"),
+    Venue: lambda i: (i, f"Venue {i}", f"{i} Main Street", f"venue{i}@example.com", "50", "300"),
+    Client: lambda i: (i, f"Client {i}", f"{i} High Street", f"client{i}@example.com", 10000 + i),
+    Event: lambda i: (i, "Wedding", f"Theme {i}", "2024-06-01", "18:00", "4", "Venue A", i, [], [], 5000 + i),
+}
+
+
+def legacy_class(cls):
+    # The same class as before __slots__: a plain class whose instances carry a __dict__
+    return type("Legacy" + cls.__name__, (), {"__init__": cls.__init__})
+
+
+def bytes_per_record(cls, make_args, count):
+    args = [make_args(i) for i in range(count)]  # built first so the strings are not counted
+    tracemalloc.start()
+    records = [cls(*arguments) for arguments in args]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size / count
+
+
+def memory_benchmark(count=100000):
+    """Print the bytes per record of every entity class with a per-instance __dict__ and with __slots__."""
+    print(f"{'Class':<10}{'__dict__':>12}{'__slots__':>12}{'saved':>8}")
+    for cls, make_args in SAMPLE_RECORDS.items():
+        before = bytes_per_record(legacy_class(cls), make_args, count)
+        after = bytes_per_record(cls, make_args, count)
+        print(f"{cls.__name__:<10}{before:>12.0f}{after:>12.0f}{1 - after / before:>8.0%}")
+    guest_table_benchmark(count)
+
+
+def guest_table_benchmark(count=100000):
+    # Whole guest list, strings included: a dict of Guest objects against the columnar GuestTable.
+    # Names repeat (500 first names, 2000 last names) but each row gets its own string objects, as after unpickling.
+    def guests():
+        return ((i, Guest(i, f"First {i % 500}", f"Last {i % 2000}", f"guest{i}@example.com", i % 300))
+                for i in range(count))
+
+    tracemalloc.start()
+    as_dict = dict(guests())
+    dict_size, _ = tracemalloc.get_traced_memory()
+    del as_dict
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    as_table = GuestTable(guests())
+    table_size, _ = tracemalloc.get_traced_memory()
+    del as_table
+    tracemalloc.stop()
+    print(f"Guest list of {count}: dict of Guest {dict_size / count:.0f} bytes/guest, "
+          f"GuestTable {table_size / count:.0f} bytes/guest")
+
+
+# Realistic value pools for the synthetic tables
+FIRST_NAMES = ("Olivia", "Liam", "Emma", "Noah", "Amelia", "Oliver", "Ava", "Elijah", "Sophia", "Lucas",
+               "Mia", "Mateo", "Isabella", "Levi", "Aisha", "Omar", "Yuki", "Chen", "Priya", "Arjun")
+LAST_NAMES = ("Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Khan", "Nguyen",
+              "Martinez", "Lopez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Ali", "Tanaka", "Patel")
+DEPARTMENTS = ("Event Planner", "Sales", "Event Director", "Hospitality", "Management", "Operations")
+SERVICE_TYPES = ("Catering Company", "Cleaning Company", "Decorations Company", "Entertainment Company",
+                 "Furniture Supply Company")
+THEMES = ("Rustic", "Vintage", "Beach", "Garden", "Masquerade", "Hollywood", "Tropical", "Winter")
+
+# How many venues, suppliers and clients a table of n events or guests refers to
+RELATED_RECORDS = 200
+
+# Operations repeated to time a single edit, ID or search rather than a whole table
+REPEATS = 50
+
+
+def _person(rng):
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+
+def _event_date(rng):
+    return (date(2024, 1, 1) + timedelta(days=rng.randrange(3 * 365))).isoformat()
+
+
+# Builds the i-th synthetic record of each table, shaped like what the GUI's Add dialogs store
+SYNTHETIC_RECORDS = {
+    "employees": lambda rng, i: Employee(i, " ".join(_person(rng)), rng.choice(DEPARTMENTS),
+                                         rng.choice(list(JobTitle)), rng.randint(30000, 100000)),
+    "guests": lambda rng, i: Guest(i, *_person(rng), f"guest{i}@example.com",
+                                   rng.randint(1, RELATED_RECORDS) if rng.random() < 0.9 else None),
+    "suppliers": lambda rng, i: Supplier(i, f"{rng.choice(LAST_NAMES)} {rng.choice(SERVICE_TYPES)}",
+                                         f"supplier{i}@example.com", rng.choice(SERVICE_TYPES)),
+    "venues": lambda rng, i: Venue(i, f"Venue {i}", f"{rng.randint(1, 999)} Main Street", f"venue{i}@example.com",
+                                   str(rng.choice((10, 20, 50))), str(rng.choice((100, 200, 500)))),
+    "events": lambda rng, i: {'name': f"{rng.choice(LAST_NAMES)} {rng.choice(list(EventType)).value}",
+                              'type': rng.choice(list(EventType)).value, 'date': _event_date(rng),
+                              'venue': f"Venue {rng.randint(1, RELATED_RECORDS)}", 'theme': rng.choice(THEMES),
+                              'invoice': rng.randint(5000, 25000), 'client_id': rng.randint(1, RELATED_RECORDS),
+                              'suppliers': rng.sample(range(1, RELATED_RECORDS + 1), rng.randint(0, 4))},
+    "clients_events": lambda rng, i: {'type': rng.choice(list(EventType)).value, 'date': _event_date(rng),
+                                      'time': f"{rng.randint(9, 20)}:{rng.choice(('00', '30'))}",
+                                      'duration': str(rng.randint(1, 6)),
+                                      'venue': f"Venue {rng.randint(1, RELATED_RECORDS)}",
+                                      'budget': float(rng.randint(5, 60) * 1000)},
+}
+
+# How the GUI loads each data file
+TABLE_LOADERS = {"guests": load_guest_table}
+
+
+def synthetic_table(table, count, seed=0):
+    """Return a JournaledDict of count synthetic records of table, the same for the same seed."""
+    rng = random.Random(f"{seed}-{table}")
+    make_record = SYNTHETIC_RECORDS[table]
+    data = JournaledDict()
+    for i in range(1, count + 1):
+        data[i] = make_record(rng, i)  # assigned one by one so every record is saved as new
+    return data
+
+
+class _StubTreeview:
+    # Just enough of ttk.Treeview for VirtualTreeview when there is no display to create real widgets on
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.rows = {}
+        self.next_item = 0
+
+    def _check(self, values):
+        if len(values) != len(self.columns):
+            raise ValueError(f"A row of {len(values)} values for the {len(self.columns)} columns {self.columns}")
+        return values
+
+    def insert(self, parent, index, values=()):
+        self.next_item += 1
+        item = f"I{self.next_item:06d}"
+        self.rows[item] = self._check(values)
+        return item
+
+    def item(self, item, option=None, **kwargs):
+        if "values" in kwargs:
+            self.rows[item] = self._check(kwargs["values"])
+        return {"values": self.rows[item]}
+
+    def delete(self, *items):
+        for item in items:
+            del self.rows[item]
+
+    def get_children(self, item=""):
+        return tuple(self.rows)
+
+    def selection(self):
+        return ()
+
+    def selection_set(self, items):
+        pass
+
+    def focus(self, item=None):
+        pass
+
+
+class _StubScrollbar:
+    def set(self, first, last):
+        pass
+
+
+@contextmanager
+def headless_treeview(columns, height=20):
+    """Yield (VirtualTreeview, backend) on a hidden Tk window, destroyed afterwards, or on stub widgets
+    when no display is available."""
+    import tkinter as tk
+    from TableView import VirtualTreeview
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        yield VirtualTreeview(None, columns, height, widgets=(_StubTreeview(columns), _StubScrollbar())), "stub"
+        return
+    try:
+        root.withdraw()
+        yield VirtualTreeview(root, columns, height), "tk"
+    finally:
+        root.destroy()
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def table_workflow_benchmark(table, count, directory, seed=0):
+    """Time every workflow of one table at count records; returns {operation: seconds per operation}."""
+    file_path = os.path.join(directory, f"{table}.pkl")
+    loader = TABLE_LOADERS.get(table, load_data)
+    rng = random.Random(seed)
+    results = {}
+
+    results["generate"], data = _timed(synthetic_table, table, count, seed)
+    results["save_full"], _ = _timed(save_data, data, file_path)
+    results["load"], data = _timed(loader, file_path)
+
+    allocator = SequenceAllocator(os.path.join(directory, f"{table}-sequences.pkl"))
+    results["next_id_first"], _ = _timed(allocator.next_id, table, data)  # seeds the sequence from the data
+    seconds, _ = _timed(lambda: [allocator.next_id(table, data) for _ in range(REPEATS)])
+    results["next_id"] = seconds / REPEATS
+
+    keys = rng.sample(list(data.keys()), min(REPEATS, len(data)))
+    with headless_treeview(TABLE_FIELDS[table]) as (view, results["tree_backend"]):
+        row_values = lambda key, record: tuple(record_to_row(table, key, record).values())
+        results["tree_populate"], _ = _timed(view.set_rows, data, row_values)
+        seconds, _ = _timed(lambda: [view.apply_change(key) for key in keys])
+        results["tree_apply_change"] = seconds / len(keys)
+
+    label, field = next(iter(SEARCH_FIELDS[table].items()))
+    results["search_index_build"], index = _timed(TableIndex(table).build, data)
+    prefixes = [str(record_to_row(table, key, data[key])[field])[:3] for key in keys]
+    seconds, _ = _timed(lambda: [index.search(label, prefix) for prefix in prefixes])
+    results["search"] = seconds / len(prefixes)
+
+    # Per-edit persistence: change one record and save, as the GUI's background writer does
+    source = synthetic_table(table, len(keys), seed + 1)
+    seconds = 0.0
+    for key, replacement in zip(keys, source.values()):
+        data[key] = replacement
+        edit_seconds, _ = _timed(save_data, data, file_path)
+        seconds += edit_seconds
+    results["save_one_edit"] = seconds / len(keys)
+    results["file_bytes"] = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+                                if name.startswith(f"{table}.pkl"))
+    return results
+
+
+def workflow_benchmark(counts=(1000, 10000, 100000), tables=tuple(SYNTHETIC_RECORDS), seed=0):
+    """Time load/save, ID allocation, tree population, search and per-edit saves; returns a JSON-ready dict."""
+    report = {
+        "benchmark": "workflows",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": [],
+    }
+    for count in counts:
+        for table in tables:
+            with tempfile.TemporaryDirectory() as directory:
+                results = table_workflow_benchmark(table, count, directory, seed)
+            report["results"].append({"table": table, "records": count, **results})
+            print(f"{table} x {count}: load {results['load']:.3f}s, save one edit "
+                  f"{results['save_one_edit'] * 1000:.2f}ms", file=sys.stderr)
+    return report
+
+
+def format_benchmark(count=100000, tables=tuple(SYNTHETIC_RECORDS), seed=0):
+    """Time encoding and decoding whole tables with pickle and with RecordFormat; returns a JSON-ready dict."""
+    codecs = {
+        "pickle": (lambda value: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+        "recordformat": (RecordFormat.dumps, RecordFormat.loads),
+    }
+    report = {
+        "benchmark": "format",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": [],
+    }
+    for table in tables:
+        records = dict(synthetic_table(table, count, seed))
+        for codec, (encode, decode) in codecs.items():
+            save_seconds, payload = _timed(encode, records)
+            load_seconds, _ = _timed(decode, payload)
+            report["results"].append({"table": table, "records": count, "format": codec, "bytes": len(payload),
+                                      "save_seconds": save_seconds, "load_seconds": load_seconds,
+                                      "save_records_per_second": count / save_seconds,
+                                      "load_records_per_second": count / load_seconds})
+            print(f"{table} {codec}: {len(payload) / count:.0f} bytes/record, "
+                  f"save {save_seconds:.3f}s, load {load_seconds:.3f}s", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    # python Benchmarks.py memory [record count]
+    # python Benchmarks.py workflows [record count ...] > results.json
+    # python Benchmarks.py format [record count] > results.json
+    if sys.argv[1:2] == ["memory"]:
+        memory_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    elif sys.argv[1:2] == ["workflows"]:
+        counts = [int(count) for count in sys.argv[2:]] or [1000, 10000, 100000]
+        print(json.dumps(workflow_benchmark(counts), indent=2))
+    elif sys.argv[1:2] == ["format"]:
+        print(json.dumps(format_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000), indent=2))
+    else:
+        print("Usage: python Benchmarks.py memory [record count]\n"
+              "       python Benchmarks.py workflows [record count ...] > results.json\n"
+              "       python Benchmarks.py format [record count] > results.json")
@@ -0,0 +1,101 @@
+import calendar
+import tkinter as tk
+from datetime import date, timedelta
+from tkinter import messagebox
+
+# Lines of bookings shown inside one day cell before "+n more"
+MONTH_CELL_LINES = 3
+WEEK_CELL_LINES = 12
+
+
+class CalendarView(tk.Frame):
+    """Month or week grid of events and client bookings, read from a DateIndex.
+
+    Moving to another month or week is one range query on the index; the day cells are created
+    once and only their text changes. Double-click a day to list everything booked on it.
+    """
+    def __init__(self, master, date_index, describe):
+        super().__init__(master)
+        self.date_index = date_index
+        self.describe = describe  # describe(table, key) -> one line of text for a booking
+        self.anchor = date.today()
+        self.mode = tk.StringVar(value="month")
+        self.days = {}  # day ordinal -> descriptions of the bookings currently shown
+
+        header = tk.Frame(self)
+        header.pack(fill='x')
+        tk.Button(header, text="<", command=lambda: self.step(-1)).pack(side=tk.LEFT)
+        self.title = tk.Label(header, font=("Arial", 14), width=24)
+        self.title.pack(side=tk.LEFT, padx=10)
+        tk.Button(header, text=">", command=lambda: self.step(1)).pack(side=tk.LEFT)
+        tk.Button(header, text="Today", command=self.today).pack(side=tk.LEFT, padx=10)
+        tk.Radiobutton(header, text="Month", variable=self.mode, value="month", command=self.refresh).pack(side=tk.LEFT)
+        tk.Radiobutton(header, text="Week", variable=self.mode, value="week", command=self.refresh).pack(side=tk.LEFT)
+
+        grid = tk.Frame(self)
+        grid.pack(fill='both', expand=True)
+        for column, name in enumerate(calendar.day_abbr):
+            tk.Label(grid, text=name).grid(row=0, column=column)
+            grid.columnconfigure(column, weight=1, uniform="day")
+        self.cells = []
+        for row in range(6):
+            grid.rowconfigure(row + 1, weight=1)
+            for column in range(7):
+                cell = tk.Label(grid, anchor='nw', justify=tk.LEFT, relief=tk.GROOVE, width=18, height=5)
+                cell.grid(row=row + 1, column=column, sticky='nsew')
+                cell.bind("<Double-Button-1>", lambda event, index=len(self.cells): self.show_day(index))
+                self.cells.append(cell)
+        self.first_day = 0
+        self.refresh()
+
+    def step(self, direction):
+        if self.mode.get() == "week":
+            self.anchor += timedelta(weeks=direction)
+        else:
+            month = self.anchor.month - 1 + direction
+            self.anchor = date(self.anchor.year + month // 12, month % 12 + 1, 1)
+        self.refresh()
+
+    def today(self):
+        self.anchor = date.today()
+        self.refresh()
+
+    def visible_range(self):
+        # First and last day shown, always whole weeks starting on Monday
+        if self.mode.get() == "week":
+            first = self.anchor - timedelta(days=self.anchor.weekday())
+            return first, first + timedelta(days=6)
+        first_of_month = self.anchor.replace(day=1)
+        first = first_of_month - timedelta(days=first_of_month.weekday())
+        return first, first + timedelta(days=41)
+
+    def refresh(self):
+        first, last = self.visible_range()
+        self.first_day = first.toordinal()
+        self.days = {}
+        for day, table, key in self.date_index.range(first.toordinal(), last.toordinal()):
+            self.days.setdefault(day, []).append(self.describe(table, key))
+
+        week = self.mode.get() == "week"
+        if week:
+            self.title.config(text=f"Week of {first:%d %B %Y}")
+        else:
+            self.title.config(text=f"{self.anchor:%B %Y}")
+        lines = WEEK_CELL_LINES if week else MONTH_CELL_LINES
+        for index, cell in enumerate(self.cells):
+            if week and index >= 7:
+                cell.grid_remove()
+                continue
+            cell.grid()
+            day = date.fromordinal(self.first_day + index)
+            bookings = self.days.get(day.toordinal(), [])
+            text = [str(day.day)] + bookings[:lines]
+            if len(bookings) > lines:
+                text.append(f"+{len(bookings) - lines} more")
+            cell.config(text="\n".join(text), height=lines + 2,
+                        fg='black' if week or day.month == self.anchor.month else 'grey')
+
+    def show_day(self, index):
+        day = date.fromordinal(self.first_day + index)
+        bookings = self.days.get(day.toordinal(), [])
+        messagebox.showinfo(f"{day:%A %d %B %Y}", "\n".join(bookings) if bookings else "Nothing booked")
@@ -0,0 +1,98 @@
+from collections import Counter
+
+from Archive import live_records
+from Indexes import normalize
+
+
+def guest_limit(value):
+    # min_guests/max_guests are stored as typed into the venue dialog; None when blank or not a number
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+class CapacityIndex:
+    """Number of guests assigned to each event and the guest bounds of each venue, kept up to date record by record.
+
+    Events name their venue (e.g. "Venue A") rather than referring to a venue ID, so venues are
+    looked up by case-insensitive name. Archived guests and events are left out, see live_records.
+    """
+    def __init__(self):
+        self.counts = Counter()  # event ID -> guests assigned to it
+        self.guest_events = {}   # guest ID -> event ID, for assigned guests only
+        self.venue_names = {}    # venue ID -> normalized name
+        self.bounds = {}         # normalized venue name -> (min guests, max guests)
+
+    def build(self, guests, venues):
+        guests = live_records(guests)
+        assignments = getattr(guests, "event_assignments", None)
+        if assignments is not None:
+            self.guest_events = assignments()  # straight from the columnar GuestTable
+        else:
+            self.guest_events = {guest_id: guest.event_id for guest_id, guest in guests.items()
+                                 if guest.event_id is not None}
+        self.counts = Counter(self.guest_events.values())
+        for venue_id, venue in venues.items():
+            self._set_venue(venue_id, venue)
+        return self
+
+    def apply_change(self, table, key, data):
+        # Re-count one added, modified or deleted guest, or re-read one venue's bounds;
+        # returns the IDs of the events whose guest numbers changed
+        record = data.get(key)
+        if table == "guests":
+            old_event = self.guest_events.pop(key, None)
+            if old_event is not None:
+                self.counts[old_event] -= 1
+            new_event = None if record is None else record.event_id
+            if new_event is not None:
+                self.guest_events[key] = new_event
+                self.counts[new_event] += 1
+            return {old_event, new_event} - {None}
+        if table == "venues":
+            self.bounds.pop(self.venue_names.pop(key, None), None)
+            if record is not None:
+                self._set_venue(key, record)
+        return set()
+
+    def _set_venue(self, venue_id, venue):
+        name = normalize(venue.name)
+        self.venue_names[venue_id] = name
+        self.bounds[name] = (guest_limit(venue.min_guests), guest_limit(venue.max_guests))
+
+    def venue_bounds(self, venue):
+        return self.bounds.get(normalize(venue), (None, None))
+
+    def check_event(self, event_id, venue, extra_guests=0):
+        """Return why event_id's guests (plus extra_guests) do not fit in venue, or None if they do."""
+        count = self.counts[event_id] + extra_guests
+        _, max_guests = self.venue_bounds(venue)
+        if max_guests is not None and count > max_guests:
+            return f"Event {event_id} would have {count} guests but {venue} holds at most {max_guests}"
+        return None
+
+    def check_guest(self, guest_id, event_id, events):
+        """Return why guest_id cannot be assigned to event_id, or None if it can."""
+        if event_id is None:
+            return None
+        event = events.get(event_id)
+        if event is None:
+            return f"No event found with ID: {event_id}"
+        joining = 0 if self.guest_events.get(guest_id) == event_id else 1
+        return self.check_event(event_id, event['venue'], joining)
+
+    def report(self, events):
+        """Check every event against its venue in one pass; returns (event ID, problem) for each violation."""
+        problems = []
+        for event_id, event in live_records(events).items():
+            count = self.counts[event_id]
+            min_guests, max_guests = self.venue_bounds(event['venue'])
+            if max_guests is not None and count > max_guests:
+                problems.append((event_id, f"{count} guests, {event['venue']} holds at most {max_guests}"))
+            elif min_guests is not None and count < min_guests:
+                problems.append((event_id, f"{count} guests, {event['venue']} needs at least {min_guests}"))
+        for event_id, count in self.counts.items():
+            if count and event_id not in events:
+                problems.append((event_id, f"{count} guests assigned to an event that does not exist"))
+        return problems
@@ -1,5 +1,10 @@
-import pickle
+import random
+import sys
+import time
+from collections.abc import MutableMapping
 from enum import Enum
+from RecordFormat import register_enum, register_record
+from Storage import JournaledDict, load_table, save_table
 
 class JobTitle(Enum):
     """Enumeration for job titles within the company."""
@@ -18,8 +23,29 @@ class EventType(Enum):
     THEMED_PARTY = "Themed Party"
     GRADUATION = "Graduation"
 
-class Employee:
+class Record:
+    """Base for the entity classes: attributes live in __slots__ rather than a per-instance __dict__.
+
+    Pickles written before the switch hold the instance __dict__; __setstate__ still accepts them,
+    and any slot missing from the pickled state is set to None.
+    """
+    __slots__ = ()
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            dict_state, slot_state = state
+            state = {**(dict_state or {}), **(slot_state or {})}
+        for name in record_slots(type(self)):
+            setattr(self, name, state.get(name))
+
+def record_slots(cls):
+    # All slot names of a Record class, including those declared by its base classes
+    return [name for klass in reversed(cls.__mro__) for name in getattr(klass, "__slots__", ())]
+
+class Employee(Record):
     """Base class for employees, containing general employee details and functionalities."""
+    __slots__ = ("id", "name", "department", "job_title", "salary")
+
     def __init__(self, id, name, department, job_title: JobTitle, salary):
         self.id = id
         self.name = name
@@ -52,8 +78,13 @@ class Employee:
 
 class Manager(Employee):
     """Specialized class for managers, extending Employee with management-specific attributes."""
+    __slots__ = ("age", "dob", "passport_details", "subordinates")
+
     def __init__(self, id, name, department, job_title: JobTitle, salary, age, dob, passport_details, subordinates=None):
-        super().__init__(id, name, department, job_title, salary, age, dob, passport_details)
+        super().__init__(id, name, department, job_title, salary)
+        self.age = age
+        self.dob = dob
+        self.passport_details = passport_details
         self.subordinates = subordinates if subordinates else []
 
     def add_subordinate(self, employee):
@@ -74,8 +105,11 @@ class Manager(Employee):
     def modify_manager():
         pass  # Implemented in GUI
 
-class Event:
+class Event(Record):
     """Class representing events managed by the company."""
+    __slots__ = ("event_id", "type", "theme", "date", "time", "duration", "venue", "client_id", "suppliers",
+                 "guest_list", "invoice")
+
     def __init__(self, event_id, type: EventType, theme, date, time, duration, venue, client_id, suppliers, guest_list, invoice):
         self.event_id = event_id
         self.type = type
@@ -112,8 +146,10 @@ class Event:
     def modify_event():
         pass  # Implemented in GUI
 
-class Client:
+class Client(Record):
     """Class representing clients who host or sponsor events."""
+    __slots__ = ("client_id", "name", "address", "contact_details", "budget")
+
     def __init__(self, client_id, name, address, contact_details, budget):
         self.client_id = client_id
         self.name = name
@@ -138,19 +174,23 @@ class Client:
     def modify_client():
         pass  # Implemented in GUI
 
-class Guest:
+class Guest(Record):
     """Class representing guests attending the events."""
-    def __init__(self, guest_id, f_name, l_name, contact_details):
+    __slots__ = ("guest_id", "f_name", "l_name", "contact_details", "event_id")
+
+    def __init__(self, guest_id, f_name, l_name, contact_details, event_id=None):
         self.guest_id = guest_id
         self.f_name = f_name
         self.l_name = l_name
         self.contact_details = contact_details
+        self.event_id = event_id  # the event the guest is invited to, if any
 
     def display(self):
         print("Guest ID:", self.guest_id)
         print("First Name:", self.f_name)
         print("Last Name:", self.l_name)
         print("Contact Details:", self.contact_details)
+        print("Event ID:", self.event_id)
 
     # These methods are implemented in the GUI
     def add_guest():
@@ -162,8 +202,10 @@ class Guest:
     def modify_guest():
         pass  # Implemented in GUI
 
-class Supplier:
+class Supplier(Record):
     """Class representing suppliers providing services for events."""
+    __slots__ = ("supplier_id", "name", "contact_details", "service_type")
+
     def __init__(self, supplier_id, name, contact_details, service_type):
         self.supplier_id = supplier_id
         self.name = name
@@ -186,8 +228,10 @@ class Supplier:
     def modify_supplier():
         pass  # Implemented in GUI
 
-class Venue:
+class Venue(Record):
     """Class representing venues where events are held."""
+    __slots__ = ("venue_id", "name", "address", "contact_details", "min_guests", "max_guests")
+
     def __init__(self, venue_id, name, address, contact_details, min_guests, max_guests):
         self.venue_id = venue_id
         self.name = name
@@ -214,16 +258,140 @@ class Venue:
     def modify_venue():
         pass  # Implemented in GUI
 
-# Functions to save and load data using pickle
-def load_data(file_path):
+# How every record class is stored on disk (see RecordFormat.py). When a class's fields change,
+# bump its version here and register a RecordFormat.migration from the previous version.
+for record_class in (Employee, Manager, Event, Client, Guest, Supplier, Venue):
+    register_record(record_class, record_slots(record_class), version=1)
+register_enum(JobTitle)
+register_enum(EventType)
+
+
+# Fields of every table's records in column order, starting with the record ID.
+# Employees, guests, suppliers and venues are objects; events and clients_events are plain dicts.
+# An event's client_id is a clients_events key and its suppliers a list of supplier IDs.
+TABLE_FIELDS = {
+    "employees": ("id", "name", "department", "job_title", "salary"),
+    "clients_events": ("client_id", "type", "date", "time", "duration", "venue", "budget"),
+    "events": ("event_id", "name", "type", "date", "venue", "theme", "invoice", "client_id", "suppliers"),
+    "suppliers": ("supplier_id", "name", "contact_details", "service_type"),
+    "guests": ("guest_id", "f_name", "l_name", "contact_details", "event_id"),
+    "venues": ("venue_id", "name", "address", "contact_details", "min_guests", "max_guests"),
+}
+TABLE_CLASSES = {"employees": Employee, "suppliers": Supplier, "guests": Guest, "venues": Venue}
+
+def field_value(record, field):
+    # Records are either entity objects (Employee, Guest, ...) or plain dicts (events, clients)
+    value = record.get(field) if isinstance(record, dict) else getattr(record, field, None)
+    return value.value if isinstance(value, Enum) else value
+
+def record_to_row(table, key, record):
+    # Flatten a record into {field: plain value}, e.g. for exporting
+    id_field, *fields = TABLE_FIELDS[table]
+    row = {id_field: key}
+    for field in fields:
+        row[field] = field_value(record, field)
+    return row
+
+def record_from_row(table, row):
+    # Build the record stored in a table from {field: value}; returns (key, record)
+    id_field, *fields = TABLE_FIELDS[table]
+    key = int(row[id_field])
+    cls = TABLE_CLASSES.get(table)
+    if cls is None:
+        return key, {field: row.get(field) for field in fields}
+    values = {field: row.get(field) for field in fields}
+    if table == "employees":
+        values["job_title"] = JobTitle(values["job_title"])
+    return key, cls(key, **values)
+
+def apply_defaults(table, values):
+    # Fill in the values the GUI's Add dialogs generate themselves
+    if table == "employees":
+        values.setdefault("salary", random.randint(30000, 100000))
+    elif table == "events":
+        values.setdefault("invoice", random.randint(5000, 25000))
+    return values
+
+# Functions to save and load data (snapshot plus a per-record journal, see Storage.py)
+def load_data(file_path, table_type=JournaledDict):
     try:
-        with open(file_path, 'rb') as file:
-            return pickle.load(file)
+        return load_table(file_path, table_type)
     except FileNotFoundError:
-        print("File not found. Initializing new data.")
-        return {}
+        print("File not found. Initializing new data.", file=sys.stderr)
+        return table_type()
 
 def save_data(data, file_path):
-    with open(file_path, 'wb') as file:
-        pickle.dump(data, file)
-
+    # Only the records changed since the last save are written; returns the bytes written
+    if isinstance(data, LazyTable):
+        if not data.loaded:
+            return 0  # never loaded, so nothing can have changed
+        data = data.data
+    return save_table(data, file_path)
+
+class LazyTable(MutableMapping):
+    """Stand-in for a data file that is only loaded the first time the table is actually used."""
+    def __init__(self, file_path, loader=load_data):
+        self.file_path = file_path
+        self.loader = loader
+        self.load_time_ms = None
+        self._data = None
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    @property
+    def data(self):
+        if self._data is None:
+            start = time.perf_counter()
+            self._data = self.loader(self.file_path)
+            self.load_time_ms = (time.perf_counter() - start) * 1000
+            print(f"Loaded {self.file_path} on first use in {self.load_time_ms:.1f} ms (deferred from startup)",
+                  file=sys.stderr)
+        return self._data
+
+    def __getattr__(self, name):
+        # Table-specific methods (touch, find, ...) are forwarded to the loaded table
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.data, name)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def keys(self):
+        return self.data.keys()
+
+    def values(self):
+        return self.data.values()
+
+    def items(self):
+        return self.data.items()
+
+def lazy_load_report(tables):
+    # Summarise which lazily loaded tables were needed and how long loading them took
+    lines = []
+    for table in tables:
+        if table.loaded:
+            lines.append(f"{table.file_path}: loaded on demand in {table.load_time_ms:.1f} ms")
+        else:
+            lines.append(f"{table.file_path}: never loaded")
+    return lines
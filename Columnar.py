@@ -0,0 +1,147 @@
+import sys
+from array import array
+from collections.abc import MutableMapping
+
+from Classes import Guest, load_data
+from RecordFormat import loads, loads_columns
+from Storage import ChangeTracker
+
+NO_EVENT = -1  # stored in the event_ids column for guests not assigned to an event
+
+
+class GuestTable(ChangeTracker, MutableMapping):
+    """Column-oriented store of Guest records with the same dict interface the GUI uses for guests.
+
+    IDs and event IDs are packed 64-bit integer arrays and names are interned, so the many
+    repeated first and last names share one string each. Reading a guest builds a Guest object
+    on the fly; edits must be written back with table[guest_id] = guest.
+    """
+    def __init__(self, guests=()):
+        self.ids = array('q')
+        self.event_ids = array('q')
+        self.f_names = []
+        self.l_names = []
+        self.contact_details = []
+        self.rows = {}  # guest ID -> row number in the columns
+        self._init_tracking()
+        for guest_id, guest in guests:
+            self._store(guest_id, guest)
+
+    @classmethod
+    def from_encoded(cls, payload):
+        # Fill the columns straight from the snapshot's guest columns, see Storage.load_table;
+        # a snapshot too small to have been written as a table holds a few Guest objects instead
+        table = cls()
+        columns = None if payload is None else loads_columns(payload, Guest)
+        if columns is None:
+            for guest_id, guest in (loads(payload) if payload is not None else {}).items():
+                table._store(guest_id, guest)
+            return table
+        keys, fields = columns
+        table.ids = array('q', keys)
+        table.rows = dict(zip(keys, range(len(keys))))
+        table.event_ids = array('q', [NO_EVENT if event_id is None else int(event_id)
+                                      for event_id in fields.pop("event_id")])
+        table.f_names = list(map(sys.intern, fields.pop("f_name")))
+        table.l_names = list(map(sys.intern, fields.pop("l_name")))
+        table.contact_details = fields.pop("contact_details")
+        return table
+
+    def _store(self, guest_id, guest):
+        event_id = NO_EVENT if guest.event_id is None else int(guest.event_id)
+        row = self.rows.get(guest_id)
+        if row is None:
+            self.rows[guest_id] = len(self.ids)
+            self.ids.append(guest_id)
+            self.event_ids.append(event_id)
+            self.f_names.append(sys.intern(guest.f_name))
+            self.l_names.append(sys.intern(guest.l_name))
+            self.contact_details.append(guest.contact_details)
+        else:
+            self.event_ids[row] = event_id
+            self.f_names[row] = sys.intern(guest.f_name)
+            self.l_names[row] = sys.intern(guest.l_name)
+            self.contact_details[row] = guest.contact_details
+
+    def _guest(self, row):
+        event_id = self.event_ids[row]
+        return Guest(self.ids[row], self.f_names[row], self.l_names[row], self.contact_details[row],
+                     None if event_id == NO_EVENT else event_id)
+
+    def __getitem__(self, guest_id):
+        return self._guest(self.rows[guest_id])
+
+    def __setitem__(self, guest_id, guest):
+        with self._lock:
+            self._store(guest_id, guest)
+            self._mark(guest_id)
+
+    def __delitem__(self, guest_id):
+        with self._lock:
+            self._remove(guest_id)
+            self._mark(guest_id)
+
+    def _remove(self, guest_id):
+        row = self.rows.pop(guest_id)
+        # Move the last row into the gap so every column stays dense
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.rows[moved_id] = row
+            for column in (self.ids, self.event_ids, self.f_names, self.l_names, self.contact_details):
+                column[row] = column[last]
+        for column in (self.ids, self.event_ids, self.f_names, self.l_names, self.contact_details):
+            column.pop()
+
+    def _apply(self, op, guest_id, guest):
+        if op == "set":
+            self._store(guest_id, guest)
+        elif guest_id in self.rows:
+            self._remove(guest_id)
+
+    def __contains__(self, guest_id):
+        return guest_id in self.rows
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self.rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def items(self):
+        with self._lock:
+            return [(guest_id, self._guest(row)) for guest_id, row in self.rows.items()]
+
+    def values(self):
+        return [guest for _, guest in self.items()]
+
+    def iter_items(self):
+        # Like items(), but builds one Guest at a time, e.g. for a streaming export; guests deleted
+        # while iterating are skipped
+        for guest_id in list(self.rows):
+            with self._lock:
+                row = self.rows.get(guest_id)
+                guest = None if row is None else self._guest(row)
+            if guest is not None:
+                yield guest_id, guest
+
+    def clear(self):
+        with self._lock:
+            for column in (self.ids, self.event_ids, self.f_names, self.l_names, self.contact_details):
+                del column[:]
+            self.rows.clear()
+            self._changed.clear()
+            self._base_versions.clear()
+            self._cleared = True
+
+    def event_assignments(self):
+        """Return {guest ID: event ID} for every guest assigned to an event."""
+        with self._lock:
+            return {guest_id: event_id for guest_id, event_id in zip(self.ids, self.event_ids) if event_id != NO_EVENT}
+
+
+def load_guest_table(file_path):
+    # Loader for LazyTable: read guests.pkl (and its journal) straight into the columnar form,
+    # without building a Guest per record on the way
+    return load_data(file_path, GuestTable)
@@ -0,0 +1,155 @@
+from collections import Counter, defaultdict
+
+from Archive import live_records
+from Indexes import parse_date
+
+# Flat fee charged for the venue of every event, in whole dollars like all amounts here so running
+# totals stay exact however often they are adjusted
+VENUE_FEE = 1500
+
+# What each supplier service costs an event: (flat fee, amount per guest)
+SERVICE_RATES = {
+    "Catering Company": (500, 40),
+    "Cleaning Company": (300, 2),
+    "Decorations Company": (400, 5),
+    "Entertainment Company": (800, 0),
+    "Furniture Supply Company": (250, 8),
+}
+UNKNOWN_SERVICE_RATE = (0, 0)
+
+
+def parse_amount(value):
+    # Budgets are typed into an Entry; None when blank or not a number
+    try:
+        return float(str(value).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+class CostIndex:
+    """Cost of every event with running totals per client and per month, kept up to date record by record.
+
+    An event costs the venue fee plus, for each of its suppliers, the service's flat fee and its
+    per-guest amount times the event's guests (counted by the shared CapacityIndex). A change to
+    one event, supplier, guest or client budget only re-costs the events it affects. Archived events
+    are not costed, see live_records.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.events = {}
+        self.event_costs = {}                    # event ID -> (client ID, month, cost)
+        self.event_suppliers = {}                # event ID -> supplier IDs it uses
+        self.supplier_events = defaultdict(set)  # supplier ID -> IDs of the events using it
+        self.client_events = defaultdict(set)    # client ID -> IDs of the client's events
+        self.supplier_rates = {}                 # supplier ID -> (flat fee, amount per guest)
+        self.budgets = {}                        # client ID -> budget
+        self.client_totals = Counter()
+        self.month_totals = Counter()
+        self.over_budget = set()                 # IDs of events costing more than their client's budget
+
+    def build(self, events, suppliers, clients):
+        self.events = events
+        for supplier_id, supplier in suppliers.items():
+            self.supplier_rates[supplier_id] = SERVICE_RATES.get(supplier.service_type, UNKNOWN_SERVICE_RATE)
+        for client_id, client in clients.items():
+            self._set_budget(client_id, client)
+        for event_id, event in live_records(events).items():
+            self._add_event(event_id, event)
+        return self
+
+    def apply_change(self, table, key, data):
+        # Re-cost what one added, modified or deleted event, supplier or client booking affects
+        record = data.get(key)
+        if table == "events":
+            self._remove_event(key)
+            if record is not None:
+                self._add_event(key, record)
+        elif table == "suppliers":
+            if record is None:
+                self.supplier_rates.pop(key, None)
+            else:
+                self.supplier_rates[key] = SERVICE_RATES.get(record.service_type, UNKNOWN_SERVICE_RATE)
+            self.refresh_events(self.supplier_events.get(key, ()))
+        elif table == "clients_events":
+            self.budgets.pop(key, None)
+            if record is not None:
+                self._set_budget(key, record)
+            for event_id in self.client_events.get(key, ()):
+                self._check_budget(event_id)
+
+    def refresh_events(self, event_ids):
+        """Re-cost the given events, e.g. after their guest numbers changed."""
+        for event_id in list(event_ids):
+            self._remove_event(event_id)
+            event = self.events.get(event_id)
+            if event is not None:
+                self._add_event(event_id, event)
+
+    def _set_budget(self, client_id, client):
+        budget = parse_amount(client.get('budget', ''))
+        if budget is not None:
+            self.budgets[client_id] = budget
+
+    def event_cost(self, event_id, event):
+        guests = self.capacity.counts[event_id]
+        cost = VENUE_FEE
+        for supplier_id in event.get('suppliers') or ():
+            flat, per_guest = self.supplier_rates.get(supplier_id, UNKNOWN_SERVICE_RATE)
+            cost += flat + per_guest * guests
+        return cost
+
+    def _add_event(self, event_id, event):
+        client_id = event.get('client_id')
+        date = str(event.get('date', ''))
+        month = date[:7] if parse_date(date) is not None else None
+        cost = self.event_cost(event_id, event)
+        self.event_costs[event_id] = (client_id, month, cost)
+        self.event_suppliers[event_id] = tuple(event.get('suppliers') or ())
+        for supplier_id in self.event_suppliers[event_id]:
+            self.supplier_events[supplier_id].add(event_id)
+        if client_id is not None:
+            self.client_events[client_id].add(event_id)
+            self.client_totals[client_id] += cost
+        if month is not None:
+            self.month_totals[month] += cost
+        self._check_budget(event_id)
+
+    def _remove_event(self, event_id):
+        entry = self.event_costs.pop(event_id, None)
+        if entry is None:
+            return
+        client_id, month, cost = entry
+        for supplier_id in self.event_suppliers.pop(event_id, ()):
+            self.supplier_events[supplier_id].discard(event_id)
+        if client_id is not None:
+            self.client_events[client_id].discard(event_id)
+            self.client_totals[client_id] -= cost
+        if month is not None:
+            self.month_totals[month] -= cost
+        self.over_budget.discard(event_id)
+
+    def _check_budget(self, event_id):
+        client_id, _, cost = self.event_costs[event_id]
+        budget = self.budgets.get(client_id)
+        if budget is not None and cost > budget:
+            self.over_budget.add(event_id)
+        else:
+            self.over_budget.discard(event_id)
+
+    def cost_of(self, event_id):
+        entry = self.event_costs.get(event_id)
+        return None if entry is None else entry[2]
+
+    def client_report(self):
+        """Return (client ID, total cost of its events, budget or None) for every client with events."""
+        return [(client_id, total, self.budgets.get(client_id))
+                for client_id, total in sorted(self.client_totals.items()) if self.client_events[client_id]]
+
+    def month_report(self):
+        """Return (YYYY-MM, total cost of the events that month) in month order."""
+        return sorted((month, total) for month, total in self.month_totals.items() if total)
+
+    def over_budget_report(self):
+        """Return (event ID, cost, client budget) for every event costing more than its client's budget."""
+        return [(event_id, self.event_costs[event_id][2], self.budgets[self.event_costs[event_id][0]])
+                for event_id in sorted(self.over_budget)]
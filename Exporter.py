@@ -0,0 +1,109 @@
+import csv
+import json
+import struct
+import sys
+import zlib
+from itertools import islice
+
+from Classes import TABLE_FIELDS, record_to_row
+from Repository import PICKLE_FILES, open_table
+
+# Extensions of the supported export formats
+EXPORT_FORMATS = (".csv", ".jsonl", ".columnar")
+
+# Columnar files: row groups of this many rows, each column stored as its own compressed chunk,
+# then a JSON footer describing where every chunk is, its length, and the magic bytes.
+ROW_GROUP_SIZE = 10000
+COLUMNAR_MAGIC = b"BECOL1"
+_FOOTER_LENGTH = struct.Struct("<Q")
+
+
+def iter_rows(table, data):
+    """Yield every record of a table as a {field: plain value} row, one at a time."""
+    items = data.iter_items() if hasattr(data, "iter_items") else iter(data.items())
+    for key, record in items:
+        yield record_to_row(table, key, record)
+
+
+def write_csv(rows, fields, output_path):
+    with open(output_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_jsonl(rows, fields, output_path):
+    with open(output_path, 'w', encoding='utf-8') as file:
+        count = 0
+        for row in rows:
+            file.write(json.dumps(row) + "\n")
+            count += 1
+    return count
+
+
+def write_columnar(rows, fields, output_path, row_group_size=ROW_GROUP_SIZE):
+    # Only one row group is in memory at a time; readers can fetch single columns via the footer
+    row_groups = []
+    count = 0
+    with open(output_path, 'wb') as file:
+        file.write(COLUMNAR_MAGIC)
+        while True:
+            group = list(islice(rows, row_group_size))
+            if not group:
+                break
+            chunks = {}
+            for field in fields:
+                chunk = zlib.compress(json.dumps([row[field] for row in group]).encode('utf-8'))
+                chunks[field] = [file.tell(), len(chunk)]
+                file.write(chunk)
+            row_groups.append({"rows": len(group), "columns": chunks})
+            count += len(group)
+        footer = json.dumps({"fields": list(fields), "rows": count, "row_groups": row_groups}).encode('utf-8')
+        file.write(footer)
+        file.write(_FOOTER_LENGTH.pack(len(footer)))
+        file.write(COLUMNAR_MAGIC)
+    return count
+
+
+def read_columnar(input_path, columns=None):
+    """Yield the rows of a columnar export, reading only the requested columns."""
+    with open(input_path, 'rb') as file:
+        file.seek(-len(COLUMNAR_MAGIC) - _FOOTER_LENGTH.size, 2)
+        footer_length = _FOOTER_LENGTH.unpack(file.read(_FOOTER_LENGTH.size))[0]
+        if file.read() != COLUMNAR_MAGIC:
+            raise ValueError(f"{input_path} is not a columnar export")
+        file.seek(-len(COLUMNAR_MAGIC) - _FOOTER_LENGTH.size - footer_length, 2)
+        footer = json.loads(file.read(footer_length))
+        columns = columns or footer["fields"]
+        for group in footer["row_groups"]:
+            values = {}
+            for column in columns:
+                offset, length = group["columns"][column]
+                file.seek(offset)
+                values[column] = json.loads(zlib.decompress(file.read(length)))
+            for index in range(group["rows"]):
+                yield {column: values[column][index] for column in columns}
+
+
+WRITERS = {".csv": write_csv, ".jsonl": write_jsonl, ".columnar": write_columnar}
+
+
+def export_table(table, data, output_path):
+    """Stream every record of a table into output_path; the format follows its extension. Returns the row count."""
+    extension = next((ext for ext in EXPORT_FORMATS if output_path.lower().endswith(ext)), None)
+    if extension is None:
+        raise ValueError(f"Unsupported export format; use one of: {', '.join(EXPORT_FORMATS)}")
+    return WRITERS[extension](iter_rows(table, data), TABLE_FIELDS[table], output_path)
+
+
+if __name__ == "__main__":
+    # python Exporter.py <table> <output.csv|output.jsonl|output.columnar>
+    if len(sys.argv) != 3 or sys.argv[1] not in PICKLE_FILES:
+        print(f"Usage: python Exporter.py <{'|'.join(PICKLE_FILES)}> <output{'|output'.join(EXPORT_FORMATS)}>")
+        sys.exit(1)
+    table_name, path = sys.argv[1], sys.argv[2]
+    print(f"Exported {export_table(table_name, open_table(table_name), path)} {table_name} to {path}")
@@ -0,0 +1,266 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from Capacity import CapacityIndex
+from Classes import TABLE_FIELDS, JobTitle, field_value, record_from_row, save_data
+from Indexes import BOOKING_TABLES, booking_slot, format_slot
+from Repository import PICKLE_FILES, build_venue_index, open_table
+from Storage import SequenceAllocator
+
+# Tables that can be filled from a CSV or JSON file
+IMPORTABLE_TABLES = ("guests", "suppliers", "employees")
+
+# Rows are validated, given IDs and saved in batches of this many
+BATCH_SIZE = 1000
+
+# Columns an imported row may leave empty
+OPTIONAL_FIELDS = {"event_id", "budget", "client_id", "suppliers"}
+
+_CHUNK_SIZE = 65536
+
+
+class ImportFailed(Exception):
+    """Reading the import file failed part-way; result counts the rows imported (and saved) before that."""
+    def __init__(self, result, error):
+        super().__init__(f"{error} (after importing {result.imported} {result.table})")
+        self.result = result
+
+
+class ImportResult:
+    """Outcome of one import: how many rows went in, which were rejected and why, and how fast."""
+    def __init__(self, table):
+        self.table = table
+        self.imported = 0
+        self.rejected = []  # (row number, reason)
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return (self.imported + len(self.rejected)) / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        lines = [f"Imported {self.imported} {self.table} in {self.seconds:.2f} s "
+                 f"({self.rows_per_second:.0f} rows/s), {len(self.rejected)} rows rejected"]
+        lines += [f"Row {number}: {reason}" for number, reason in self.rejected[:10]]
+        if len(self.rejected) > 10:
+            lines.append(f"... and {len(self.rejected) - 10} more")
+        return "\n".join(lines)
+
+
+def read_rows(file_path):
+    """Yield the rows of a .csv, .json (array of objects) or .jsonl file one at a time."""
+    with open(file_path, newline='', encoding='utf-8') as file:
+        if file_path.lower().endswith(".csv"):
+            yield from csv.DictReader(file)
+        elif file_path.lower().endswith(".json"):
+            yield from _read_json_array(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _read_json_array(file):
+    # Decode the objects of a top-level JSON array chunk by chunk instead of loading the whole file
+    decoder = json.JSONDecoder()
+    buffer = file.read(_CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("A .json import file must contain an array of objects")
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("The .json import file ends in the middle of a row")
+            buffer += chunk
+            continue
+        yield row
+        buffer = buffer[end:]
+
+
+def validate_row(table, row):
+    """Return the cleaned {field: value} of one imported row, or raise ValueError saying what is wrong.
+
+    Any ID column in the file is ignored; imported records always get fresh IDs.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object with named fields")
+    values = {}
+    for field in TABLE_FIELDS[table][1:]:
+        value = row.get(field)
+        value = value.strip() if isinstance(value, str) else value
+        if value in (None, ""):
+            if field not in OPTIONAL_FIELDS:
+                raise ValueError(f"{field} is required")
+            value = None
+        values[field] = value
+    if table == "employees":
+        job_titles = [job_title.value for job_title in JobTitle]
+        if values["job_title"] not in job_titles:
+            raise ValueError(f"job_title must be one of: {', '.join(job_titles)}")
+        values["salary"] = _integer(values["salary"], "salary")
+    for field in ("event_id", "client_id"):
+        if values.get(field) is not None:
+            values[field] = _integer(values[field], field)
+    if table == "events":
+        values["suppliers"] = _integer_list(values["suppliers"], "suppliers")
+    if table in BOOKING_TABLES and booking_slot(values) is None:
+        raise ValueError("date must be YYYY-MM-DD" + (", time HH:MM and duration a number of hours"
+                                                      if "time" in values else ""))
+    return values
+
+
+def _integer_list(value, field):
+    # A list of IDs, given as a JSON list or as comma-separated text such as "3, 7"
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.replace(";", ",").split(",") if part.strip()]
+    if not isinstance(value, list):
+        raise ValueError(f"{field} must be a list of whole numbers")
+    return [_integer(item, field) for item in value]
+
+
+def _integer(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a whole number, not {value!r}") from None
+
+
+def venue_conflicts(venue_index, table, key, record):
+    """Return why record (of a booking table) double-books its venue, or None if the venue is free.
+
+    venue_index is the index over BOOKING_TABLES, see build_venue_index; record's own booking
+    (table, key) does not count.
+    """
+    slot = booking_slot(record)
+    clashes = [] if slot is None else venue_index.conflicts(record['venue'], *slot, ignore=(table, key))
+    if not clashes:
+        return None
+    lines = [f"{BOOKING_TABLES[other_table]} {other_key}: {format_slot(start, end)}"
+             for other_table, other_key, start, end in clashes[:10]]
+    return f"{record['venue']} is already booked at that time:\n" + "\n".join(lines)
+
+
+def event_link_problem(record, clients_events, suppliers):
+    """Return why an event's client_id or suppliers name records that do not exist, or None if they all do."""
+    client_id = record.get('client_id')
+    if client_id is not None and client_id not in clients_events:
+        return f"No client found with ID: {client_id}"
+    missing = [supplier_id for supplier_id in record.get('suppliers') or [] if supplier_id not in suppliers]
+    if missing:
+        return f"No supplier found with ID: {', '.join(map(str, missing))}"
+    return None
+
+
+class RecordChecks:
+    """The checks the GUI's dialogs make before saving a record, for records saved any other way:
+    venue capacity for guests, existing clients and suppliers for events, and double bookings for
+    events and client bookings.
+
+    tables is {table name: data}; the other tables the checks need are opened with open_table.
+    The indexes behind the checks are built on first use, or passed in, and must be told of every
+    write with apply_change.
+    """
+    def __init__(self, tables=None, capacity=None, venue_index=None):
+        self.tables = dict(tables or {})
+        self.capacity = capacity
+        self.venue_index = venue_index
+
+    def table(self, name):
+        if name not in self.tables:
+            self.tables[name] = open_table(name)
+        return self.tables[name]
+
+    def problem(self, table, key, record):
+        """Return why record cannot be saved as key of table, or None if it can."""
+        if table == "guests" and field_value(record, "event_id") is not None:
+            if self.capacity is None:
+                self.capacity = CapacityIndex().build(self.table("guests"), self.table("venues"))
+            return self.capacity.check_guest(key, field_value(record, "event_id"), self.table("events"))
+        if table == "events":
+            problem = event_link_problem(record, self.table("clients_events"), self.table("suppliers"))
+            if problem:
+                return problem
+        if table in BOOKING_TABLES:
+            if self.venue_index is None:
+                self.venue_index = build_venue_index({name: self.table(name) for name in BOOKING_TABLES})
+            return venue_conflicts(self.venue_index, table, key, record)
+        return None
+
+    def apply_change(self, table, key):
+        # Bring the indexes up to date with one added, modified or deleted record
+        if table in ("guests", "venues") and self.capacity is not None:
+            self.capacity.apply_change(table, key, self.table(table))
+        if table in BOOKING_TABLES and self.venue_index is not None:
+            self.venue_index.apply_change(table, key, self.table(table))
+
+
+def import_rows(table, rows, data, allocator, save, file_path, batch_size=BATCH_SIZE, checks=None):
+    """Validate rows and add them to data batch by batch, with one block of IDs and one save per batch.
+
+    With RecordChecks, rows are also rejected when the record fails them (e.g. a guest whose event's
+    venue is full) and the checks are kept up to date with the records added. A rejected row's ID
+    stays unused. Raises ImportFailed when reading rows fails after some were imported.
+    """
+    result = ImportResult(table)
+    id_field = TABLE_FIELDS[table][0]
+    start = time.perf_counter()
+    numbered = enumerate(rows, start=1)
+    while True:
+        try:
+            batch = list(islice(numbered, batch_size))
+        except (OSError, ValueError) as error:
+            raise ImportFailed(result, error) from error
+        if not batch:
+            break
+        valid = []
+        for number, row in batch:
+            try:
+                valid.append((number, validate_row(table, row)))
+            except ValueError as error:
+                result.rejected.append((number, str(error)))
+        if not valid:
+            continue
+        for key, (number, values) in zip(allocator.reserve(table, data, len(valid)), valid):
+            record = record_from_row(table, {**values, id_field: key})[1]
+            problem = None if checks is None else checks.problem(table, key, record)
+            if problem:
+                result.rejected.append((number, problem))
+                continue
+            data[key] = record
+            if checks is not None:
+                checks.apply_change(table, key)
+            result.imported += 1
+        save(data, file_path)
+        save(allocator.next_ids, allocator.file_path)
+    result.rejected.sort()
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def import_file(import_path, table, data, allocator, save, file_path, batch_size=BATCH_SIZE, checks=None):
+    if table not in IMPORTABLE_TABLES:
+        raise ValueError(f"Cannot import {table}; choose one of: {', '.join(IMPORTABLE_TABLES)}")
+    return import_rows(table, read_rows(import_path), data, allocator, save, file_path, batch_size, checks)
+
+
+if __name__ == "__main__":
+    # python Importer.py <guests|suppliers|employees> <file.csv|file.json|file.jsonl>
+    if len(sys.argv) != 3 or sys.argv[1] not in IMPORTABLE_TABLES or not os.path.exists(sys.argv[2]):
+        print(f"Usage: python Importer.py <{'|'.join(IMPORTABLE_TABLES)}> <file.csv|file.json|file.jsonl>")
+        sys.exit(1)
+    table_name = sys.argv[1]
+    table_data = open_table(table_name)
+    print(import_file(sys.argv[2], table_name, table_data, SequenceAllocator(), save_data, PICKLE_FILES[table_name],
+                      checks=RecordChecks({table_name: table_data})).summary())
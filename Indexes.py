@@ -0,0 +1,230 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from Classes import field_value
+
+# Searchable fields of every table: label shown in the search bar -> record field.
+SEARCH_FIELDS = {
+    "employees": {"Name": "name", "Department": "department", "Job Title": "job_title"},
+    "clients_events": {"Type": "type", "Date": "date", "Venue": "venue"},
+    "events": {"Event Name": "name", "Type": "type", "Date": "date", "Venue": "venue"},
+    "suppliers": {"Name": "name", "Service": "service_type"},
+    "guests": {"Last Name": "l_name", "First Name": "f_name"},
+    "venues": {"Name": "name"},
+}
+
+
+def normalize(value):
+    return str(value).casefold()
+
+
+class PrefixIndex:
+    """Sorted (value, record ID) list over one field, answering case-insensitive prefix searches by bisection."""
+    def __init__(self, field):
+        self.field = field
+        self.entries = []  # sorted (normalized value, key) pairs
+        self.values = {}   # key -> normalized value currently in entries
+
+    def build(self, data):
+        self.values = {key: normalize(field_value(record, self.field)) for key, record in data.items()}
+        self.entries = sorted((value, key) for key, value in self.values.items())
+
+    def update(self, key, record):
+        self.discard(key)
+        value = normalize(field_value(record, self.field))
+        self.values[key] = value
+        insort(self.entries, (value, key))
+
+    def discard(self, key):
+        value = self.values.pop(key, None)
+        if value is not None:
+            del self.entries[bisect_left(self.entries, (value, key))]
+
+    def prefix(self, text):
+        # Every value starting with text sorts between (text,) and (text + highest character,)
+        text = normalize(text)
+        start = bisect_left(self.entries, (text,))
+        end = bisect_left(self.entries, (text + "\U0010ffff",))
+        return [key for _, key in self.entries[start:end]]
+
+
+class TableIndex:
+    """The prefix indexes of one table's searchable fields, kept up to date record by record."""
+    def __init__(self, table):
+        self.fields = SEARCH_FIELDS[table]
+        self.indexes = {label: PrefixIndex(field) for label, field in self.fields.items()}
+
+    def build(self, data):
+        for index in self.indexes.values():
+            index.build(data)
+        return self
+
+    def apply_change(self, key, data):
+        # Re-index one added or modified record, or drop a deleted one
+        record = data.get(key)
+        for index in self.indexes.values():
+            if record is None:
+                index.discard(key)
+            else:
+                index.update(key, record)
+
+    def search(self, label, text):
+        """Return the IDs of records whose field starts with text, in field order."""
+        return self.indexes[label].prefix(text)
+
+    def matches(self, label, text):
+        """Return a record -> bool predicate telling whether search(label, text) would find a record."""
+        return prefix_matcher(self.fields[label], text)
+
+
+def prefix_matcher(field, text):
+    """Predicate on records whose field starts with text, ignoring case, as PrefixIndex.prefix finds them."""
+    text = normalize(text)
+    return lambda record: normalize(field_value(record, field)).startswith(text)
+
+
+# Tables whose records book a venue, and the label used for them in conflict messages
+BOOKING_TABLES = {"events": "Event", "clients_events": "Client booking"}
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_date(value):
+    """Return the day ordinal of a YYYY-MM-DD string, or None if it is not one."""
+    try:
+        return datetime.strptime(str(value).strip(), "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
+def booking_slot(record):
+    """Return the (start, end) minutes a record occupies its venue, or None if its date cannot be read.
+
+    Records are booked from date + time for duration hours; without a time (events only have a
+    date) or a duration they take the whole day.
+    """
+    day = parse_date(record.get('date', ''))
+    if day is None:
+        return None
+    day *= MINUTES_PER_DAY
+    try:
+        time, duration = str(record.get('time') or '').strip(), str(record.get('duration') or '').strip()
+        if not time:
+            return day, day + MINUTES_PER_DAY
+        hours, minutes = time.split(":")
+        start = day + int(hours) * 60 + int(minutes)
+        length = round(float(duration) * 60) if duration else MINUTES_PER_DAY
+    except ValueError:
+        return None
+    if not 0 <= start - day < MINUTES_PER_DAY or length <= 0:
+        return None
+    return start, start + length
+
+
+def format_slot(start, end):
+    first = datetime.fromordinal(start // MINUTES_PER_DAY) + timedelta(minutes=start % MINUTES_PER_DAY)
+    last = datetime.fromordinal(end // MINUTES_PER_DAY) + timedelta(minutes=end % MINUTES_PER_DAY)
+    return f"{first:%Y-%m-%d %H:%M} to {last:%Y-%m-%d %H:%M}"
+
+
+class VenueIndex:
+    """Per-venue interval index over events and client bookings, answering "is this venue free".
+
+    Each venue keeps its bookings as a list of (start, end, table, key) sorted by start, and the
+    longest booking seen; a booking overlapping [start, end) must start within [start - longest, end),
+    which bisection finds in O(log n) plus the bookings in that window.
+    """
+    def __init__(self):
+        self.bookings = {}  # normalized venue -> sorted (start, end, table, key)
+        self.longest = {}   # normalized venue -> longest booking length in minutes
+        self.slots = {}     # (table, key) -> (venue, start, end) currently indexed
+
+    def build(self, tables):
+        # tables: {"events": events, "clients_events": clients_events}
+        for table, data in tables.items():
+            for key, record in data.items():
+                self._add(table, key, record)
+        for entries in self.bookings.values():
+            entries.sort()
+        return self
+
+    def apply_change(self, table, key, data):
+        # Re-index one added or modified booking, or drop a deleted one
+        self.discard(table, key)
+        record = data.get(key)
+        if record is not None:
+            self._add(table, key, record, keep_sorted=True)
+
+    def discard(self, table, key):
+        slot = self.slots.pop((table, key), None)
+        if slot is not None:
+            venue, start, end = slot
+            entries = self.bookings[venue]
+            del entries[bisect_left(entries, (start, end, table, key))]
+
+    def _add(self, table, key, record, keep_sorted=False):
+        venue, slot = normalize(record.get('venue') or ''), booking_slot(record)
+        if not venue or slot is None:
+            return  # free-text dates that cannot be read are left out of the index
+        start, end = slot
+        entries = self.bookings.setdefault(venue, [])
+        if keep_sorted:
+            insort(entries, (start, end, table, key))
+        else:
+            entries.append((start, end, table, key))
+        self.longest[venue] = max(self.longest.get(venue, 0), end - start)
+        self.slots[(table, key)] = (venue, start, end)
+
+    def conflicts(self, venue, start, end, ignore=None):
+        """Return (table, key, start, end) of every booking of venue overlapping [start, end), except ignore=(table, key)."""
+        venue = normalize(venue)
+        entries = self.bookings.get(venue, [])
+        first = bisect_left(entries, (start - self.longest.get(venue, 0),))
+        last = bisect_left(entries, (end,))
+        return [(table, key, booked_start, booked_end) for booked_start, booked_end, table, key in entries[first:last]
+                if booked_end > start and (table, key) != ignore]
+
+    def all_conflicts(self):
+        """Return every pair of overlapping bookings as (venue, (table, key), (table, key)), by sweeping each venue once."""
+        pairs = []
+        for venue, entries in self.bookings.items():
+            active = []  # (end, table, key) of bookings that started earlier and may still be running
+            for start, end, table, key in entries:
+                active = [booking for booking in active if booking[0] > start]
+                pairs += [(venue, (other_table, other_key), (table, key)) for _, other_table, other_key in active]
+                active.append((end, table, key))
+        return pairs
+
+
+class DateIndex:
+    """Events and client bookings sorted by date, each date parsed once, for calendar range queries."""
+    def __init__(self):
+        self.entries = []  # sorted (day ordinal, table, key)
+        self.days = {}     # (table, key) -> day ordinal currently indexed
+
+    def build(self, tables):
+        # tables: {"events": events, "clients_events": clients_events}
+        for table, data in tables.items():
+            for key, record in data.items():
+                day = parse_date(record.get('date', ''))
+                if day is not None:
+                    self.days[(table, key)] = day
+        self.entries = sorted((day, table, key) for (table, key), day in self.days.items())
+        return self
+
+    def apply_change(self, table, key, data):
+        # Re-index one added or modified record, or drop a deleted one
+        day = self.days.pop((table, key), None)
+        if day is not None:
+            del self.entries[bisect_left(self.entries, (day, table, key))]
+        record = data.get(key)
+        day = parse_date(record.get('date', '')) if record is not None else None
+        if day is not None:
+            self.days[(table, key)] = day
+            insort(self.entries, (day, table, key))
+
+    def range(self, first_day, last_day):
+        """Return (day ordinal, table, key) of everything dated first_day..last_day inclusive, in date order."""
+        start = bisect_left(self.entries, (first_day,))
+        end = bisect_left(self.entries, (last_day + 1,))
+        return self.entries[start:end]
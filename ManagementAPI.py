@@ -0,0 +1,338 @@
+import asyncio
+import json
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+from Classes import TABLE_FIELDS, apply_defaults, record_from_row, record_to_row, save_data
+from Importer import RecordChecks, validate_row
+from Indexes import SEARCH_FIELDS
+from Repository import PICKLE_FILES, build_table_index, open_table
+from Storage import ConflictError, SequenceAllocator, changed_on_disk
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Limits on a single request
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Idle keep-alive connections are closed after this many seconds
+IDLE_TIMEOUT = 30
+
+# How often tables are checked for records saved by other processes sharing the data files
+REMOTE_POLL_SECONDS = 5
+
+
+class ApiError(Exception):
+    """Ends a request with an HTTP error status and a JSON {"error": message} body."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecordLocks:
+    """One asyncio lock per (table, record ID), created on first use and dropped once nobody holds or awaits it."""
+    def __init__(self):
+        self._locks = {}
+        self._users = Counter()
+
+    @asynccontextmanager
+    async def hold(self, table, key):
+        lock_key = (table, key)
+        lock = self._locks.setdefault(lock_key, asyncio.Lock())
+        self._users[lock_key] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[lock_key] -= 1
+            if not self._users[lock_key]:
+                del self._users[lock_key], self._locks[lock_key]
+
+
+class ManagementAPI:
+    """HTTP/JSON access to every table for several coordinators at once.
+
+    All clients share one copy of the tables in memory. A write holds its record's lock until the
+    change is on disk; writes to different records run concurrently. Saves run one at a time on a
+    worker thread so the event loop keeps serving requests meanwhile, and merge in what other
+    processes (GUI instances, the CLI) saved to the same files; a write that lost a conflict with
+    one of them gets 409 Conflict, as does a write the GUI's dialogs would refuse: assigning a guest to
+    an event whose venue is full, naming a client or supplier that does not exist, or booking a
+    venue that is already booked at that time.
+
+        GET    /                       table names
+        GET    /<table>?offset=&limit= a page of records
+        GET    /<table>?field=&prefix= records whose searchable field starts with prefix
+        POST   /<table>                add a record (JSON object of fields), responds 201
+        GET    /<table>/<id>           one record
+        PUT    /<table>/<id>           replace every field of a record
+        PATCH  /<table>/<id>           change some fields of a record
+        DELETE /<table>/<id>           delete a record
+    """
+    def __init__(self, tables=None, allocator=None):
+        self.tables = tables if tables is not None else {name: open_table(name) for name in PICKLE_FILES}
+        self.ids = allocator or SequenceAllocator()
+        self.locks = RecordLocks()
+        self.indexes = {}  # table -> TableIndex, built on the first search
+        self.checks = RecordChecks(self.tables)  # the GUI's checks on guests and bookings, see check_record
+        self.conflicts = set()  # (table, key) of writes that lost a conflict, until their request reports it
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ManagementAPI-save")
+
+    async def persist(self, table, key=None):
+        """Save table; raises ConflictError when the write to key made by this request lost a conflict.
+
+        A save writes the pending changes of every request, so the conflicts it finds are handed to
+        the requests that made those writes, whichever of them ran the save.
+        """
+        data = self.tables[table]
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, save_data, data, PICKLE_FILES[table])
+        except ConflictError as error:
+            self.conflicts.update((table, conflict_key) for conflict_key in error.keys)
+        finally:
+            for merged_key in data.drain_merged() if hasattr(data, "drain_merged") else ():
+                self.record_changed(table, merged_key)
+        if (table, key) in self.conflicts:
+            self.conflicts.discard((table, key))
+            raise ConflictError(PICKLE_FILES[table], {key})
+
+    async def poll_remote_changes(self):
+        # A save with no local edits just reads what other processes have saved since
+        while True:
+            await asyncio.sleep(REMOTE_POLL_SECONDS)
+            for table in self.tables:
+                if not changed_on_disk(PICKLE_FILES[table]):
+                    continue
+                try:
+                    await self.persist(table)
+                except OSError as error:
+                    print(f"Failed to refresh {table}: {error}", file=sys.stderr)
+
+    def record_changed(self, table, key):
+        index = self.indexes.get(table)
+        if index is not None:
+            index.apply_change(key, self.tables[table])
+        self.checks.apply_change(table, key)
+
+    def check_record(self, table, key, record):
+        # Same venue capacity, event link and double booking checks as the GUI's dialogs. Called right
+        # before the write, with no await in between, so concurrent requests cannot both take the same
+        # place or slot.
+        problem = self.checks.problem(table, key, record)
+        if problem:
+            raise ApiError(HTTPStatus.CONFLICT, problem)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    # Request handlers; each returns (status, JSON-serialisable body)
+
+    async def dispatch(self, method, path, query, body):
+        parts = [part for part in path.split("/") if part]
+        if not parts:
+            if method != "GET":
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported here")
+            return HTTPStatus.OK, {"tables": list(PICKLE_FILES)}
+        table = parts[0]
+        if table not in PICKLE_FILES or len(parts) > 2:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No such resource: {path}")
+        if len(parts) == 1:
+            if method == "GET":
+                return HTTPStatus.OK, self.list_records(table, query)
+            if method == "POST":
+                return HTTPStatus.CREATED, await self.add_record(table, self.parse_body(body))
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported on /{table}")
+        try:
+            key = int(parts[1])
+        except ValueError:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Record IDs are whole numbers, not {parts[1]!r}") from None
+        if method == "GET":
+            return HTTPStatus.OK, record_to_row(table, key, self.get_record(table, key))
+        if method in ("PUT", "PATCH"):
+            return HTTPStatus.OK, await self.modify_record(table, key, self.parse_body(body), method == "PATCH")
+        if method == "DELETE":
+            return HTTPStatus.OK, await self.delete_record(table, key)
+        raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported on /{table}/{key}")
+
+    def list_records(self, table, query):
+        data = self.tables[table]
+        offset = self.query_int(query, "offset", 0)
+        limit = min(self.query_int(query, "limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        if "prefix" in query:
+            field = query.get("field", next(iter(SEARCH_FIELDS[table].values())))
+            label = next((label for label, name in SEARCH_FIELDS[table].items() if field in (label, name)), None)
+            if label is None:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"{table} cannot be searched by {field}; use one of: "
+                                                       f"{', '.join(SEARCH_FIELDS[table].values())}")
+            if table not in self.indexes:
+                self.indexes[table] = build_table_index(table, data)
+            keys = self.indexes[table].search(label, query["prefix"])
+            total = len(keys)
+            keys = keys[offset:offset + limit]
+        else:
+            total = len(data)
+            keys = list(islice(iter(data), offset, offset + limit))
+        records = [record_to_row(table, key, data[key]) for key in keys if key in data]
+        return {"total": total, "offset": offset, "records": records}
+
+    def get_record(self, table, key):
+        record = self.tables[table].get(key)
+        if record is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No record found with ID: {key}")
+        return record
+
+    def build_record(self, table, key, values):
+        try:
+            cleaned = validate_row(table, values)
+        except ValueError as error:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(error)) from None
+        return record_from_row(table, {**cleaned, TABLE_FIELDS[table][0]: key})[1]
+
+    async def add_record(self, table, values):
+        data = self.tables[table]
+        # The sequence file is shared with other processes, so reading and bumping it is disk I/O too
+        key = await asyncio.get_running_loop().run_in_executor(self.executor, self.ids.next_id, table, data)
+        record = self.build_record(table, key, apply_defaults(table, values))
+        async with self.locks.hold(table, key):
+            self.check_record(table, key, record)
+            self.conflicts.discard((table, key))
+            data[key] = record
+            self.record_changed(table, key)
+            await self.persist(table, key)
+        return record_to_row(table, key, record)
+
+    async def modify_record(self, table, key, values, partial):
+        data = self.tables[table]
+        async with self.locks.hold(table, key):
+            current = record_to_row(table, key, self.get_record(table, key))
+            record = self.build_record(table, key, {**current, **values} if partial else values)
+            self.check_record(table, key, record)
+            self.conflicts.discard((table, key))
+            data[key] = record
+            self.record_changed(table, key)
+            await self.persist(table, key)
+        return record_to_row(table, key, record)
+
+    async def delete_record(self, table, key):
+        data = self.tables[table]
+        async with self.locks.hold(table, key):
+            row = record_to_row(table, key, self.get_record(table, key))
+            self.conflicts.discard((table, key))
+            del data[key]
+            self.record_changed(table, key)
+            await self.persist(table, key)
+        return row
+
+    @staticmethod
+    def parse_body(body):
+        try:
+            values = json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "The request body is not valid JSON") from None
+        if not isinstance(values, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "The request body must be a JSON object of fields")
+        return values
+
+    @staticmethod
+    def query_int(query, name, default):
+        try:
+            value = int(query.get(name, default))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be a whole number") from None
+        if value < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must not be negative")
+        return value
+
+    # HTTP/1.1 connection handling
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                keep_alive = await self.handle_request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, request_line, reader, writer):
+        # Serve one request; returns whether the connection stays open for the next one
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self.write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request line"}, False)
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        try:
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request bodies are limited to {MAX_BODY_BYTES} bytes")
+            body = await reader.readexactly(length) if length else b""
+            url = urlsplit(target)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            status, payload = await self.dispatch(method.upper(), url.path, query, body)
+        except ApiError as error:
+            status, payload = error.status, {"error": str(error)}
+            keep_alive = keep_alive and error.status != HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        except ValueError:
+            status, payload, keep_alive = HTTPStatus.BAD_REQUEST, {"error": "Invalid Content-Length"}, False
+        except ConflictError as error:
+            status, payload = HTTPStatus.CONFLICT, {"error": str(error)}
+        except OSError as error:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Failed to save data: {error}"}
+        self.write_response(writer, status, payload, keep_alive)
+        return keep_alive
+
+    @staticmethod
+    def write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        status = HTTPStatus(status)
+        writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+
+
+async def serve(api, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"Serving the management API on http://{host}:{port}/")
+    poller = asyncio.create_task(api.poll_remote_changes())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        poller.cancel()
+
+
+if __name__ == "__main__":
+    # python ManagementAPI.py [port]
+    management_api = ManagementAPI()
+    try:
+        asyncio.run(serve(management_api, port=int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        management_api.close()
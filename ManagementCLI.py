@@ -0,0 +1,151 @@
+import argparse
+import json
+import sys
+
+from Classes import TABLE_FIELDS, apply_defaults, record_from_row, record_to_row, save_data
+from Exporter import export_table
+from Importer import ImportFailed, RecordChecks, import_file, validate_row
+from Indexes import SEARCH_FIELDS
+from Repository import PICKLE_FILES, build_table_index, open_table
+from Storage import ConflictError, SequenceAllocator, SnapshotDamagedError
+
+
+class CommandError(Exception):
+    """A command could not be carried out; the message is shown to the user."""
+
+
+def parse_assignments(assignments):
+    values = {}
+    for assignment in assignments:
+        field, separator, value = assignment.partition("=")
+        if not separator:
+            raise CommandError(f"Expected field=value, got {assignment!r}")
+        values[field] = value
+    return values
+
+
+def print_rows(table, rows, as_json):
+    fields = TABLE_FIELDS[table]
+    if not as_json:
+        print(" | ".join(fields))
+    for row in rows:
+        print(json.dumps(row) if as_json else " | ".join("" if row[field] is None else str(row[field])
+                                                         for field in fields))
+
+
+def get_record(data, key):
+    record = data.get(key)
+    if record is None:
+        raise CommandError(f"No record found with ID: {key}")
+    return record
+
+
+def save_record(table, data, key, values):
+    try:
+        cleaned = validate_row(table, values)
+    except ValueError as error:
+        raise CommandError(str(error)) from None
+    record = record_from_row(table, {**cleaned, TABLE_FIELDS[table][0]: key})[1]
+    # Same venue capacity, event link and double booking checks as the GUI's dialogs
+    problem = RecordChecks({table: data}).problem(table, key, record)
+    if problem:
+        raise CommandError(problem)
+    data[key] = record
+    save_data(data, PICKLE_FILES[table])
+
+
+def search_label(table, field):
+    # Accept either the search bar label ("Last Name") or the field name ("l_name")
+    for label, name in SEARCH_FIELDS[table].items():
+        if field in (label, name):
+            return label
+    raise CommandError(f"{table} cannot be searched by {field}; use one of: "
+                       f"{', '.join(SEARCH_FIELDS[table].values())}")
+
+
+def run(args):
+    table = args.table
+    data = open_table(table)
+    if args.command == "list":
+        keys = list(data.keys())[:args.limit] if args.limit else data.keys()
+        print_rows(table, (record_to_row(table, key, data[key]) for key in keys), args.json)
+    elif args.command == "show":
+        print_rows(table, [record_to_row(table, args.id, get_record(data, args.id))], args.json)
+    elif args.command == "add":
+        allocator = SequenceAllocator()
+        key = allocator.next_id(table, data)
+        save_record(table, data, key, apply_defaults(table, parse_assignments(args.values)))
+        save_data(allocator.next_ids, allocator.file_path)
+        print(f"Added {table} record {key}")
+    elif args.command == "modify":
+        row = record_to_row(table, args.id, get_record(data, args.id))
+        save_record(table, data, args.id, {**row, **parse_assignments(args.values)})
+        print(f"Modified {table} record {args.id}")
+    elif args.command == "delete":
+        get_record(data, args.id)
+        del data[args.id]
+        save_data(data, PICKLE_FILES[table])
+        print(f"Deleted {table} record {args.id}")
+    elif args.command == "search":
+        keys = build_table_index(table, data).search(search_label(table, args.field), args.prefix)
+        print_rows(table, (record_to_row(table, key, data[key]) for key in keys), args.json)
+    elif args.command == "import":
+        try:
+            result = import_file(args.file, table, data, SequenceAllocator(), save_data, PICKLE_FILES[table],
+                                 checks=RecordChecks({table: data}))
+        except (OSError, ValueError, ImportFailed) as error:
+            raise CommandError(str(error)) from None
+        print(result.summary())
+    elif args.command == "export":
+        try:
+            print(f"Exported {export_table(table, data, args.file)} {table} to {args.file}")
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error)) from None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m ManagementCLI", description="Best Events Company data tool")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, help_text):
+        subparser = commands.add_parser(name, help=help_text)
+        subparser.add_argument("table", choices=list(PICKLE_FILES))
+        return subparser
+
+    listing = command("list", "print the records of a table")
+    listing.add_argument("--limit", type=int, default=0, help="print at most this many records")
+    listing.add_argument("--json", action="store_true", help="print one JSON object per record")
+    show = command("show", "print one record")
+    show.add_argument("id", type=int)
+    show.add_argument("--json", action="store_true")
+    add = command("add", "add a record from field=value pairs")
+    add.add_argument("values", nargs="+", metavar="field=value")
+    modify = command("modify", "change fields of a record")
+    modify.add_argument("id", type=int)
+    modify.add_argument("values", nargs="+", metavar="field=value")
+    delete = command("delete", "delete a record")
+    delete.add_argument("id", type=int)
+    search = command("search", "print records whose field starts with a prefix")
+    search.add_argument("field")
+    search.add_argument("prefix")
+    search.add_argument("--json", action="store_true")
+    command("import", "bulk import a .csv, .json or .jsonl file").add_argument("file")
+    command("export", "export to .csv, .jsonl or .columnar").add_argument("file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        run(args)
+    except (CommandError, ConflictError, SnapshotDamagedError, OSError) as error:
+        # OSError: e.g. a data file that cannot be read or written, or a full disk
+        print("Error:", error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # python -m ManagementCLI <list|show|add|modify|delete|search|import|export> <table> ...
+    # Opens and saves tables exactly as the GUI does, without starting Tk
+    sys.exit(main())
@@ -1,7 +1,46 @@
 import tkinter as tk
-from tkinter import messagebox, ttk, simpledialog
-from Classes import Employee, Guest, Venue, Supplier, Event, EventType, save_data, load_data, JobTitle
+from tkinter import messagebox, ttk, simpledialog, filedialog
+from Classes import Employee, Guest, Venue, Supplier, save_data, JobTitle, LazyTable, \
+    lazy_load_report
+from Repository import DATABASE_FILE, PICKLE_FILES, build_date_index, build_table_index, build_venue_index, open_repository
+from Storage import BackgroundWriter, ConflictError, SequenceAllocator, changed_on_disk
+from Columnar import load_guest_table
+from Exporter import EXPORT_FORMATS, export_table
+from Importer import IMPORTABLE_TABLES, ImportFailed, RecordChecks, event_link_problem, import_file, venue_conflicts
+from Indexes import BOOKING_TABLES, SEARCH_FIELDS, booking_slot
+from TableView import SearchBar, VirtualTreeview
+from CalendarView import CalendarView
+from Capacity import CapacityIndex
+from Costing import CostIndex, parse_amount
+from Reports import REPORT_TABLES, Rollups
+from Profiling import Profiler
+from Archive import ArchiveError, archive_records, past_season_keys, with_archive
+import os
 import random
+import time
+
+# Treeview attribute of every table; the data file of each is PICKLE_FILES[table]
+TABLE_TREES = {
+    "employees": "employee_tree",
+    "clients_events": "client_tree",
+    "events": "event_tree",
+    "suppliers": "supplier_tree",
+    "guests": "guest_tree",
+    "venues": "venue_tree",
+}
+
+# Callbacks timed by the profiler: screens, dialogs' save/apply/delete actions, tree refreshes and imports
+PROFILED_PREFIXES = ("display_", "save_new_", "apply_", "delete_", "update_", "refresh_tree", "record_changed",
+                     "filter_tree", "run_import", "run_export")
+
+# How often the performance stats panel is redrawn while it is open
+STATS_REFRESH_MS = 1000
+
+# How often tables are checked for records saved by other instances sharing the data files
+REMOTE_POLL_MS = 5000
+
+# IDs reserved from a table's sequence at a time for the Add dialogs
+ID_BLOCK_SIZE = 50
 
 
 class ManagementSystemGUI:
@@ -10,17 +49,450 @@ class ManagementSystemGUI:
 
         self.master = master
         self.master.title("Best Events Company Management System")
-
-        # Load data from persistent storage, handling potential errors if data files are missing.
-        self.employees = load_data("employees.pkl")
-        self.clients_events = load_data("clients_events.pkl")
-        self.events = load_data("events.pkl")
-        self.suppliers = load_data("suppliers.pkl")
-        self.guests = load_data("guests.pkl")
-        self.venues = load_data("venues.pkl")
+        startup_start = time.perf_counter()
+
+        # Use the SQLite repository once the .pkl files have been imported into it (python Repository.py),
+        # otherwise each pickle file is only loaded when a screen first needs it (see LazyTable).
+        if os.path.exists(DATABASE_FILE):
+            tables = open_repository(DATABASE_FILE)
+            self.employees = tables["employees"]
+            self.clients_events = tables["clients_events"]
+            self.events = tables["events"]
+            self.suppliers = tables["suppliers"]
+            self.guests = tables["guests"]
+            self.venues = tables["venues"]
+        else:
+            self.employees = LazyTable(PICKLE_FILES["employees"])
+            self.clients_events = LazyTable(PICKLE_FILES["clients_events"])
+            self.events = LazyTable(PICKLE_FILES["events"])
+            self.suppliers = LazyTable(PICKLE_FILES["suppliers"])
+            self.guests = LazyTable(PICKLE_FILES["guests"], loader=load_guest_table)
+            self.venues = LazyTable(PICKLE_FILES["venues"])
+            # Records archived from past seasons are read from a memory-mapped file as they are shown
+            for table, file_name in PICKLE_FILES.items():
+                setattr(self, table, with_archive(getattr(self, table), file_name))
+
+        # Search indexes, built the first time a table is searched and then kept up to date
+        self.indexes = {}
+        self.search_bars = {}  # table -> SearchBar of its screen
+        self.venue_index = None  # bookings of every venue, built the first time one is checked
+        self.date_index = None  # events and client bookings by date, built when the calendar first opens
+        self.capacity = None  # guests per event and venue bounds, built the first time capacity is checked
+        self.costs = None  # event costs with client and month totals, built the first time costs are needed
+        self.rollups = None  # grouped counts and totals for the reports screen, built when it first opens
+
+        # Wall time of saves and UI callbacks, see Tools > Performance Stats
+        self.profiler = Profiler()
+        self.instrument_callbacks()
+
+        # Edits are saved on a background thread; several quick edits to a table become one write.
+        self.writer = BackgroundWriter(save=self.profiled_save)
+        self.check_writer_errors()
+        self.poll_remote_changes()
+        self.ids = SequenceAllocator(block_size=ID_BLOCK_SIZE)
 
         # Setup the initial interface that users see upon launching the application.
+        self.setup_menu()
         self.setup_welcome_frame()
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.startup_ms = (time.perf_counter() - startup_start) * 1000
+        print(f"Startup finished in {self.startup_ms:.1f} ms")
+
+    def lazy_tables(self):
+        # The tables that are loaded on demand (none when running on the SQLite repository)
+        tables = (self.employees, self.clients_events, self.events, self.suppliers, self.guests, self.venues)
+        return [table for table in tables if isinstance(table, LazyTable)]
+
+    def print_load_report(self):
+        # Every table still unloaded here is load time the session never had to pay
+        for line in lazy_load_report(self.lazy_tables()):
+            print(line)
+
+    def instrument_callbacks(self):
+        # Replace the callbacks with timed versions before any button or lambda refers to them
+        for name in dir(type(self)):
+            if name.startswith(PROFILED_PREFIXES) and callable(getattr(type(self), name)):
+                records = None
+                if name.startswith("update_") and name[len("update_"):] in TABLE_TREES.values():
+                    records = lambda tree=name[len("update_"):]: len(getattr(self, tree).keys)
+                setattr(self, name, self.profiler.wrap(getattr(self, name), records=records))
+
+    def profiled_save(self, data, file_path):
+        # save_data timed on the writer thread, with the number of changed records and the bytes written
+        loaded = not isinstance(data, LazyTable) or data.loaded
+        pending = data.pending_changes() if loaded and hasattr(data, "pending_changes") else None
+        with self.profiler.measure(f"save_data {os.path.basename(file_path)}", pending) as sample:
+            sample.bytes = save_data(data, file_path)
+        return sample.bytes
+
+    def display_performance_stats(self):
+        stats_window = tk.Toplevel(self.master)
+        stats_window.title("Performance Stats")
+        columns = ("Call", "Calls", "Total ms", "Mean ms", "Max ms", "Last ms", "Records", "Bytes")
+        stats_tree = ttk.Treeview(stats_window, columns=columns, show='headings', height=20)
+        for column in columns:
+            stats_tree.heading(column, text=column)
+            stats_tree.column(column, width=220 if column == "Call" else 80, anchor='w' if column == "Call" else 'e')
+        stats_tree.pack(padx=10, pady=10, fill='both', expand=True)
+        tk.Button(stats_window, text="Reset", command=self.profiler.reset).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(stats_window, text="Dump Trace...", command=self.dump_trace).pack(side=tk.LEFT, padx=10, pady=10)
+
+        def redraw():
+            if not stats_window.winfo_exists():
+                return
+            stats_tree.delete(*stats_tree.get_children())
+            for name, stats in self.profiler.report():
+                stats_tree.insert('', tk.END, values=(name, stats.calls, f"{stats.total * 1000:.1f}",
+                                                      f"{stats.total * 1000 / stats.calls:.2f}",
+                                                      f"{stats.max * 1000:.1f}", f"{stats.last * 1000:.1f}",
+                                                      stats.records, stats.bytes))
+            stats_window.after(STATS_REFRESH_MS, redraw)
+        redraw()
+
+    def dump_trace(self):
+        trace_path = filedialog.asksaveasfilename(defaultextension=".json", initialfile="trace.json",
+                                                  filetypes=[("Chrome trace", "*.json")])
+        if not trace_path:
+            return
+        try:
+            count = self.profiler.dump_trace(trace_path)
+        except OSError as error:
+            messagebox.showerror("Error", f"Failed to write the trace: {error}")
+            return
+        messagebox.showinfo("Trace Saved", f"{count} calls written to {trace_path}\n"
+                                           "Open it in chrome://tracing or ui.perfetto.dev")
+
+    def archive_past_events(self):
+        if os.path.exists(DATABASE_FILE):
+            messagebox.showerror("Error", "Archiving is only available when the data is kept in .pkl files")
+            return
+        cutoff = simpledialog.askstring("Archive Past Events", "Archive the events dated before (YYYY-MM-DD):",
+                                        parent=self.master)
+        if not cutoff:
+            return
+        try:
+            event_keys, guest_keys = past_season_keys(self.events, self.guests, cutoff)
+        except ValueError as error:
+            messagebox.showerror("Error", str(error))
+            return
+        if not event_keys:
+            messagebox.showinfo("Archive", f"No events dated before {cutoff} left to archive")
+            return
+        if not messagebox.askyesno("Confirm", f"Move {len(event_keys)} events and {len(guest_keys)} guests into "
+                                              "the read-only archive? They can still be viewed and modified, "
+                                              "but no longer deleted."):
+            return
+        self.writer.flush()  # nothing may be saving the live tables while records move out of them
+        try:
+            for table, keys in (("events", event_keys), ("guests", guest_keys)):
+                if keys:
+                    setattr(self, table, archive_records(getattr(self, table), PICKLE_FILES[table], keys))
+        except ConflictError as error:
+            self.show_remote_changes()
+            messagebox.showwarning("Edit Conflict", f"Nothing more was archived: {error}")
+            return
+        except OSError as error:
+            messagebox.showerror("Error", f"Failed to write the archive: {error}")
+            return
+        finally:
+            self.costs = None  # holds on to the events table it was built from
+            for table in ("events", "guests"):
+                self.refresh_tree(table)
+        messagebox.showinfo("Archive", f"Archived {len(event_keys)} events and {len(guest_keys)} guests")
+
+    def record_changed(self, table, key):
+        # Save one added, modified or deleted record and bring its tree row and search indexes up to date
+        data = getattr(self, table)
+        self.writer.schedule_save(data, PICKLE_FILES[table])
+        self.index_change(table, key, data)
+        getattr(self, TABLE_TREES[table]).apply_change(key)
+
+    def index_change(self, table, key, data):
+        if table in self.indexes:
+            self.indexes[table].apply_change(key, data)
+        if table in BOOKING_TABLES and self.venue_index is not None:
+            self.venue_index.apply_change(table, key, data)
+        if table in BOOKING_TABLES and self.date_index is not None:
+            self.date_index.apply_change(table, key, data)
+        if table in ("guests", "venues") and self.capacity is not None:
+            changed_events = self.capacity.apply_change(table, key, data)
+            if self.costs is not None:
+                self.costs.refresh_events(changed_events)
+        if table in ("events", "suppliers", "clients_events") and self.costs is not None:
+            self.costs.apply_change(table, key, data)
+        if table in REPORT_TABLES and self.rollups is not None:
+            self.rollups.apply_change(table, key, data)
+
+    def table_index(self, table):
+        if table not in self.indexes:
+            self.indexes[table] = build_table_index(table, getattr(self, table))
+        return self.indexes[table]
+
+    def add_search_bar(self, parent, table):
+        # Search box above a management tree, filtering it through the table's prefix indexes
+        self.search_bars[table] = SearchBar(parent, list(SEARCH_FIELDS[table]),
+                                            lambda field, text: self.filter_tree(table, field, text))
+        self.search_bars[table].pack(padx=10, pady=(10, 0), fill='x')
+
+    def filter_tree(self, table, field, text):
+        tree = getattr(self, TABLE_TREES[table])
+        if not text:
+            tree.filter(None)
+            return
+        # The predicate keeps rows added or modified while the filter is on in step with it
+        index = self.table_index(table)
+        tree.filter(index.search(field, text), index.matches(field, text))
+
+    def booking_index(self):
+        if self.venue_index is None:
+            self.venue_index = build_venue_index({table: getattr(self, table) for table in BOOKING_TABLES})
+        return self.venue_index
+
+    def check_booking(self, table, key, record):
+        # Refuse dates that cannot be read or that double-book the venue; returns True when the slot is free
+        slot = booking_slot(record)
+        if slot is None:
+            messagebox.showerror("Error", "Enter the date as YYYY-MM-DD, the time as HH:MM and the duration in hours")
+            return False
+        problem = venue_conflicts(self.booking_index(), table, key, record)
+        if problem:
+            messagebox.showerror("Venue Unavailable", problem)
+            return False
+        return True
+
+    def drop_derived_indexes(self, table):
+        # After a bulk change to table, e.g. an import: everything built from it is rebuilt when next
+        # needed rather than updated record by record
+        self.indexes.pop(table, None)
+        if table in BOOKING_TABLES:
+            self.venue_index = self.date_index = None
+        if table in ("guests", "venues"):
+            self.capacity = None
+        if table in ("guests", "venues", "events", "suppliers", "clients_events"):
+            self.costs = None  # guest numbers feed into event costs
+        if table in REPORT_TABLES:
+            self.rollups = None
+
+    def capacity_index(self):
+        if self.capacity is None:
+            self.capacity = CapacityIndex().build(self.guests, self.venues)
+        return self.capacity
+
+    def cost_index(self):
+        if self.costs is None:
+            self.costs = CostIndex(self.capacity_index()).build(self.events, self.suppliers, self.clients_events)
+        return self.costs
+
+    def display_cost_report(self):
+        costs = self.cost_index()
+        lines = ["Totals by client:"]
+        for client_id, total, budget in costs.client_report():
+            lines.append(f"  Client {client_id}: ${total:,}" + ("" if budget is None else f" (budget ${budget:,.0f})"))
+        lines.append("Totals by month:")
+        lines += [f"  {month}: ${total:,}" for month, total in costs.month_report()]
+        lines.append("Events over their client's budget:")
+        lines += [f"  Event {event_id}: ${cost:,} against ${budget:,.0f}"
+                  for event_id, cost, budget in costs.over_budget_report()] or ["  None"]
+
+        report_window = tk.Toplevel(self.master)
+        report_window.title("Event Costs")
+        text = tk.Text(report_window, width=60, height=25)
+        text.insert(tk.END, "\n".join(lines))
+        text.config(state=tk.DISABLED)
+        text.pack(padx=10, pady=10, fill='both', expand=True)
+
+    def warn_if_over_budget(self, event_id):
+        costs = self.cost_index()
+        if event_id in costs.over_budget:
+            _, _, budget = next(entry for entry in costs.over_budget_report() if entry[0] == event_id)
+            messagebox.showwarning("Over Budget", f"Event {event_id} costs ${costs.cost_of(event_id):,}, "
+                                                  f"more than the client's budget of ${budget:,.0f}")
+
+    def event_links(self, client_id_text, suppliers_text):
+        # Parse the Client ID and Supplier IDs fields of the event dialogs; returns (ok, client ID, supplier IDs)
+        try:
+            client_id = int(client_id_text) if client_id_text.strip() else None
+            supplier_ids = [int(part) for part in suppliers_text.split(",") if part.strip()]
+        except ValueError:
+            messagebox.showerror("Error", "Client ID and Supplier IDs must be numbers, e.g. 3 or 2, 5")
+            return False, None, []
+        problem = event_link_problem({'client_id': client_id, 'suppliers': supplier_ids}, self.clients_events,
+                                     self.suppliers)
+        if problem:
+            messagebox.showerror("Error", problem)
+            return False, None, []
+        return True, client_id, supplier_ids
+
+    def display_capacity_report(self):
+        problems = self.capacity_index().report(self.events)
+        if not problems:
+            messagebox.showinfo("Capacity Report", "Every event fits its venue")
+            return
+        lines = [f"Event {event_id}: {problem}" for event_id, problem in problems[:20]]
+        if len(problems) > 20:
+            lines.append(f"... and {len(problems) - 20} more")
+        messagebox.showwarning("Capacity Report", "\n".join(lines))
+
+    def display_booking_conflicts(self):
+        pairs = self.booking_index().all_conflicts()
+        if not pairs:
+            messagebox.showinfo("Double Bookings", "No venue is double-booked")
+            return
+        lines = [f"{venue}: {BOOKING_TABLES[first[0]]} {first[1]} and {BOOKING_TABLES[second[0]]} {second[1]}"
+                 for venue, first, second in pairs[:20]]
+        if len(pairs) > 20:
+            lines.append(f"... and {len(pairs) - 20} more")
+        messagebox.showwarning("Double Bookings", "\n".join(lines))
+
+    def allocate_id(self, table, data):
+        # Take the next ID of a table from its persistent sequence instead of scanning for the maximum;
+        # IDs come from a block reserved (and saved) in advance, so opening a dialog seldom touches the disk
+        return self.ids.next_id(table, data)
+
+    def check_writer_errors(self):
+        # Report background save failures on the Tk thread, polling since Tk is not thread-safe
+        while not self.writer.errors.empty():
+            file_path, error = self.writer.errors.get()
+            if isinstance(error, ConflictError):
+                self.show_remote_changes()
+                messagebox.showwarning("Edit Conflict", f"Some edits to {file_path} were not saved. {error}")
+            else:
+                messagebox.showerror("Error", f"Failed to save {file_path}: {error}")
+        self.master.after(1000, self.check_writer_errors)
+
+    def loaded_tables(self):
+        # (table, data) of every table in memory that can merge in changes saved by other instances
+        for table in PICKLE_FILES:
+            data = getattr(self, table)
+            if isinstance(data, LazyTable) and not data.loaded:
+                continue
+            if hasattr(data, "drain_merged"):
+                yield table, data
+
+    def show_remote_changes(self):
+        # Bring the trees and search indexes up to date with records merged in from other instances
+        for table, data in self.loaded_tables():
+            tree = getattr(self, TABLE_TREES[table], None)
+            for key in data.drain_merged():
+                self.index_change(table, key, data)
+                if tree is not None and tree.winfo_exists():
+                    tree.apply_change(key)
+
+    def poll_remote_changes(self):
+        # A save with no local edits just reads what other instances have saved since; tables whose
+        # files are unchanged are skipped without taking their lock
+        self.show_remote_changes()
+        for table, data in self.loaded_tables():
+            if changed_on_disk(PICKLE_FILES[table]):
+                self.writer.schedule_save(data, PICKLE_FILES[table])
+        self.master.after(REMOTE_POLL_MS, self.poll_remote_changes)
+
+    def on_close(self):
+        # Make sure every pending edit reaches the disk before the window goes away
+        self.writer.close()
+        self.print_load_report()
+        self.master.destroy()
+
+    def setup_menu(self):
+        menubar = tk.Menu(self.master)
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Import...", command=self.import_records)
+        file_menu.add_command(label="Export...", command=self.export_records)
+        menubar.add_cascade(label="File", menu=file_menu)
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="Performance Stats", command=self.display_performance_stats)
+        tools_menu.add_command(label="Dump Trace...", command=self.dump_trace)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Archive Past Events...", command=self.archive_past_events)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        self.master.config(menu=menubar)
+
+    def refresh_tree(self, table):
+        # Reload a table's tree after a bulk change, if its screen is currently open
+        tree = getattr(self, TABLE_TREES[table], None)
+        if tree is not None and tree.winfo_exists():
+            tree.set_rows(getattr(self, table), tree.row_values)
+            search_bar = self.search_bars.get(table)
+            if search_bar is not None and search_bar.winfo_exists():
+                search_bar.search()  # keep showing what the search bar says, over the reloaded rows
+
+    def import_records(self):
+        import_window = tk.Toplevel(self.master)
+        import_window.title("Import Records")
+
+        tk.Label(import_window, text="Import into:").grid(row=0, column=0)
+        table_var = tk.StringVar(value=IMPORTABLE_TABLES[0])
+        table_dropdown = ttk.Combobox(import_window, textvariable=table_var, state="readonly",
+                                      values=IMPORTABLE_TABLES)
+        table_dropdown.grid(row=0, column=1)
+
+        tk.Label(import_window, text="File (.csv, .json, .jsonl):").grid(row=1, column=0)
+        path_entry = tk.Entry(import_window)
+        path_entry.grid(row=1, column=1)
+        tk.Button(import_window, text="Browse...",
+                  command=lambda: self.browse_file(path_entry, filedialog.askopenfilename)).grid(row=1, column=2)
+
+        tk.Button(import_window, text="Import",
+                  command=lambda: self.run_import(import_window, table_var.get(), path_entry.get())).grid(row=2,
+                                                                                                        columnspan=3)
+
+    def browse_file(self, path_entry, ask):
+        file_path = ask(parent=path_entry, filetypes=[("Data files", "*.csv *.json *.jsonl")])
+        if file_path:
+            path_entry.delete(0, tk.END)
+            path_entry.insert(0, file_path)
+
+    def run_import(self, import_window, table, import_path):
+        if not import_path:
+            messagebox.showerror("Error", "Choose a file to import")
+            return
+        data = getattr(self, table)
+        # Imported records go through the same checks as the Add dialogs, using the indexes built here
+        checks = RecordChecks({name: getattr(self, name) for name in PICKLE_FILES}, self.capacity, self.venue_index)
+        try:
+            result = import_file(import_path, table, data, self.ids, self.writer.schedule_save, PICKLE_FILES[table],
+                                 checks=checks)
+        except (OSError, ValueError, ImportFailed) as e:
+            messagebox.showerror("Error", "Failed to import records: " + str(e))
+            return
+        finally:
+            self.drop_derived_indexes(table)
+            self.refresh_tree(table)  # batches imported before a failure are in the table too
+        import_window.destroy()
+        messagebox.showinfo("Import Finished", result.summary())
+
+    def export_records(self):
+        export_window = tk.Toplevel(self.master)
+        export_window.title("Export Records")
+
+        tk.Label(export_window, text="Export table:").grid(row=0, column=0)
+        table_var = tk.StringVar(value="guests")
+        table_dropdown = ttk.Combobox(export_window, textvariable=table_var, state="readonly",
+                                      values=list(PICKLE_FILES))
+        table_dropdown.grid(row=0, column=1)
+
+        tk.Label(export_window, text="Format:").grid(row=1, column=0)
+        format_var = tk.StringVar(value=EXPORT_FORMATS[0])
+        format_dropdown = ttk.Combobox(export_window, textvariable=format_var, state="readonly",
+                                       values=EXPORT_FORMATS)
+        format_dropdown.grid(row=1, column=1)
+
+        tk.Button(export_window, text="Export...",
+                  command=lambda: self.run_export(export_window, table_var.get(), format_var.get())).grid(row=2,
+                                                                                                        columnspan=2)
+
+    def run_export(self, export_window, table, extension):
+        output_path = filedialog.asksaveasfilename(parent=export_window, defaultextension=extension,
+                                                   initialfile=table + extension)
+        if not output_path:
+            return
+        try:
+            count = export_table(table, getattr(self, table), output_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", "Failed to export records: " + str(e))
+            return
+        export_window.destroy()
+        messagebox.showinfo("Export Finished", f"Exported {count} {table} to {output_path}")
 
     def setup_welcome_frame(self):
         # Set up the welcome frame that allows users to select their role to log in.
@@ -59,6 +531,42 @@ class ManagementSystemGUI:
 
         tk.Button(self.management_frame, text="Manage Employees", command=self.manage_employees).pack(pady=10)
         tk.Button(self.management_frame, text="Manage Clients", command=self.manage_clients).pack(pady=10)
+        tk.Button(self.management_frame, text="Reports", command=self.display_reports).pack(pady=10)
+
+    def display_reports(self):
+        for widget in self.management_frame.winfo_children():
+            widget.destroy()
+
+        if self.rollups is None:
+            self.rollups = Rollups().build(self.employees, self.events)
+        payroll_rows, total_payroll = self.rollups.payroll_report()
+        supplier_rows = [(supplier_id, self.suppliers[supplier_id].name if supplier_id in self.suppliers else "(deleted)", count)
+                         for supplier_id, count in self.rollups.supplier_report()]
+        reports = [
+            ("Headcount", ("Department", "Job Title", "Employees"), self.rollups.headcount_report()),
+            (f"Payroll (total ${total_payroll:,})", ("Department", "Employees", "Total Salary"), payroll_rows),
+            ("Events per Month", ("Month", "Type", "Events"), self.rollups.events_report()),
+            ("Supplier Usage", ("Supplier ID", "Name", "Events"), supplier_rows),
+        ]
+        reports_frame = tk.Frame(self.management_frame)
+        reports_frame.pack(padx=10, pady=10, fill='both', expand=True)
+        for position, (title, columns, rows) in enumerate(reports):
+            frame = tk.LabelFrame(reports_frame, text=title)
+            frame.grid(row=position // 2, column=position % 2, padx=5, pady=5, sticky='nsew')
+            tree = ttk.Treeview(frame, columns=columns, show='headings', height=8)
+            for column in columns:
+                tree.heading(column, text=column)
+                tree.column(column, width=140)
+            for row in rows:
+                tree.insert('', tk.END, values=row)
+            tree.pack(fill='both', expand=True)
+        for position in range(2):
+            reports_frame.columnconfigure(position, weight=1)
+            reports_frame.rowconfigure(position, weight=1)
+
+        tk.Button(self.management_frame, text="Refresh", command=self.display_reports).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(self.management_frame, text="Back to Menu", command=self.display_main_menu).pack(side=tk.LEFT,
+                                                                                                   padx=10, pady=10)
 
     def display_client_management_options(self):
         # Display the management options for Managing Events and Suppliers and Guests.
@@ -66,7 +574,26 @@ class ManagementSystemGUI:
         tk.Button(self.management_frame, text="Manage Suppliers", command=self.display_supplier_management).pack(pady=10)
         tk.Button(self.management_frame, text="Manage Guests", command=self.display_guest_management).pack(pady=10)
         tk.Button(self.management_frame, text="Manage Venues", command=self.manage_venues).pack(pady=10)
+        tk.Button(self.management_frame, text="Calendar", command=self.display_calendar).pack(pady=10)
+
+
+    def display_calendar(self):
+        for widget in self.management_frame.winfo_children():
+            widget.destroy()
+
+        if self.date_index is None:
+            self.date_index = build_date_index({table: getattr(self, table) for table in BOOKING_TABLES})
+        self.calendar_view = CalendarView(self.management_frame, self.date_index, self.describe_booking)
+        self.calendar_view.pack(padx=10, pady=10, fill='both', expand=True)
+
+        tk.Button(self.management_frame, text="Back to Menu", command=self.display_main_menu).pack(side=tk.LEFT,
+                                                                                                   padx=10, pady=10)
 
+    def describe_booking(self, table, key):
+        record = getattr(self, table)[key]
+        if table == "events":
+            return f"{record['name']} ({record['venue']})"
+        return f"{record['time']} {BOOKING_TABLES[table]} {key} ({record['venue']})"
 
     def manage_employees(self):
         self.display_employee_management()
@@ -88,8 +615,9 @@ class ManagementSystemGUI:
         for widget in self.management_frame.winfo_children():
             widget.destroy()
 
-        self.employee_tree = ttk.Treeview(self.management_frame,
-                                          columns=("ID", "Name", "Department", "Job Title", "Salary"), show="headings")
+        self.add_search_bar(self.management_frame, "employees")
+        self.employee_tree = VirtualTreeview(self.management_frame,
+                                             columns=("ID", "Name", "Department", "Job Title", "Salary"))
         self.employee_tree.heading("ID", text="ID")
         self.employee_tree.heading("Name", text="Name")
         self.employee_tree.heading("Department", text="Department")
@@ -111,17 +639,17 @@ class ManagementSystemGUI:
         self.update_employee_tree()
 
     def update_employee_tree(self):
-        self.employee_tree.delete(*self.employee_tree.get_children())
-        for emp_id, emp in self.employees.items():
-            self.employee_tree.insert("", "end",
-                                      values=(emp.id, emp.name, emp.department, emp.job_title.value, emp.salary))
+        self.employee_tree.set_rows(self.employees, self.employee_row)
+
+    def employee_row(self, emp_id, emp):
+        return emp.id, emp.name, emp.department, emp.job_title.value, emp.salary
 
     def add_employee(self):
         add_window = tk.Toplevel(self.master)
         add_window.title("Add New Employee")
 
         # Generate the next unique employee ID
-        next_id = max(self.employees.keys(), default=0) + 1
+        next_id = self.allocate_id("employees", self.employees)
 
         # Name entry
         tk.Label(add_window, text="Name:").grid(row=1, column=0)
@@ -157,8 +685,7 @@ class ManagementSystemGUI:
         if name and department and job_title:
             new_emp = Employee(emp_id, name, department, job_title_enum, salary)
             self.employees[emp_id] = new_emp
-            save_data(self.employees, "employees.pkl")
-            self.update_employee_tree()
+            self.record_changed("employees", emp_id)
             add_window.destroy()
             messagebox.showinfo("Success", "Employee added successfully")
         else:
@@ -170,8 +697,7 @@ class ManagementSystemGUI:
             emp_id = int(self.employee_tree.item(selected_item, 'values')[0])
             if messagebox.askyesno("Confirm", "Do you want to delete this employee?"):
                 del self.employees[emp_id]
-                save_data(self.employees, "employees.pkl")
-                self.update_employee_tree()
+                self.record_changed("employees", emp_id)
                 messagebox.showinfo("Success", "Employee deleted successfully")
         else:
             messagebox.showerror("Error", "No employee selected")
@@ -229,8 +755,8 @@ class ManagementSystemGUI:
             employee.department = department
             employee.job_title = JobTitle[job_title.replace(' ', '_').upper()]
             employee.salary = int(salary)
-            save_data(self.employees, "employees.pkl")
-            self.update_employee_tree()
+            self.employees[emp_id] = employee  # reassign so the change is journaled
+            self.record_changed("employees", emp_id)
             modify_window.destroy()
             messagebox.showinfo("Success", "Employee details updated successfully")
         else:
@@ -253,9 +779,9 @@ class ManagementSystemGUI:
         for widget in self.management_frame.winfo_children():
             widget.destroy()
 
-        self.client_tree = ttk.Treeview(self.management_frame,
-                                        columns=("Client ID", "Type", "Date", "Time", "Duration", "Venue"),
-                                        show="headings")
+        self.add_search_bar(self.management_frame, "clients_events")
+        self.client_tree = VirtualTreeview(self.management_frame,
+                                           columns=("Client ID", "Type", "Date", "Time", "Duration", "Venue"))
         self.client_tree.heading("Client ID", text="Client ID")
         self.client_tree.heading("Type", text="Type")
         self.client_tree.heading("Date", text="Date")
@@ -279,16 +805,16 @@ class ManagementSystemGUI:
         self.update_client_tree()
 
     def update_client_tree(self):
-        self.client_tree.delete(*self.client_tree.get_children())
-        for client_id, details in self.clients_events.items():
-            self.client_tree.insert("", "end", values=(
-                client_id, details['type'], details['date'], details['time'], details['duration'], details['venue']))
+        self.client_tree.set_rows(self.clients_events, self.client_row)
+
+    def client_row(self, client_id, details):
+        return client_id, details['type'], details['date'], details['time'], details['duration'], details['venue']
 
     def add_client(self):
         add_window = tk.Toplevel(self.master)
         add_window.title("Add New Client")
 
-        client_id = max(self.clients_events.keys(), default=0) + 1
+        client_id = self.allocate_id("clients_events", self.clients_events)
 
         tk.Label(add_window, text="Assigned Client ID:").grid(row=0, column=0)
         tk.Label(add_window, text=str(client_id)).grid(row=0, column=1)
@@ -317,17 +843,36 @@ class ManagementSystemGUI:
                                       values=["Venue A", "Venue B", "Venue C"])
         venue_dropdown.grid(row=5, column=1)
 
+        tk.Label(add_window, text="Budget (optional):").grid(row=6, column=0)
+        budget_entry = tk.Entry(add_window)
+        budget_entry.grid(row=6, column=1)
+
         tk.Button(add_window, text="Save Client",
                   command=lambda: self.save_new_client(add_window, client_id, type_var.get(), date_entry.get(),
-                                                       time_entry.get(), duration_entry.get(), venue_var.get())).grid(
-            row=6, columnspan=2)
-
-    def save_new_client(self, add_window, client_id, type, date, time, duration, venue):
+                                                       time_entry.get(), duration_entry.get(), venue_var.get(),
+                                                       budget_entry.get())).grid(row=7, columnspan=2)
+
+    def client_budget(self, budget_text):
+        # Parse the optional Budget field of the client dialogs; returns (ok, budget or None)
+        if not budget_text.strip():
+            return True, None
+        budget = parse_amount(budget_text)
+        if budget is None or budget < 0:
+            messagebox.showerror("Error", "Budget must be an amount, e.g. 12000")
+            return False, None
+        return True, budget
+
+    def save_new_client(self, add_window, client_id, type, date, time, duration, venue, budget_text=""):
         if type and date and time and duration and venue:
-            self.clients_events[client_id] = {'type': type, 'date': date, 'time': time, 'duration': duration,
-                                              'venue': venue}
-            save_data(self.clients_events, "clients_events.pkl")
-            self.update_client_tree()
+            valid, budget = self.client_budget(budget_text)
+            if not valid:
+                return
+            client = {'type': type, 'date': date, 'time': time, 'duration': duration, 'venue': venue,
+                      'budget': budget}
+            if not self.check_booking("clients_events", client_id, client):
+                return
+            self.clients_events[client_id] = client
+            self.record_changed("clients_events", client_id)
             add_window.destroy()
             messagebox.showinfo("Success", "Client added successfully")
         else:
@@ -339,8 +884,7 @@ class ManagementSystemGUI:
             client_id = int(self.client_tree.item(selected_item, 'values')[0])
             if messagebox.askyesno("Confirm", "Do you want to delete this client?"):
                 del self.clients_events[client_id]
-                save_data(self.clients_events, "clients_events.pkl")
-                self.update_client_tree()
+                self.record_changed("clients_events", client_id)
                 messagebox.showinfo("Success", "Client deleted successfully")
         else:
             messagebox.showerror("Error", "No client selected")
@@ -381,22 +925,32 @@ class ManagementSystemGUI:
                                               values=["Venue A", "Venue B", "Venue C"])
                 venue_dropdown.grid(row=4, column=1)
 
+                tk.Label(modify_window, text="Budget (optional):").grid(row=5, column=0)
+                budget_entry = tk.Entry(modify_window)
+                budget_entry.insert(0, "" if client_details.get('budget') is None else str(client_details['budget']))
+                budget_entry.grid(row=5, column=1)
+
                 tk.Button(modify_window, text="Save Changes",
                           command=lambda: self.apply_client_changes(modify_window, client_id, type_var.get(),
                                                                     date_entry.get(), time_entry.get(),
-                                                                    duration_entry.get(), venue_var.get())).grid(row=5,
-                                                                                                                 columnspan=2)
+                                                                    duration_entry.get(), venue_var.get(),
+                                                                    budget_entry.get())).grid(row=6, columnspan=2)
             else:
                 messagebox.showerror("Error", "Client not found")
         else:
             messagebox.showerror("Error", "No client selected")
 
-    def apply_client_changes(self, modify_window, client_id, type, date, time, duration, venue):
+    def apply_client_changes(self, modify_window, client_id, type, date, time, duration, venue, budget_text=""):
         if type and date and time and duration and venue:
-            self.clients_events[client_id] = {'type': type, 'date': date, 'time': time, 'duration': duration,
-                                              'venue': venue}
-            save_data(self.clients_events, "clients_events.pkl")
-            self.update_client_tree()
+            valid, budget = self.client_budget(budget_text)
+            if not valid:
+                return
+            client = {'type': type, 'date': date, 'time': time, 'duration': duration, 'venue': venue,
+                      'budget': budget}
+            if not self.check_booking("clients_events", client_id, client):
+                return
+            self.clients_events[client_id] = client
+            self.record_changed("clients_events", client_id)
             modify_window.destroy()
             messagebox.showinfo("Success", "Client details updated successfully")
         else:
@@ -419,9 +973,9 @@ class ManagementSystemGUI:
         for widget in self.management_frame.winfo_children():
             widget.destroy()
 
-        self.supplier_tree = ttk.Treeview(self.management_frame,
-                                          columns=("Supplier ID", "Name", "Service", "Contact Details"),
-                                          show="headings")
+        self.add_search_bar(self.management_frame, "suppliers")
+        self.supplier_tree = VirtualTreeview(self.management_frame,
+                                             columns=("Supplier ID", "Name", "Service", "Contact Details"))
         self.supplier_tree.heading("Supplier ID", text="Supplier ID")
         self.supplier_tree.heading("Name", text="Name")
         self.supplier_tree.heading("Service", text="Service")
@@ -444,15 +998,15 @@ class ManagementSystemGUI:
         self.update_supplier_tree()
 
     def update_supplier_tree(self):
-        self.supplier_tree.delete(*self.supplier_tree.get_children())
-        for supplier_id, supplier in self.suppliers.items():
-            self.supplier_tree.insert("", "end", values=(
-            supplier_id, supplier.name, supplier.service_type, supplier.contact_details))
+        self.supplier_tree.set_rows(self.suppliers, self.supplier_row)
+
+    def supplier_row(self, supplier_id, supplier):
+        return supplier_id, supplier.name, supplier.service_type, supplier.contact_details
 
     def add_supplier(self):
         add_window = tk.Toplevel(self.master)
         add_window.title("Add New Supplier")
-        next_id = max(self.suppliers.keys(), default=0) + 1
+        next_id = self.allocate_id("suppliers", self.suppliers)
 
         tk.Label(add_window, text="Supplier ID:").grid(row=0, column=0)
         tk.Label(add_window, text=str(next_id)).grid(row=0, column=1)
@@ -478,10 +1032,9 @@ class ManagementSystemGUI:
 
     def save_new_supplier(self, add_window, supplier_id, name, service_type, contact_details):
         if name and service_type and contact_details:
-            new_supplier = Supplier(supplier_id, name, service_type, contact_details)  # Now matches the constructor
+            new_supplier = Supplier(supplier_id, name, contact_details, service_type)
             self.suppliers[supplier_id] = new_supplier
-            save_data(self.suppliers, "suppliers.pkl")
-            self.update_supplier_tree()
+            self.record_changed("suppliers", supplier_id)
             add_window.destroy()
             messagebox.showinfo("Success", "Supplier added successfully")
         else:
@@ -493,8 +1046,7 @@ class ManagementSystemGUI:
             supplier_id = int(self.supplier_tree.item(selected_item, 'values')[0])
             if messagebox.askyesno("Confirm", "Do you really want to delete this supplier?"):
                 del self.suppliers[supplier_id]
-                save_data(self.suppliers, "suppliers.pkl")
-                self.update_supplier_tree()
+                self.record_changed("suppliers", supplier_id)
                 messagebox.showinfo("Success", "Supplier deleted successfully")
         else:
             messagebox.showerror("Error", "No supplier selected")
@@ -542,8 +1094,8 @@ class ManagementSystemGUI:
                 supplier.name = name
                 supplier.service_type = service
                 supplier.contact_details = contact_details
-                save_data(self.suppliers, "suppliers.pkl")
-                self.update_supplier_tree()
+                self.suppliers[supplier_id] = supplier  # reassign so the change is journaled
+                self.record_changed("suppliers", supplier_id)
                 modify_window.destroy()
                 messagebox.showinfo("Success", "Supplier details updated successfully")
             else:
@@ -569,9 +1121,9 @@ class ManagementSystemGUI:
         for widget in self.management_frame.winfo_children():
             widget.destroy()
 
-        self.event_tree = ttk.Treeview(self.management_frame,
-                                       columns=("Event ID", "Event Name", "Type", "Date", "Venue", "Theme", "Invoice"),
-                                       show="headings")
+        self.add_search_bar(self.management_frame, "events")
+        self.event_tree = VirtualTreeview(self.management_frame,
+                                          columns=("Event ID", "Event Name", "Type", "Date", "Venue", "Theme", "Invoice"))
         self.event_tree.heading("Event ID", text="Event ID")
         self.event_tree.heading("Event Name", text="Event Name")
         self.event_tree.heading("Type", text="Type")
@@ -585,23 +1137,25 @@ class ManagementSystemGUI:
         tk.Button(self.management_frame, text="Delete Event", command=self.delete_event).pack(side=tk.LEFT, padx=10, pady=10)
         tk.Button(self.management_frame, text="Modify Event", command=self.modify_event).pack(side=tk.LEFT, padx=10, pady=10)
         tk.Button(self.management_frame, text="Display Event Details", command=self.display_event_details).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(self.management_frame, text="Double Bookings", command=self.display_booking_conflicts).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(self.management_frame, text="Capacity Report", command=self.display_capacity_report).pack(side=tk.LEFT, padx=10, pady=10)
+        tk.Button(self.management_frame, text="Costs", command=self.display_cost_report).pack(side=tk.LEFT, padx=10, pady=10)
 
         tk.Button(self.management_frame, text="Back to Menu", command=self.display_main_menu).pack(side=tk.LEFT,
                                                                                                    padx=10, pady=10)
         self.update_event_tree()
 
     def update_event_tree(self):
-        self.event_tree.delete(*self.event_tree.get_children())
-        for event_id, event in self.events.items():
-            self.event_tree.insert("", "end",
-                                   values=(event_id, event['name'], event['type'], event['date'], event['venue'],
-                                           event['theme'], event['invoice']))
+        self.event_tree.set_rows(self.events, self.event_row)
+
+    def event_row(self, event_id, event):
+        return event_id, event['name'], event['type'], event['date'], event['venue'], event['theme'], event['invoice']
 
     def add_event(self):
         add_window = tk.Toplevel(self.master)
         add_window.title("Add New Event")
 
-        event_id = max(self.events.keys(), default=0) + 1
+        event_id = self.allocate_id("events", self.events)
 
         tk.Label(add_window, text="Event Name:").grid(row=0, column=0)
         event_name_entry = tk.Entry(add_window)
@@ -629,23 +1183,39 @@ class ManagementSystemGUI:
         tk.Label(add_window, text="Invoice Number:").grid(row=5, column=0)
         tk.Label(add_window, text=str(invoice_number)).grid(row=5, column=1)
 
-        tk.Button(add_window, text="Save Event", command=lambda: self.save_new_event(add_window, event_id, event_name_entry.get(), type_var.get(), date_entry.get(), venue_var.get(), theme_entry.get(), invoice_number)).grid(row=6, columnspan=2)
+        tk.Label(add_window, text="Client ID (optional):").grid(row=6, column=0)
+        client_id_entry = tk.Entry(add_window)
+        client_id_entry.grid(row=6, column=1)
+
+        tk.Label(add_window, text="Supplier IDs (comma separated):").grid(row=7, column=0)
+        suppliers_entry = tk.Entry(add_window)
+        suppliers_entry.grid(row=7, column=1)
 
-    def save_new_event(self, add_window, event_id, name, type_str, date, venue, theme, invoice):
+        tk.Button(add_window, text="Save Event", command=lambda: self.save_new_event(add_window, event_id, event_name_entry.get(), type_var.get(), date_entry.get(), venue_var.get(), theme_entry.get(), invoice_number, client_id_entry.get(), suppliers_entry.get())).grid(row=8, columnspan=2)
+
+    def save_new_event(self, add_window, event_id, name, type_str, date, venue, theme, invoice, client_id_text="", suppliers_text=""):
         if name and type_str and date and venue and theme:
+            valid, client_id, supplier_ids = self.event_links(client_id_text, suppliers_text)
+            if not valid:
+                return
             new_event = {
                 'name': name,
                 'type': type_str,
                 'date': date,
                 'venue': venue,
                 'theme': theme,
-                'invoice': invoice
+                'invoice': invoice,
+                'client_id': client_id,
+                'suppliers': supplier_ids
             }
+            if not self.check_booking("events", event_id, new_event):
+                return
             self.events[event_id] = new_event
-            save_data(self.events, "events.pkl")
-            self.update_event_tree()
+            self.record_changed("events", event_id)
             add_window.destroy()
             messagebox.showinfo("Success", "Event added successfully")
+            if client_id is not None:
+                self.warn_if_over_budget(event_id)
         else:
             messagebox.showerror("Error", "All fields are required!")
 
@@ -654,9 +1224,12 @@ class ManagementSystemGUI:
         if selected_item:
             event_id = int(self.event_tree.item(selected_item, 'values')[0])
             if messagebox.askyesno("Confirm", "Do you really want to delete this event?"):
-                del self.events[event_id]
-                save_data(self.events, "events.pkl")
-                self.update_event_tree()
+                try:
+                    del self.events[event_id]
+                except ArchiveError as error:
+                    messagebox.showerror("Error", str(error))
+                    return
+                self.record_changed("events", event_id)
                 messagebox.showinfo("Success", "Event deleted successfully")
         else:
             messagebox.showerror("Error", "No event selected")
@@ -695,20 +1268,41 @@ class ManagementSystemGUI:
                 theme_entry.insert(0, event['theme'])
                 theme_entry.grid(row=4, column=1)
 
-                tk.Button(modify_window, text="Save Changes", command=lambda: self.apply_event_changes(modify_window, event_id, event_name_entry.get(), type_var.get(), date_entry.get(), venue_var.get(), theme_entry.get(), event['invoice'])).grid(row=5, columnspan=2)
+                tk.Label(modify_window, text="Client ID (optional):").grid(row=5, column=0)
+                client_id_entry = tk.Entry(modify_window)
+                client_id_entry.insert(0, "" if event.get('client_id') is None else str(event['client_id']))
+                client_id_entry.grid(row=5, column=1)
+
+                tk.Label(modify_window, text="Supplier IDs (comma separated):").grid(row=6, column=0)
+                suppliers_entry = tk.Entry(modify_window)
+                suppliers_entry.insert(0, ", ".join(map(str, event.get('suppliers') or [])))
+                suppliers_entry.grid(row=6, column=1)
+
+                tk.Button(modify_window, text="Save Changes", command=lambda: self.apply_event_changes(modify_window, event_id, event_name_entry.get(), type_var.get(), date_entry.get(), venue_var.get(), theme_entry.get(), event['invoice'], client_id_entry.get(), suppliers_entry.get())).grid(row=7, columnspan=2)
             else:
                 messagebox.showerror("Error", "Event not found")
         else:
             messagebox.showerror("Error", "No event selected")
 
-    def apply_event_changes(self, modify_window, event_id, name, type, date, venue, theme, invoice):
+    def apply_event_changes(self, modify_window, event_id, name, type, date, venue, theme, invoice, client_id_text="", suppliers_text=""):
         if name and type and date and venue and theme:
-            updated_event = {'name': name, 'type': type, 'date': date, 'venue': venue, 'theme': theme, 'invoice': invoice}
+            valid, client_id, supplier_ids = self.event_links(client_id_text, suppliers_text)
+            if not valid:
+                return
+            updated_event = {'name': name, 'type': type, 'date': date, 'venue': venue, 'theme': theme, 'invoice': invoice,
+                             'client_id': client_id, 'suppliers': supplier_ids}
+            if not self.check_booking("events", event_id, updated_event):
+                return
+            problem = self.capacity_index().check_event(event_id, venue)
+            if problem:
+                messagebox.showerror("Venue Too Small", problem)
+                return
             self.events[event_id] = updated_event
-            save_data(self.events, "events.pkl")
-            self.update_event_tree()
+            self.record_changed("events", event_id)
             modify_window.destroy()
             messagebox.showinfo("Success", "Event details updated successfully")
+            if client_id is not None:
+                self.warn_if_over_budget(event_id)
         else:
             messagebox.showerror("Error", "All fields are required!")
 
@@ -719,6 +1313,9 @@ class ManagementSystemGUI:
             event = self.events.get(event_id)
             if event:
                 details = f"Event ID: {event_id}\nEvent Name: {event['name']}\nType: {event['type']}\nDate: {event['date']}\nVenue: {event['venue']}\nTheme: {event['theme']}\nInvoice: {event['invoice']}"
+                details += f"\nClient ID: {event.get('client_id')}\nSupplier IDs: {', '.join(map(str, event.get('suppliers') or [])) or 'None'}"
+                cost = self.cost_index().cost_of(event_id)
+                details += "\nCost: not costed (archived)" if cost is None else f"\nCost: ${cost:,}"
                 messagebox.showinfo("Event Details", details)
             else:
                 messagebox.showerror("Error", "No event found")
@@ -731,14 +1328,15 @@ class ManagementSystemGUI:
         for widget in self.management_frame.winfo_children():
             widget.destroy()
 
+        self.add_search_bar(self.management_frame, "guests")
         # Adjust column headings to accommodate first and last names
-        self.guest_tree = ttk.Treeview(self.management_frame,
-                                       columns=("Guest ID", "First Name", "Last Name", "Contact Details"),
-                                       show="headings")
+        self.guest_tree = VirtualTreeview(self.management_frame,
+                                          columns=("Guest ID", "First Name", "Last Name", "Contact Details", "Event ID"))
         self.guest_tree.heading("Guest ID", text="Guest ID")
         self.guest_tree.heading("First Name", text="First Name")
         self.guest_tree.heading("Last Name", text="Last Name")
         self.guest_tree.heading("Contact Details", text="Contact Details")
+        self.guest_tree.heading("Event ID", text="Event ID")
         self.guest_tree.pack(padx=10, pady=10, expand=True, fill='both')
 
         # Adding, deleting, modifying, and displaying details of guests
@@ -752,15 +1350,17 @@ class ManagementSystemGUI:
 
     def update_guest_tree(self):
         """Refresh the guest display tree."""
-        self.guest_tree.delete(*self.guest_tree.get_children())
-        for guest_id, guest in self.guests.items():
-            self.guest_tree.insert("", "end", values=(guest_id, guest.f_name, guest.l_name, guest.contact_details))
+        self.guest_tree.set_rows(self.guests, self.guest_row)
+
+    def guest_row(self, guest_id, guest):
+        return guest_id, guest.f_name, guest.l_name, guest.contact_details, \
+            "" if guest.event_id is None else guest.event_id
 
     def add_guest(self):
         """Add a new guest."""
         add_window = tk.Toplevel(self.master)
         add_window.title("Add New Guest")
-        guest_id = max(self.guests.keys(), default=0) + 1
+        guest_id = self.allocate_id("guests", self.guests)
 
         tk.Label(add_window, text="First Name:").grid(row=0, column=0)
         f_name_entry = tk.Entry(add_window)
@@ -774,17 +1374,39 @@ class ManagementSystemGUI:
         contact_details_entry = tk.Entry(add_window)
         contact_details_entry.grid(row=2, column=1)
 
+        tk.Label(add_window, text="Event ID (optional):").grid(row=3, column=0)
+        event_id_entry = tk.Entry(add_window)
+        event_id_entry.grid(row=3, column=1)
+
         tk.Button(add_window, text="Save Guest",
                   command=lambda: self.save_new_guest(add_window, guest_id, f_name_entry.get(),
-                                                      l_name_entry.get(), contact_details_entry.get())).grid(row=3, columnspan=2)
+                                                      l_name_entry.get(), contact_details_entry.get(),
+                                                      event_id_entry.get())).grid(row=4, columnspan=2)
 
-    def save_new_guest(self, add_window, guest_id, f_name, l_name, contact_details):
+    def guest_event_id(self, guest_id, event_id_text):
+        # Parse the optional Event ID field and check the event's venue has room; returns (ok, event ID)
+        if not event_id_text.strip():
+            return True, None
+        try:
+            event_id = int(event_id_text)
+        except ValueError:
+            messagebox.showerror("Error", "Event ID must be a number")
+            return False, None
+        problem = self.capacity_index().check_guest(guest_id, event_id, self.events)
+        if problem:
+            messagebox.showerror("Error", problem)
+            return False, None
+        return True, event_id
+
+    def save_new_guest(self, add_window, guest_id, f_name, l_name, contact_details, event_id_text=""):
         """Save the newly added guest information."""
         if f_name and l_name and contact_details:
-            new_guest = Guest(guest_id, f_name, l_name, contact_details)
+            valid, event_id = self.guest_event_id(guest_id, event_id_text)
+            if not valid:
+                return
+            new_guest = Guest(guest_id, f_name, l_name, contact_details, event_id)
             self.guests[guest_id] = new_guest
-            save_data(self.guests, "guests.pkl")
-            self.update_guest_tree()
+            self.record_changed("guests", guest_id)
             add_window.destroy()
             messagebox.showinfo("Success", "Guest added successfully")
         else:
@@ -796,9 +1418,12 @@ class ManagementSystemGUI:
         if selected_item:
             guest_id = int(self.guest_tree.item(selected_item, 'values')[0])
             if messagebox.askyesno("Confirm", "Do you really want to delete this guest?"):
-                del self.guests[guest_id]
-                save_data(self.guests, "guests.pkl")
-                self.update_guest_tree()
+                try:
+                    del self.guests[guest_id]
+                except ArchiveError as error:
+                    messagebox.showerror("Error", str(error))
+                    return
+                self.record_changed("guests", guest_id)
                 messagebox.showinfo("Success", "Guest deleted successfully")
         else:
             messagebox.showerror("Error", "No guest selected")
@@ -828,24 +1453,34 @@ class ManagementSystemGUI:
                 contact_details_entry.insert(0, guest.contact_details)
                 contact_details_entry.grid(row=2, column=1)
 
+                tk.Label(modify_window, text="Event ID (optional):").grid(row=3, column=0)
+                event_id_entry = tk.Entry(modify_window)
+                event_id_entry.insert(0, "" if guest.event_id is None else str(guest.event_id))
+                event_id_entry.grid(row=3, column=1)
+
                 tk.Button(modify_window, text="Save Changes",
                           command=lambda: self.apply_guest_changes(modify_window, guest_id, f_name_entry.get(),
-                                                                   l_name_entry.get(), contact_details_entry.get())).grid(row=3, columnspan=2)
+                                                                   l_name_entry.get(), contact_details_entry.get(),
+                                                                   event_id_entry.get())).grid(row=4, columnspan=2)
             else:
                 messagebox.showerror("Error", "Guest not found")
         else:
             messagebox.showerror("Error", "No guest selected")
 
-    def apply_guest_changes(self, modify_window, guest_id, f_name, l_name, contact_details):
+    def apply_guest_changes(self, modify_window, guest_id, f_name, l_name, contact_details, event_id_text=""):
         #Apply changes to an existing guest's details.
         if f_name and l_name and contact_details:
             guest = self.guests.get(guest_id)
             if guest:
+                valid, event_id = self.guest_event_id(guest_id, event_id_text)
+                if not valid:
+                    return
                 guest.f_name = f_name
                 guest.l_name = l_name
                 guest.contact_details = contact_details
-                save_data(self.guests, "guests.pkl")
-                self.update_guest_tree()
+                guest.event_id = event_id
+                self.guests[guest_id] = guest  # reassign so the change is journaled
+                self.record_changed("guests", guest_id)
                 modify_window.destroy()
                 messagebox.showinfo("Success", "Guest details updated successfully")
             else:
@@ -859,7 +1494,7 @@ class ManagementSystemGUI:
         if guest_id is not None:
             guest = self.guests.get(guest_id)
             if guest:
-                details = f"ID: {guest.guest_id}\nFirst Name: {guest.f_name}\nLast Name: {guest.l_name}\nContact Details: {guest.contact_details}"
+                details = f"ID: {guest.guest_id}\nFirst Name: {guest.f_name}\nLast Name: {guest.l_name}\nContact Details: {guest.contact_details}\nEvent ID: {guest.event_id}"
                 messagebox.showinfo("Guest Details", details)
             else:
                 messagebox.showerror("Error", f"No guest found with ID: {guest_id}")
@@ -872,7 +1507,8 @@ class ManagementSystemGUI:
             self.venue_frame = tk.Frame(self.master)
             self.venue_frame.pack(padx=10, pady=10)
 
-            self.venue_tree = ttk.Treeview(self.venue_frame, columns=("Venue ID", "Name", "Address", "Contact Details", "Min Guests", "Max Guests"), show="headings")
+            self.add_search_bar(self.venue_frame, "venues")
+            self.venue_tree = VirtualTreeview(self.venue_frame, columns=("Venue ID", "Name", "Address", "Contact Details", "Min Guests", "Max Guests"))
             self.venue_tree.heading("Venue ID", text="Venue ID")
             self.venue_tree.heading("Name", text="Name")
             self.venue_tree.heading("Address", text="Address")
@@ -893,17 +1529,18 @@ class ManagementSystemGUI:
 
     def update_venue_tree(self):
         try:
-            self.venue_tree.delete(*self.venue_tree.get_children())
-            for venue_id, venue in self.venues.items():
-                self.venue_tree.insert("", "end", values=(venue.venue_id, venue.name, venue.address, venue.contact_details, venue.min_guests, venue.max_guests))
+            self.venue_tree.set_rows(self.venues, self.venue_row)
         except Exception as e:
             messagebox.showerror("Error", "Failed to update venue data: " + str(e))
 
+    def venue_row(self, venue_id, venue):
+        return venue.venue_id, venue.name, venue.address, venue.contact_details, venue.min_guests, venue.max_guests
+
     def add_venue(self):
         try:
             add_window = tk.Toplevel(self.master)
             add_window.title("Add New Venue")
-            next_venue_id = max(int(vid) for vid in self.venues.keys()) + 1
+            next_venue_id = self.allocate_id("venues", self.venues)
 
             tk.Label(add_window, text="Venue ID:").grid(row=0, column=0)
             venue_id_entry = tk.Entry(add_window)
@@ -944,8 +1581,7 @@ class ManagementSystemGUI:
             if name and address and contact_details and min_guests and max_guests:
                 new_venue = Venue(venue_id, name, address, contact_details, min_guests, max_guests)
                 self.venues[venue_id] = new_venue
-                save_data(self.venues, "venues.pkl")
-                self.update_venue_tree()
+                self.record_changed("venues", venue_id)
                 window.destroy()
                 messagebox.showinfo("Success", "Venue added successfully")
             else:
@@ -963,8 +1599,7 @@ class ManagementSystemGUI:
                 if venue_id in self.venues:
                     if messagebox.askyesno("Confirm", "Do you want to delete this venue?"):
                         del self.venues[venue_id]
-                        save_data(self.venues, "venues.pkl")
-                        self.update_venue_tree()
+                        self.record_changed("venues", venue_id)
                         messagebox.showinfo("Success", "Venue deleted successfully")
                 else:
                     messagebox.showerror("Error", "Venue not found")
@@ -0,0 +1,119 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Most recent calls kept for the trace file
+TRACE_SIZE = 20000
+
+# Calls slower than this are reported on the console as they happen
+SLOW_CALL_SECONDS = 0.2
+
+
+class Sample:
+    """One timed call; records and bytes can be filled in by the caller while it runs."""
+    __slots__ = ("name", "start", "seconds", "records", "bytes", "thread")
+
+    def __init__(self, name, start, records=None):
+        self.name = name
+        self.start = start
+        self.seconds = 0.0
+        self.records = records
+        self.bytes = None
+        self.thread = threading.current_thread()
+
+
+class CallStats:
+    """Running totals of every call made under one name."""
+    __slots__ = ("calls", "total", "max", "last", "records", "bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.records = 0
+        self.bytes = 0
+
+    def add(self, sample):
+        self.calls += 1
+        self.total += sample.seconds
+        self.max = max(self.max, sample.seconds)
+        self.last = sample.seconds
+        self.records += sample.records or 0
+        self.bytes += sample.bytes or 0
+
+
+class Profiler:
+    """Wall time, record counts and bytes written of instrumented calls, from any thread.
+
+    Totals per call name feed the GUI's stats panel; the most recent calls are kept in order and
+    can be written out as a Chrome trace (chrome://tracing or https://ui.perfetto.dev) with dump_trace.
+    """
+    def __init__(self, trace_size=TRACE_SIZE, slow_call_seconds=SLOW_CALL_SECONDS):
+        self._lock = threading.Lock()
+        self.stats = {}  # call name -> CallStats
+        self.trace = deque(maxlen=trace_size)
+        self.slow_call_seconds = slow_call_seconds
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def measure(self, name, records=None):
+        sample = Sample(name, time.perf_counter(), records)
+        try:
+            yield sample
+        finally:
+            sample.seconds = time.perf_counter() - sample.start
+            self.add(sample)
+
+    def add(self, sample):
+        with self._lock:
+            stats = self.stats.get(sample.name)
+            if stats is None:
+                stats = self.stats[sample.name] = CallStats()
+            stats.add(sample)
+            self.trace.append(sample)
+        if sample.seconds >= self.slow_call_seconds:
+            print(f"Slow call: {sample.name} took {sample.seconds * 1000:.0f} ms")
+
+    def wrap(self, function, name=None, records=None):
+        """Return function timed under name; records() is called afterwards to count the records it handled."""
+        name = name or function.__name__
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with self.measure(name) as sample:
+                result = function(*args, **kwargs)
+                if records is not None:
+                    sample.records = records()
+            return result
+        return timed
+
+    def report(self):
+        """Return (name, CallStats) pairs, the most total time first."""
+        with self._lock:
+            return sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self.trace.clear()
+
+    def dump_trace(self, file_path):
+        """Write the recent calls as Chrome trace events; returns the number of calls written."""
+        with self._lock:
+            samples = list(self.trace)
+        pid = os.getpid()
+        threads = {sample.thread.ident: sample.thread.name for sample in samples}
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}}
+                  for ident, name in threads.items()]
+        events += [{"name": sample.name, "ph": "X", "pid": pid, "tid": sample.thread.ident,
+                    "ts": round((sample.start - self.origin) * 1e6), "dur": round(sample.seconds * 1e6),
+                    "args": {"records": sample.records, "bytes": sample.bytes}}
+                   for sample in samples]
+        with open(file_path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        return len(samples)
@@ -0,0 +1,605 @@
+import struct
+import sys
+from array import array
+from collections import deque
+from enum import Enum
+from itertools import islice, repeat
+from operator import attrgetter, setitem
+
+# Encoded values start with this marker and the format version that wrote them.
+# Version 2 added tables (see below); version 1 values still decode.
+MAGIC = b"RFMT"
+FORMAT_VERSION = 2
+
+# An encoded value is: MAGIC, format version byte, schema table, then the value itself.
+# The schema table names every record class and enum the value uses, with the schema version and
+# field names it was written with, so records decode by field name whatever Classes.py looks like now.
+# Values are a type tag byte followed by their data; lengths, counts and integers are varints.
+# A string seen before in the same value is written as its index among the strings written so far,
+# so repeated names cost a couple of bytes and decode to one shared object. Likewise a dict with
+# the same string keys as an earlier one (e.g. every event) is written as that shape's index
+# followed by just its values.
+#
+# A dict of at least _TABLE_MIN records of one class (or dicts of one shape) keyed by int IDs, i.e. a
+# whole table, is written as a table instead: the IDs, then one column per field holding that field
+# of every record. Columns are packed by what their values have in common (fixed-width integer
+# arrays, NUL-separated text, a dictionary of the distinct values plus an index per record, ...),
+# so decoding a table is a handful of bulk operations per field rather than a few per value.
+(_NONE, _TRUE, _FALSE, _INT, _NEG_INT, _FLOAT, _STR, _BYTES, _LIST, _TUPLE, _DICT, _ENUM,
+ _RECORD, _STR_REF, _SHAPED_DICT, _TABLE) = range(16)
+_KIND_RECORD, _KIND_ENUM = 0, 1
+_DOUBLE = struct.Struct("<d")
+
+_TABLE_MIN = 16
+_TABLE_OF_RECORDS, _TABLE_OF_DICTS = 0, 1
+# Column encodings: one value after another, signed integers of the smallest width that fits them,
+# NUL-separated UTF-8 text, 8-byte floats, a dictionary of distinct values plus an index per value,
+# the non-None values plus where they go, and the items of all lists plus every list's length
+_COL_VALUES, _COL_INTS, _COL_TEXT, _COL_FLOATS, _COL_DICTIONARY, _COL_NULLABLE, _COL_LISTS = range(7)
+_INT_TYPECODES = {array(typecode).itemsize: typecode for typecode in "bhiq"}
+_BIG_ENDIAN = sys.byteorder != "little"
+# Kinds of values that only compare equal to the same value (unlike 1, 1.0 and True), so they can be
+# dictionary encoded
+_EXACT_KINDS = (str, int, bool, type(None))
+
+
+class FormatError(ValueError):
+    """Data that is not a valid encoded value, or uses a class this program does not know."""
+
+
+class RecordSchema:
+    """Fields of a record class in the order they are encoded, and the schema version they make up."""
+    __slots__ = ("cls", "version", "fields")
+
+    def __init__(self, cls, version, fields):
+        self.cls = cls
+        self.version = version
+        self.fields = tuple(fields)
+
+
+_RECORDS = {}        # record class -> RecordSchema
+_RECORD_NAMES = {}   # class name -> RecordSchema
+_ENUMS = {}          # enum class name -> enum class
+_MIGRATIONS = {}     # (class name, schema version) -> function upgrading {field: value} to the next version
+
+
+def register_record(cls, fields, version=1):
+    """Encode instances of cls as the values of fields; bump version whenever the fields change."""
+    schema = RecordSchema(cls, version, fields)
+    _RECORDS[cls] = schema
+    _RECORD_NAMES[cls.__name__] = schema
+
+
+def register_enum(cls):
+    _ENUMS[cls.__name__] = cls
+
+
+def migration(class_name, from_version):
+    """Decorator registering function({field: value}) -> {field: value} to upgrade class_name from from_version.
+
+    Records written with an older schema version go through every migration up to the current one;
+    fields the result lacks are set to None and fields the class no longer has are dropped.
+    """
+    def register(function):
+        _MIGRATIONS[(class_name, from_version)] = function
+        return function
+    return register
+
+
+# Encoding
+
+def _varint(out, value):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode_str(out, value):
+    data = value.encode("utf-8")
+    _varint(out, len(data))
+    out += data
+
+
+def _numbers(out, values):
+    # Integers as an array of the smallest width that holds all of them, prefixed by that width
+    low, high = min(values, default=0), max(values, default=0)
+    for size, typecode in sorted(_INT_TYPECODES.items()):
+        limit = 1 << (8 * size - 1)
+        if -limit <= low and high < limit:
+            break
+    else:
+        raise OverflowError("Integer column does not fit in 64 bits")
+    numbers = array(typecode, values)
+    if _BIG_ENDIAN:
+        numbers.byteswap()
+    out.append(size)
+    out += numbers.tobytes()
+
+
+def _dictionary_kinds(kinds):
+    return not {bool, int} <= kinds and all(
+        kind in _EXACT_KINDS or (issubclass(kind, Enum) and not issubclass(kind, (int, float, str))) for kind in kinds)
+
+
+def _table_kind(value):
+    # How the dict value can be written as a table: (_TABLE_OF_RECORDS, class), (_TABLE_OF_DICTS,
+    # keys) or None
+    if len(value) < _TABLE_MIN or not all(type(key) is int for key in value):
+        return None
+    first = next(iter(value.values()))
+    kind = type(first)
+    if kind in _RECORDS:
+        if all(type(record) is kind for record in value.values()):
+            return _TABLE_OF_RECORDS, kind
+    elif kind is dict:
+        shape = tuple(first)
+        if shape and all(type(key) is str for key in shape) and all(
+                type(record) is dict and tuple(record) == shape for record in value.values()):
+            return _TABLE_OF_DICTS, shape
+    return None
+
+
+class _Encoder:
+    def __init__(self):
+        self.out = bytearray()
+        self.refs = {}  # class -> index in the schema table
+        self.strings = {}  # string -> index among the strings written so far
+        self.shapes = {}   # tuple of dict keys -> index among the dict shapes written so far
+
+    def ref(self, cls):
+        index = self.refs.get(cls)
+        if index is None:
+            index = self.refs[cls] = len(self.refs)
+        return index
+
+    def encode(self, value):
+        out = self.out
+        kind = type(value)
+        if kind is str:
+            index = self.strings.get(value)
+            if index is None:
+                self.strings[value] = len(self.strings)
+                out.append(_STR)
+                _encode_str(out, value)
+            else:
+                out.append(_STR_REF)
+                _varint(out, index)
+        elif kind is int:
+            if value >= 0:
+                out.append(_INT)
+                _varint(out, value)
+            else:
+                out.append(_NEG_INT)
+                _varint(out, -value - 1)
+        elif value is None:
+            out.append(_NONE)
+        elif kind is bool:
+            out.append(_TRUE if value else _FALSE)
+        elif kind is float:
+            out.append(_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif kind is list or kind is tuple:
+            out.append(_LIST if kind is list else _TUPLE)
+            _varint(out, len(value))
+            for item in value:
+                self.encode(item)
+        elif kind is dict:
+            table = _table_kind(value)
+            if table is not None:
+                self.table(value, *table)
+                return
+            keys = tuple(value)
+            shape = self.shapes.get(keys)
+            if shape is not None:
+                out.append(_SHAPED_DICT)
+                _varint(out, shape)
+                for item in value.values():
+                    self.encode(item)
+                return
+            out.append(_DICT)
+            _varint(out, len(value))
+            for key, item in value.items():
+                self.encode(key)
+                self.encode(item)
+            if keys and all(type(key) is str for key in keys):
+                self.shapes[keys] = len(self.shapes)  # after the values, as the decoder sees it
+        elif kind in _RECORDS:
+            out.append(_RECORD)
+            _varint(out, self.ref(kind))
+            for field in _RECORDS[kind].fields:
+                self.encode(getattr(value, field, None))
+        elif isinstance(value, Enum) and kind.__name__ in _ENUMS:
+            out.append(_ENUM)
+            _varint(out, self.ref(kind))
+            self.encode(value.value)
+        elif kind is bytes:
+            out.append(_BYTES)
+            _varint(out, len(value))
+            out += value
+        elif isinstance(value, dict):
+            self.encode(dict(value))  # e.g. a JournaledDict
+        else:
+            raise TypeError(f"Cannot encode {kind.__name__} values; register the class with RecordFormat")
+
+    def table(self, value, kind, layout):
+        out = self.out
+        out.append(_TABLE)
+        _varint(out, len(value))
+        _numbers(out, list(value))
+        records = list(value.values())
+        out.append(kind)
+        if kind == _TABLE_OF_RECORDS:
+            _varint(out, self.ref(layout))
+            for field in _RECORDS[layout].fields:
+                try:
+                    column = list(map(attrgetter(field), records))
+                except AttributeError:
+                    column = [getattr(record, field, None) for record in records]
+                self.column(column)
+        else:
+            _varint(out, len(layout))
+            for key in layout:
+                _encode_str(out, key)
+            for key in layout:
+                self.column([record[key] for record in records])
+
+    def column(self, values):
+        # Write values, whose count the decoder already knows, in the most compact encoding that fits
+        out, count = self.out, len(values)
+        kinds = set(map(type, values))
+        if kinds == {int} and -(1 << 63) <= min(values) and max(values) < 1 << 63:
+            out.append(_COL_INTS)
+            _numbers(out, values)
+            return
+        if count > 1 and _dictionary_kinds(kinds):
+            uniques = dict.fromkeys(values)
+            if 2 * len(uniques) <= count:
+                out.append(_COL_DICTIONARY)
+                _varint(out, len(uniques))
+                self.column(list(uniques))
+                positions = {unique: position for position, unique in enumerate(uniques)}
+                _numbers(out, list(map(positions.__getitem__, values)))
+                return
+        if kinds == {str}:
+            text = "\0".join(values)
+            if text.count("\0") == count - 1:
+                out.append(_COL_TEXT)
+                _encode_str(out, text)
+                return
+        if kinds == {float}:
+            numbers = array('d', values)
+            if _BIG_ENDIAN:
+                numbers.byteswap()
+            out.append(_COL_FLOATS)
+            out += numbers.tobytes()
+            return
+        if kinds == {list}:
+            out.append(_COL_LISTS)
+            _numbers(out, list(map(len, values)))
+            self.column([item for items in values for item in items])
+            return
+        if type(None) in kinds and len(kinds) == 2:
+            present = [position for position, item in enumerate(values) if item is not None]
+            out.append(_COL_NULLABLE)
+            _varint(out, len(present))
+            _numbers(out, present)
+            self.column([values[position] for position in present])
+            return
+        out.append(_COL_VALUES)
+        for item in values:
+            self.encode(item)
+
+    def header(self):
+        out = bytearray(MAGIC)
+        out.append(FORMAT_VERSION)
+        _varint(out, len(self.refs))
+        for cls in self.refs:  # in index order
+            schema = _RECORDS.get(cls)
+            if schema is None:
+                out.append(_KIND_ENUM)
+                _encode_str(out, cls.__name__)
+                _varint(out, 0)
+                _varint(out, 0)
+            else:
+                out.append(_KIND_RECORD)
+                _encode_str(out, cls.__name__)
+                _varint(out, schema.version)
+                _varint(out, len(schema.fields))
+                for field in schema.fields:
+                    _encode_str(out, field)
+        return out
+
+
+def dumps(value):
+    """Encode a value made of None, bools, numbers, strings, bytes, lists, tuples, dicts and registered classes."""
+    encoder = _Encoder()
+    encoder.encode(value)
+    return bytes(encoder.header() + encoder.out)
+
+
+# Decoding
+
+def _migrated(schema, version, values):
+    # Build a schema.cls record from {field: value} written with an older schema version
+    name = schema.cls.__name__
+    for from_version in range(version, schema.version):
+        upgrade = _MIGRATIONS.get((name, from_version))
+        if upgrade is not None:
+            values = upgrade(values)
+    record = schema.cls.__new__(schema.cls)
+    for field in schema.fields:
+        setattr(record, field, values.get(field))
+    return record
+
+
+def _setter(cls, field):
+    # function(record, value) setting one field; the slot's own setter when there is one
+    descriptor = getattr(cls, field, None)
+    if hasattr(type(descriptor), "__set__"):
+        return descriptor.__set__
+    return lambda record, value: setattr(record, field, value)
+
+
+class _Decoder:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+        self.types = []  # schema table index -> function building the value from what follows
+        self.strings = []  # strings decoded so far, for _STR_REF
+        self.shapes = []   # key tuples of the string-keyed dicts decoded so far, for _SHAPED_DICT
+        self.schemas = []  # schema table index -> (class name, schema version, fields) of record classes
+
+    def varint(self):
+        data, position = self.data, self.position
+        result = shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.position = position
+                return result
+            shift += 7
+
+    def text(self):
+        length = self.varint()
+        start = self.position
+        self.position = start + length
+        return str(self.data[start:start + length], "utf-8")
+
+    def header(self):
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise FormatError("Not a RecordFormat value")
+        version = self.data[len(MAGIC)]
+        if version > FORMAT_VERSION:
+            raise FormatError(f"Written by a newer program (format version {version})")
+        self.position = len(MAGIC) + 1
+        for _ in range(self.varint()):
+            kind = self.data[self.position]
+            self.position += 1
+            name, version = self.text(), self.varint()
+            fields = tuple(self.text() for _ in range(self.varint()))
+            self.schemas.append((name, version, fields) if kind == _KIND_RECORD else None)
+            self.types.append(self.record_builder(name, version, fields) if kind == _KIND_RECORD
+                              else self.enum_builder(name))
+
+    def enum_builder(self, name):
+        cls = _ENUMS.get(name)
+        if cls is None:
+            raise FormatError(f"Unknown enum {name}")
+
+        def build():
+            value = self.value()
+            try:
+                return cls(value)
+            except ValueError:
+                raise FormatError(f"{value!r} is no longer a {name}") from None
+        return build
+
+    def record_builder(self, name, version, fields):
+        schema = _RECORD_NAMES.get(name)
+        if schema is None:
+            raise FormatError(f"Unknown record class {name}")
+        cls, current = schema.cls, schema.fields
+        if version > schema.version:
+            raise FormatError(f"{name} records were written by a newer program (schema version {version})")
+        if version == schema.version and fields == current:
+            read = self.value
+
+            def build():
+                record = cls.__new__(cls)
+                for field in current:
+                    setattr(record, field, read())
+                return record
+            return build
+
+        def build_migrated():
+            return _migrated(schema, version, {field: self.value() for field in fields})
+        return build_migrated
+
+    def numbers(self, count):
+        data, start = self.data, self.position + 1
+        size = data[self.position]
+        end = start + size * count
+        if size not in _INT_TYPECODES or end > len(data):
+            raise FormatError("Truncated or corrupt integer column")
+        numbers = array(_INT_TYPECODES[size])
+        numbers.frombytes(data[start:end])
+        if _BIG_ENDIAN:
+            numbers.byteswap()
+        self.position = end
+        return numbers.tolist()
+
+    def column(self, count):
+        data = self.data
+        tag = data[self.position]
+        self.position += 1
+        if tag == _COL_INTS:
+            return self.numbers(count)
+        if tag == _COL_DICTIONARY:
+            uniques = self.column(self.varint())
+            return list(map(uniques.__getitem__, self.numbers(count)))
+        if tag == _COL_TEXT:
+            texts = self.text().split("\0") if count else []
+            if len(texts) != count:
+                raise FormatError("Text column does not hold one value per record")
+            return texts
+        if tag == _COL_FLOATS:
+            start, end = self.position, self.position + _DOUBLE.size * count
+            if end > len(data):
+                raise FormatError("Truncated float column")
+            numbers = array('d')
+            numbers.frombytes(data[start:end])
+            if _BIG_ENDIAN:
+                numbers.byteswap()
+            self.position = end
+            return numbers.tolist()
+        if tag == _COL_LISTS:
+            lengths = self.numbers(count)
+            items = iter(self.column(sum(lengths)))
+            return [list(islice(items, length)) for length in lengths]
+        if tag == _COL_NULLABLE:
+            present = self.numbers(self.varint())
+            values = [None] * count
+            deque(map(values.__setitem__, present, self.column(len(present))), maxlen=0)
+            return values
+        if tag == _COL_VALUES:
+            read = self.value
+            return [read() for _ in range(count)]
+        raise FormatError(f"Unknown column encoding {tag} at byte {self.position - 1}")
+
+    def table(self):
+        count = self.varint()
+        keys = self.numbers(count)
+        kind = self.data[self.position]
+        self.position += 1
+        if kind == _TABLE_OF_DICTS:
+            layout = tuple(self.text() for _ in range(self.varint()))
+            # Copies of a dict that already has every key, then filled in one column at a time
+            records = list(map(dict.copy, repeat(dict.fromkeys(layout), count)))
+            for key in layout:
+                deque(map(setitem, records, repeat(key), self.column(count)), maxlen=0)
+            return dict(zip(keys, records))
+        ref = self.varint()
+        if self.schemas[ref] is None:
+            raise FormatError("A table of enum values")
+        name, version, fields = self.schemas[ref]
+        schema = _RECORD_NAMES[name]  # checked when the header was read
+        cls = schema.cls
+        if version != schema.version or fields != schema.fields:
+            columns = [self.column(count) for _ in fields]
+            return {key: _migrated(schema, version, dict(zip(fields, values)))
+                    for key, values in zip(keys, zip(*columns))}
+        records = list(map(cls.__new__, repeat(cls, count)))
+        for field in fields:
+            deque(map(_setter(cls, field), records, self.column(count)), maxlen=0)
+        return dict(zip(keys, records))
+
+    def value(self):
+        data, position = self.data, self.position
+        tag = data[position]
+        self.position = position + 1
+        if tag == _STR:
+            length = data[position + 1]
+            if length < 0x80:  # short string, read inline
+                start = position + 2
+                self.position = start + length
+                text = data[start:start + length].decode("utf-8")
+            else:
+                text = self.text()
+            self.strings.append(text)
+            return text
+        if tag == _STR_REF:
+            index = data[position + 1]
+            if index < 0x80:
+                self.position = position + 2
+                return self.strings[index]
+            return self.strings[self.varint()]
+        if tag == _INT:
+            number = data[position + 1]
+            if number < 0x80:
+                self.position = position + 2
+                return number
+            return self.varint()
+        if tag == _NONE:
+            return None
+        if tag == _RECORD:
+            return self.types[self.varint()]()
+        if tag == _SHAPED_DICT:
+            keys = self.shapes[self.varint()]
+            read = self.value
+            return dict(zip(keys, [read() for _ in keys]))
+        if tag == _DICT:
+            read = self.value
+            result = {read(): read() for _ in range(self.varint())}  # keys are read before their values
+            keys = tuple(result)
+            if keys and all(type(key) is str for key in keys):
+                self.shapes.append(keys)
+            return result
+        if tag == _LIST:
+            read = self.value
+            return [read() for _ in range(self.varint())]
+        if tag == _FLOAT:
+            self.position += _DOUBLE.size
+            return _DOUBLE.unpack_from(data, self.position - _DOUBLE.size)[0]
+        if tag == _ENUM:
+            return self.types[self.varint()]()
+        if tag == _NEG_INT:
+            return -self.varint() - 1
+        if tag == _TRUE or tag == _FALSE:
+            return tag == _TRUE
+        if tag == _TABLE:
+            return self.table()
+        if tag == _TUPLE:
+            return tuple([self.value() for _ in range(self.varint())])
+        if tag == _BYTES:
+            length = self.varint()
+            self.position += length
+            return bytes(data[self.position - length:self.position])
+        raise FormatError(f"Unknown type tag {tag} at byte {self.position - 1}")
+
+
+def loads(data):
+    """Decode a value written by dumps, upgrading records written with older schema versions."""
+    decoder = _Decoder(data)
+    try:
+        decoder.header()
+        value = decoder.value()
+    except (IndexError, UnicodeDecodeError, struct.error):
+        raise FormatError("Truncated or corrupt RecordFormat value") from None
+    if decoder.position != len(data):
+        raise FormatError("Unexpected data after the encoded value")
+    return value
+
+
+def loads_columns(data, cls):
+    """Decode a dict of cls records written by dumps as (IDs, {field: values}), without building a record.
+
+    Returns None when the dict was not written as a table of cls records with their current schema
+    (e.g. it held too few records to make a table), for the caller to decode it with loads instead.
+    """
+    decoder = _Decoder(data)
+    schema = _RECORDS[cls]
+    try:
+        decoder.header()
+        if data[decoder.position] != _TABLE:
+            return None
+        decoder.position += 1
+        count = decoder.varint()
+        keys = decoder.numbers(count)
+        if data[decoder.position] != _TABLE_OF_RECORDS:
+            return None
+        decoder.position += 1
+        if decoder.schemas[decoder.varint()] != (cls.__name__, schema.version, schema.fields):
+            return None
+        columns = {field: decoder.column(count) for field in schema.fields}
+    except (IndexError, UnicodeDecodeError, struct.error):
+        raise FormatError("Truncated or corrupt RecordFormat value") from None
+    if decoder.position != len(data):
+        raise FormatError("Unexpected data after the encoded value")
+    return keys, columns
+
+
+def is_encoded(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
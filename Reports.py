@@ -0,0 +1,79 @@
+from collections import Counter
+
+from Archive import live_records
+from Classes import field_value
+from Costing import parse_amount
+from Indexes import parse_date
+
+# Tables the rollups are computed from
+REPORT_TABLES = ("employees", "events")
+
+
+class Rollups:
+    """Headcount, payroll, events per type and month, and supplier usage, kept up to date record by record.
+
+    Every record remembers what it added to which group, so a change takes that back and adds the
+    new contribution; reading a report only touches the groups, never the records. Archived events
+    are not counted, see live_records.
+    """
+    def __init__(self):
+        self.headcount = Counter()         # (department, job title) -> employees
+        self.payroll = Counter()           # department -> total salary
+        self.events_per_month = Counter()  # (YYYY-MM or "Undated", event type) -> events
+        self.supplier_usage = Counter()    # supplier ID -> events using it
+        self.contributions = {}            # (table, key) -> [(rollup, group, amount)] currently counted
+
+    def build(self, employees, events):
+        for key, employee in employees.items():
+            self._add("employees", key, employee)
+        for key, event in live_records(events).items():
+            self._add("events", key, event)
+        return self
+
+    def apply_change(self, table, key, data):
+        # Take back what one modified or deleted record contributed and count its new values
+        for rollup, group, amount in self.contributions.pop((table, key), ()):
+            rollup[group] -= amount
+            if not rollup[group]:
+                del rollup[group]
+        record = data.get(key)
+        if record is not None:
+            self._add(table, key, record)
+
+    def _add(self, table, key, record):
+        if table == "employees":
+            department = field_value(record, "department")
+            salary = parse_amount(field_value(record, "salary")) or 0.0
+            contributions = [(self.headcount, (department, field_value(record, "job_title")), 1),
+                             (self.payroll, department, int(salary) if salary.is_integer() else salary)]
+        else:
+            date = str(record.get('date', ''))
+            month = date[:7] if parse_date(date) is not None else "Undated"
+            contributions = [(self.events_per_month, (month, record.get('type')), 1)]
+            contributions += [(self.supplier_usage, supplier_id, 1) for supplier_id in set(record.get('suppliers') or ())]
+        for rollup, group, amount in contributions:
+            rollup[group] += amount
+        self.contributions[(table, key)] = contributions
+
+    def headcount_report(self):
+        """Return (department, job title, employees) sorted by department then job title."""
+        return [(department, job_title, count) for (department, job_title), count
+                in sorted(self.headcount.items(), key=lambda item: tuple(map(str, item[0])))]
+
+    def payroll_report(self):
+        """Return (department, employees, total salary) per department, and the company-wide total salary."""
+        employees = Counter()
+        for (department, _), count in self.headcount.items():
+            employees[department] += count
+        rows = [(department, count, self.payroll[department]) for department, count
+                in sorted(employees.items(), key=lambda item: str(item[0]))]
+        return rows, sum(self.payroll.values())
+
+    def events_report(self):
+        """Return (month, event type, events) in month order."""
+        return [(month, event_type, count) for (month, event_type), count
+                in sorted(self.events_per_month.items(), key=lambda item: tuple(map(str, item[0])))]
+
+    def supplier_report(self):
+        """Return (supplier ID, events using it), most used first."""
+        return sorted(self.supplier_usage.items(), key=lambda item: (-item[1], item[0]))
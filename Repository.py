@@ -0,0 +1,307 @@
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from collections.abc import MutableMapping
+from datetime import date
+
+from Archive import with_archive
+from Classes import field_value, load_data
+from Indexes import SEARCH_FIELDS, DateIndex, TableIndex, VenueIndex, booking_slot, parse_date, prefix_matcher
+from RecordFormat import MAGIC, dumps, loads
+
+# When this database exists the GUI reads and writes it instead of the .pkl files.
+DATABASE_FILE = "management.db"
+
+# The pickle file each table was stored in before the repository existed.
+PICKLE_FILES = {
+    "employees": "employees.pkl",
+    "clients_events": "clients_events.pkl",
+    "events": "events.pkl",
+    "suppliers": "suppliers.pkl",
+    "guests": "guests.pkl",
+    "venues": "venues.pkl",
+}
+
+# Fields copied out of each record into their own indexed column, so lookups by
+# them do not have to decode every row. The record itself is kept RecordFormat-encoded.
+# Every column has a plain index and a case-insensitive (NOCASE) one for searches.
+INDEXED_FIELDS = {
+    "employees": ("name", "department", "job_title"),
+    "clients_events": ("type", "date", "venue"),
+    "events": ("name", "type", "date", "venue"),
+    "suppliers": ("name", "service_type"),
+    "guests": ("f_name", "l_name"),
+    "venues": ("name",),
+}
+
+
+class SQLiteTable(MutableMapping):
+    """Dictionary-like view of one entity table stored in SQLite, keyed by record ID.
+
+    The connection is shared by all tables and may be committed from the BackgroundWriter
+    thread, so every statement runs under the shared lock.
+    """
+    def __init__(self, connection, name, lock):
+        self.connection = connection
+        self.name = name
+        self.lock = lock
+        self.fields = INDEXED_FIELDS[name]
+        columns = ", ".join(("id",) + self.fields + ("record",))
+        placeholders = ", ".join("?" * (len(self.fields) + 2))
+        self._upsert_sql = f"INSERT OR REPLACE INTO {name} ({columns}) VALUES ({placeholders})"
+
+    def _row(self, key, record):
+        return (key,) + tuple(field_value(record, field) for field in self.fields) + (
+            dumps(record),)
+
+    def _query(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def __getitem__(self, key):
+        rows = self._query(f"SELECT record FROM {self.name} WHERE id = ?", (key,))
+        if not rows:
+            raise KeyError(key)
+        return loads(rows[0][0])
+
+    def __setitem__(self, key, record):
+        row = self._row(key, record)
+        with self.lock:
+            self.connection.execute(self._upsert_sql, row)
+
+    def __delitem__(self, key):
+        with self.lock:
+            deleted = self.connection.execute(f"DELETE FROM {self.name} WHERE id = ?", (key,)).rowcount
+        if deleted == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return bool(self._query(f"SELECT 1 FROM {self.name} WHERE id = ?", (key,)))
+
+    def __iter__(self):
+        # Materialise the IDs first so the table can be modified while iterating
+        return (row[0] for row in self._query(f"SELECT id FROM {self.name} ORDER BY id"))
+
+    def __len__(self):
+        return self._query(f"SELECT COUNT(*) FROM {self.name}")[0][0]
+
+    def items(self):
+        rows = self._query(f"SELECT id, record FROM {self.name} ORDER BY id")
+        return [(key, loads(record)) for key, record in rows]
+
+    def values(self):
+        return [record for _, record in self.items()]
+
+    def iter_items(self, page_size=1000):
+        # Stream (id, record) pairs a page at a time, so a full scan never holds the whole table
+        last_id = None
+        while True:
+            if last_id is None:
+                rows = self._query(f"SELECT id, record FROM {self.name} ORDER BY id LIMIT ?", (page_size,))
+            else:
+                rows = self._query(f"SELECT id, record FROM {self.name} WHERE id > ? ORDER BY id LIMIT ?",
+                                   (last_id, page_size))
+            for key, record in rows:
+                yield key, loads(record)
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+
+    def bulk_insert(self, records):
+        # Insert or replace many (key, record) pairs in a single statement
+        rows = [self._row(key, record) for key, record in records]
+        with self.lock:
+            self.connection.executemany(self._upsert_sql, rows)
+
+    def find(self, field, value):
+        """Return {id: record} for every record whose indexed field equals value, ignoring case."""
+        self._check_field(field)
+        rows = self._query(f"SELECT id, record FROM {self.name} WHERE {field} = ? COLLATE NOCASE ORDER BY id",
+                           (value,))
+        return {key: loads(record) for key, record in rows}
+
+    def search_prefix(self, field, text):
+        """Return the IDs of the records whose indexed field starts with text, ignoring case, in field order.
+
+        Answered from the column's NOCASE index alone: no record is decoded.
+        """
+        self._check_field(field)
+        rows = self._query(f"SELECT id FROM {self.name} WHERE {field} >= ? COLLATE NOCASE AND {field} < ? COLLATE NOCASE "
+                           f"ORDER BY {field} COLLATE NOCASE, id", (text, text + "\U0010ffff"))
+        return [row[0] for row in rows]
+
+    def find_range(self, field, low, high):
+        """Return {id: record} for every record whose indexed field lies in [low, high]."""
+        self._check_field(field)
+        rows = self._query(
+            f"SELECT id, record FROM {self.name} WHERE {field} BETWEEN ? AND ? ORDER BY {field}, id", (low, high))
+        return {key: loads(record) for key, record in rows}
+
+    def max_id(self):
+        return self._query(f"SELECT MAX(id) FROM {self.name}")[0][0]
+
+    def commit(self):
+        # Called through save_data; the rows were already written by __setitem__/__delitem__
+        with self.lock:
+            self.connection.commit()
+        return 0
+
+    def _check_field(self, field):
+        if field not in self.fields:
+            raise ValueError(f"{self.name} has no indexed field {field!r}")
+
+
+# PRAGMA user_version of a database whose rows are all RecordFormat-encoded. Rows written before
+# RecordFormat hold a pickle; opening the database re-encodes them once and sets this version.
+SCHEMA_VERSION = 1
+
+
+def _migrate_pickled_rows(connection):
+    # The only place rows are unpickled: from then on they are only decoded with RecordFormat
+    for name in INDEXED_FIELDS:
+        rows = connection.execute(f"SELECT id, record FROM {name} WHERE substr(record, 1, ?) != ?",
+                                  (len(MAGIC), MAGIC)).fetchall()
+        connection.executemany(f"UPDATE {name} SET record = ? WHERE id = ?",
+                               [(dumps(pickle.loads(record)), key) for key, record in rows])
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def open_repository(db_path=DATABASE_FILE):
+    """Open (creating if needed) the database and return {table name: SQLiteTable}."""
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    lock = threading.RLock()
+    for name, fields in INDEXED_FIELDS.items():
+        columns = "".join(f", {field}" for field in fields)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {name} (id INTEGER PRIMARY KEY{columns}, record BLOB NOT NULL)")
+        for field in fields:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {name}_{field} ON {name} ({field})")
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {name}_{field}_nocase ON {name} ({field} COLLATE NOCASE)")
+    if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate_pickled_rows(connection)
+    connection.commit()
+    return {name: SQLiteTable(connection, name, lock) for name in INDEXED_FIELDS}
+
+
+def open_table(name, db_path=DATABASE_FILE):
+    """Open one table the way the GUI does: from the database if it exists, otherwise from its .pkl file."""
+    if os.path.exists(db_path):
+        return open_repository(db_path)[name]
+    return with_archive(load_data(PICKLE_FILES[name]), PICKLE_FILES[name])
+
+
+# Indexes over the database answer from its column indexes instead of holding every record in memory;
+# they are always up to date, so apply_change has nothing to do.
+
+class SQLiteTableIndex:
+    """TableIndex over an SQLiteTable: prefix searches run on the NOCASE column indexes."""
+    def __init__(self, table):
+        self.fields = SEARCH_FIELDS[table]
+        self.data = None
+
+    def build(self, data):
+        self.data = data
+        return self
+
+    def apply_change(self, key, data):
+        pass
+
+    def search(self, label, text):
+        return self.data.search_prefix(self.fields[label], text)
+
+    def matches(self, label, text):
+        return prefix_matcher(self.fields[label], text)
+
+
+class SQLiteVenueIndex:
+    """VenueIndex over SQLiteTables: a check only decodes the bookings of the venue checked."""
+    def __init__(self):
+        self.tables = {}
+
+    def build(self, tables):
+        self.tables = tables
+        return self
+
+    def apply_change(self, table, key, data):
+        pass
+
+    def conflicts(self, venue, start, end, ignore=None):
+        clashes = []
+        for table, data in self.tables.items():
+            for key, record in data.find("venue", venue).items():
+                slot = booking_slot(record)
+                if slot is not None and slot[0] < end and slot[1] > start and (table, key) != ignore:
+                    clashes.append((table, key) + slot)
+        return sorted(clashes, key=lambda clash: (clash[2], clash[3]))
+
+    def all_conflicts(self):
+        # Comparing every pair of bookings needs all of them anyway
+        return VenueIndex().build(self.tables).all_conflicts()
+
+
+class SQLiteDateIndex:
+    """DateIndex over SQLiteTables: a range query only decodes the records dated in the range.
+
+    Dates are compared as YYYY-MM-DD text, so a date written without leading zeros is not found.
+    """
+    def __init__(self):
+        self.tables = {}
+
+    def build(self, tables):
+        self.tables = tables
+        return self
+
+    def apply_change(self, table, key, data):
+        pass
+
+    def range(self, first_day, last_day):
+        low, high = date.fromordinal(first_day).isoformat(), date.fromordinal(last_day).isoformat()
+        entries = []
+        for table, data in self.tables.items():
+            for key, record in data.find_range("date", low, high).items():
+                day = parse_date(record.get('date', ''))
+                if day is not None:
+                    entries.append((day, table, key))
+        return sorted(entries)
+
+
+def build_table_index(table, data):
+    """The search index of a table: answered by the database for an SQLiteTable, otherwise a TableIndex."""
+    if isinstance(data, SQLiteTable):
+        return SQLiteTableIndex(table).build(data)
+    return TableIndex(table).build(data)
+
+
+def build_venue_index(tables):
+    """The venue booking index over {table name: data} of BOOKING_TABLES, see build_table_index."""
+    if all(isinstance(data, SQLiteTable) for data in tables.values()):
+        return SQLiteVenueIndex().build(tables)
+    return VenueIndex().build(tables)
+
+
+def build_date_index(tables):
+    """The date index over {table name: data} of BOOKING_TABLES, see build_table_index."""
+    if all(isinstance(data, SQLiteTable) for data in tables.values()):
+        return SQLiteDateIndex().build(tables)
+    return DateIndex().build(tables)
+
+
+def import_pickles(db_path=DATABASE_FILE, directory="."):
+    """Copy every existing .pkl table, archived records included, into the database; returns {table name: record count}."""
+    tables = open_repository(db_path)
+    counts = {}
+    for name, file_name in PICKLE_FILES.items():
+        file_path = os.path.join(directory, file_name)
+        data = with_archive(load_data(file_path), file_path)
+        tables[name].bulk_insert(data.items())
+        counts[name] = len(data)
+    tables["employees"].commit()
+    return counts
+
+
+if __name__ == "__main__":
+    # One-shot import: python Repository.py [database file]
+    target = sys.argv[1] if len(sys.argv) > 1 else DATABASE_FILE
+    for table, count in import_pickles(target).items():
+        print(f"Imported {count} {table} into {target}")
@@ -0,0 +1,896 @@
+import os
+import pickle
+import queue
+import shutil
+import struct
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from RecordFormat import FormatError, dumps, is_encoded, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Every table file (e.g. guests.pkl) is a snapshot plus an append-only journal
+# (guests.pkl.journal) of per-record upserts and deletes made since that snapshot.
+JOURNAL_SUFFIX = ".journal"
+
+# Several processes (GUI instances, the CLI, the API server) may share the data files.
+# Writers hold an exclusive lock on guests.pkl.lock, readers a shared one.
+LOCK_SUFFIX = ".lock"
+
+# The journal is folded back into the snapshot once it holds more entries than the table
+# has records (and at least this many), so a single edit costs O(record) amortised I/O.
+COMPACT_MIN_ENTRIES = 1000
+
+# Each journal frame is: payload length, CRC32 of the payload, (op, key, value, version) encoded
+# with RecordFormat. A journal starts with a ("generation", n, None, None) frame naming the
+# snapshot it extends.
+_FRAME_HEADER = struct.Struct("<II")
+
+# Snapshots are _SNAPSHOT_MAGIC followed by three frames: a (tag, generation) header, the records
+# and their versions. Every rewrite of the snapshot increments the generation.
+_SNAPSHOT_MAGIC = b"RFSNAP1\n"
+_SNAPSHOT_TAG = "snapshot"
+
+# Tables saved before RecordFormat are pickles: the same three snapshot parts pickled back to back
+# (or just the pickled records) and pickled journal frames. The first load rewrites such a table in
+# the current format and keeps the pickled files as guests.pkl.legacy and guests.pkl.journal.legacy;
+# nothing else is ever unpickled, and a snapshot that is not RecordFormat after that is damaged.
+LEGACY_SUFFIX = ".legacy"
+
+# A snapshot is written to guests.pkl.tmp, flushed to disk and renamed over guests.pkl, so a crash
+# leaves either the old or the new snapshot. The snapshots it replaces are kept as guests.pkl.bak1
+# (the previous one) to guests.pkl.bakN; a damaged or missing snapshot is restored from the newest
+# intact one on the next load or save.
+TEMPORARY_SUFFIX = ".tmp"
+BACKUP_SUFFIX = ".bak"
+SNAPSHOT_BACKUPS = 3
+
+# What this process last read of each table file, keyed by snapshot path.
+_journal_state = {}
+
+# Generation of every snapshot this process read or wrote, with the (inode, modification time, size)
+# of the file it came from, keyed by snapshot path: saves only read a snapshot again once it changed.
+_generations = {}
+
+
+class ConflictError(Exception):
+    """Raised by save_table when another process saved changes to records this process changed too.
+
+    The other process's version is kept and loaded into the table; all other changes were saved.
+    """
+    def __init__(self, file_path, keys):
+        super().__init__(f"{len(keys)} record(s) were changed by someone else and have been reloaded: "
+                         f"{', '.join(str(key) for key in sorted(keys, key=str))}")
+        self.file_path = file_path
+        self.keys = keys
+
+
+class SnapshotDamagedError(FormatError):
+    """A snapshot file that is missing, truncated or fails its checksum, and has no intact backup."""
+
+
+class _JournalState:
+    # Snapshot generation, bytes of the journal already read and number of entries in it
+    __slots__ = ("generation", "offset", "entries")
+
+    def __init__(self, generation=None, offset=0, entries=0):
+        self.generation = generation
+        self.offset = offset
+        self.entries = entries
+
+
+class ChangeTracker:
+    """Mixin for tables that remember which keys were added, replaced or deleted since the last save.
+
+    Every saved record carries a version number, incremented on each write. A change remembers the
+    version it was made on, so save_table can tell when another process wrote the record meanwhile.
+    The change set is guarded by a lock because the BackgroundWriter drains it on its own thread.
+    """
+    def _init_tracking(self):
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._cleared = False
+        self.versions = {}  # key -> version of the record on disk, for every saved record
+        self._base_versions = {}  # key -> version a pending change was made on
+        self._merged = set()  # keys changed by other processes, see drain_merged
+
+    def _mark(self, key):
+        # Caller holds self._lock
+        self._changed.add(key)
+        self._base_versions.setdefault(key, self.versions.get(key, 0))
+
+    def touch(self, key):
+        # Mark a record that was modified in place (e.g. employee.name = ...) as changed
+        with self._lock:
+            self._mark(key)
+
+    def pending_changes(self):
+        # Number of records waiting to be saved
+        with self._lock:
+            return len(self._changed)
+
+    def drain_changes(self):
+        # Return (op, key, value, base version) for everything changed since the last call,
+        # or None when the table was cleared and needs a full snapshot instead.
+        with self._lock:
+            changed, bases = self._changed, self._base_versions
+            self._changed, self._base_versions = set(), {}
+            if self._cleared:
+                self._cleared = False
+                return None
+            return [("set", key, self[key], bases[key]) if key in self else ("del", key, None, bases[key])
+                    for key in changed]
+
+    def merge_remote(self, entries, drained):
+        """Apply (op, key, value, version) entries saved by other processes.
+
+        drained maps the keys of the local changes being saved to (op, base version). A remote write
+        to a record changed locally since its base version wins; returns the keys of those conflicts.
+        """
+        conflicts = set()
+        with self._lock:
+            for op, key, value, version in entries:
+                if key in drained or key in self._changed:
+                    local_op, base = drained.get(key) or ("set", self._base_versions.get(key, 0))
+                    if version > base and not (op == local_op == "del"):
+                        conflicts.add(key)
+                    self._changed.discard(key)
+                    self._base_versions.pop(key, None)
+                self._apply(op, key, value)
+                if op == "set":
+                    self.versions[key] = version
+                else:
+                    self.versions.pop(key, None)
+                self._merged.add(key)
+        return conflicts
+
+    def saved(self, entries):
+        # Record the versions of (op, key, value, version) entries that reached the disk
+        with self._lock:
+            for op, key, _, version in entries:
+                if op == "set":
+                    self.versions[key] = version
+                else:
+                    self.versions.pop(key, None)
+
+    def drain_merged(self):
+        """Return the keys changed by other processes since the last call, e.g. to refresh their display."""
+        with self._lock:
+            merged, self._merged = self._merged, set()
+        return merged
+
+    def _apply(self, op, key, value):
+        # Store or remove a record without marking it as changed; caller holds self._lock
+        raise NotImplementedError
+
+
+class JournaledDict(ChangeTracker, dict):
+    """Dictionary that tracks its changes so save_table can journal just the changed records."""
+    @classmethod
+    def from_encoded(cls, payload):
+        # The table load_table replays the journal onto: the snapshot's records (None when there is
+        # no snapshot), with no change pending. Other table types loaded by load_table provide this too.
+        data = cls()
+        if payload is not None:
+            dict.update(data, loads(payload))
+        return data
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_tracking()
+        # Records it starts with are unsaved too, as if they had been added one by one
+        with self._lock:
+            for key in dict.keys(self):
+                self._mark(key)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self._mark(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+            self._mark(key)
+
+    def pop(self, key, *default):
+        with self._lock:
+            if key in self:
+                self._mark(key)
+            return super().pop(key, *default)
+
+    def popitem(self):
+        with self._lock:
+            key, value = super().popitem()
+            self._mark(key)
+        return key, value
+
+    # Iterating hands out a copy taken under the lock: save_table merges records saved by other
+    # processes into the table on the BackgroundWriter thread while the GUI may be iterating over it
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self._lock:
+            return list(dict.keys(self))
+
+    def values(self):
+        with self._lock:
+            return list(dict.values(self))
+
+    def items(self):
+        with self._lock:
+            return list(dict.items(self))
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._changed.clear()
+            self._base_versions.clear()
+            self._cleared = True
+
+    def _apply(self, op, key, value):
+        if op == "set":
+            dict.__setitem__(self, key, value)
+        else:
+            dict.pop(self, key, None)
+
+
+@contextmanager
+def file_lock(file_path, shared=False):
+    """Hold the cross-process lock of a table file: shared while reading it, exclusive while writing it.
+
+    Not re-entrant: a thread must not take the lock of a file it already holds.
+    """
+    with open(file_path + LOCK_SUFFIX, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            # msvcrt only has exclusive locks, and LK_LOCK gives up after 10 seconds
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def journal_path(file_path):
+    return file_path + JOURNAL_SUFFIX
+
+
+def _encode_frame(entry):
+    payload = dumps(entry)
+    return _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_frame(file):
+    # The payload of the next frame, or None at the end of the file or at a torn or corrupt frame
+    header = file.read(_FRAME_HEADER.size)
+    if len(header) < _FRAME_HEADER.size:
+        return None
+    length, checksum = _FRAME_HEADER.unpack(header)
+    payload = file.read(length)
+    if len(payload) < length or zlib.crc32(payload) != checksum:
+        return None
+    return payload
+
+
+def backup_paths(file_path):
+    # Newest first
+    return [f"{file_path}{BACKUP_SUFFIX}{number}" for number in range(1, SNAPSHOT_BACKUPS + 1)]
+
+
+def _read_snapshot_part(file, file_path, decode=loads):
+    payload = _read_frame(file)
+    if payload is None:
+        raise SnapshotDamagedError(f"Snapshot {file_path} is truncated or fails its checksum")
+    try:
+        return decode(payload)
+    except FormatError as error:
+        raise SnapshotDamagedError(f"Snapshot {file_path}: {error}") from None
+
+
+def _check_present(file_path):
+    # A snapshot that is gone while its backups are still there was lost mid-rotation or deleted
+    if not os.path.exists(file_path) and any(os.path.exists(path) for path in backup_paths(file_path)):
+        raise SnapshotDamagedError(f"Snapshot {file_path} is missing")
+    return os.path.exists(file_path)
+
+
+def _identity(file):
+    stat = os.fstat(file.fileno())
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _read_generation(file_path):
+    # Generation of the snapshot on disk, reading only its header, and only when the file changed
+    # since this process last read or wrote it
+    if not _check_present(file_path):
+        return 0
+    with open(file_path, 'rb') as file:
+        identity = _identity(file)
+        cached = _generations.get(file_path)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+        if file.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+            raise SnapshotDamagedError(f"Snapshot {file_path} is not in the current format")
+        generation = _read_snapshot_part(file, file_path)[1]
+        # Check the records and versions too (without decoding them): a journal appended to a
+        # damaged snapshot would be lost with it
+        if _read_frame(file) is None or _read_frame(file) is None or file.read(1):
+            raise SnapshotDamagedError(f"Snapshot {file_path} is truncated or fails its checksum")
+    _generations[file_path] = (identity, generation)
+    return generation
+
+
+def changed_on_disk(file_path):
+    """Whether another process may have saved file_path since this process last read or wrote it.
+
+    Only looks at file sizes and times, without taking the lock, so it is cheap enough to poll.
+    """
+    state, cached = _journal_state.get(file_path), _generations.get(file_path)
+    if state is None or cached is None:
+        return True
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return True
+    if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != cached[0]:
+        return True
+    try:
+        return os.path.getsize(journal_path(file_path)) != state.offset
+    except FileNotFoundError:
+        return state.offset != 0
+
+
+def _read_snapshot(file_path, table_type=JournaledDict):
+    # Returns (records as a table_type, versions, generation)
+    if not _check_present(file_path):
+        return table_type.from_encoded(None), {}, 0
+    with open(file_path, 'rb') as file:
+        identity = _identity(file)
+        if file.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+            raise SnapshotDamagedError(f"Snapshot {file_path} is not in the current format")
+        header = _read_snapshot_part(file, file_path)
+        records = _read_snapshot_part(file, file_path, table_type.from_encoded)
+        versions = _read_snapshot_part(file, file_path)
+        if file.read(1):
+            raise SnapshotDamagedError(f"Snapshot {file_path} has unexpected data at its end")
+    _generations[file_path] = (identity, header[1])
+    return records, versions, header[1]
+
+
+def _is_legacy(file_path):
+    # Whether the table was last saved before RecordFormat and has not been migrated since
+    try:
+        with open(file_path, 'rb') as file:
+            snapshot = file.read(len(_SNAPSHOT_MAGIC))
+            if snapshot == _SNAPSHOT_MAGIC:
+                return False
+            snapshot += file.read()
+    except FileNotFoundError:
+        if any(os.path.exists(path) for path in backup_paths(file_path)):
+            return False  # lost while being replaced, which restoring a backup repairs
+        try:
+            with open(journal_path(file_path), 'rb') as file:
+                payload = _read_frame(file)
+        except FileNotFoundError:
+            return False
+        if payload is None or is_encoded(payload):
+            return False
+        snapshot = b""
+    try:
+        with open(file_path + LEGACY_SUFFIX, 'rb') as file:
+            # Migrated before: only the very file that was being migrated (by a process that crashed
+            # before finishing) is migrated again
+            return file.read() == snapshot
+    except FileNotFoundError:
+        return True
+
+
+def _copy_durably(source, target):
+    temporary_path = target + TEMPORARY_SUFFIX
+    if source is None:
+        open(temporary_path, 'wb').close()
+    else:
+        shutil.copyfile(source, temporary_path)
+    with open(temporary_path, 'rb+') as file:
+        os.fsync(file.fileno())
+    os.replace(temporary_path, target)
+
+
+def _migrate_legacy(file_path):
+    """With the exclusive lock held: rewrite a table last saved before RecordFormat in the current format.
+
+    This is the only place data files are unpickled, once per table. The pickled journal is replayed
+    onto the pickled snapshot and the result written as a new snapshot; both pickled files are kept
+    next to it with LEGACY_SUFFIX, the snapshot's copy being written last as the sign that the table
+    was migrated.
+    """
+    records, versions, generation = {}, {}, 0
+    if os.path.exists(file_path):
+        with open(file_path, 'rb') as file:
+            try:
+                header = pickle.load(file)
+                if isinstance(header, tuple) and header[:1] == (_SNAPSHOT_TAG,):
+                    records, versions, generation = pickle.load(file), pickle.load(file), header[1]
+                else:
+                    records = header
+            except Exception as error:  # a truncated pickle can fail in many ways
+                raise SnapshotDamagedError(f"Snapshot {file_path} cannot be read: {error!r}") from None
+    versions = {key: versions.get(key, 0) for key in records}
+    path = journal_path(file_path)
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            payload = _read_frame(file)
+            while payload is not None:
+                op, key, value, *version = pickle.loads(payload)
+                if op == "generation" and key != generation:
+                    break  # extends another snapshot
+                if op == "set":
+                    records[key] = value
+                    versions[key] = versions.get(key, 0) + 1 if not version or version[0] is None else version[0]
+                elif op == "del":
+                    records.pop(key, None)
+                    versions.pop(key, None)
+                payload = _read_frame(file)
+        _copy_durably(path, path + LEGACY_SUFFIX)
+    _copy_durably(file_path if os.path.exists(file_path) else None, file_path + LEGACY_SUFFIX)
+    data = JournaledDict()
+    dict.update(data, records)
+    data.versions = versions
+    _journal_state[file_path] = _JournalState(generation)
+    _write_snapshot(data, file_path)  # replaces the pickled snapshot, which is not kept as a backup
+    print(f"Migrated {file_path} to the current format; the pickled files are kept as {file_path}{LEGACY_SUFFIX}",
+          file=sys.stderr)
+
+
+def _fsync_directory(file_path):
+    # Make a rename durable; directories cannot be opened (or need not be synced) on Windows
+    if os.name == "posix":
+        descriptor = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+def _restore_snapshot(file_path):
+    """With the exclusive lock held: put the newest intact backup in place of a damaged or missing snapshot.
+
+    The damaged file is kept as guests.pkl.damaged, and its journal, unless it extends the backup (the
+    snapshot went missing while being replaced), as guests.pkl.journal.damaged. Processes that still hold the table rewrite the snapshot from memory
+    on their next save (see _catch_up). Raises SnapshotDamagedError when no backup is intact.
+    """
+    for backup in backup_paths(file_path):
+        if not os.path.exists(backup):
+            continue
+        try:
+            _, _, generation = _read_snapshot(backup)
+        except SnapshotDamagedError:
+            continue
+        if os.path.exists(file_path):
+            os.replace(file_path, file_path + ".damaged")
+        if os.path.exists(journal_path(file_path)) and _read_journal(file_path, 0, generation)[2]:
+            os.replace(journal_path(file_path), journal_path(file_path) + ".damaged")
+        temporary_path = file_path + TEMPORARY_SUFFIX
+        shutil.copyfile(backup, temporary_path)
+        with open(temporary_path, 'rb+') as file:
+            os.fsync(file.fileno())
+        os.replace(temporary_path, file_path)
+        _fsync_directory(file_path)
+        print(f"Snapshot {file_path} was damaged or missing; restored generation {generation} from {backup}",
+              file=sys.stderr)
+        return backup
+    raise SnapshotDamagedError(f"Snapshot {file_path} is damaged and none of its backups is intact")
+
+
+def _read_journal(file_path, offset, generation, apply=None):
+    # Read the intact journal entries from offset on; returns (entries, offset after them, stale).
+    # stale means the journal is not the one continued from offset: it belongs to another snapshot
+    # generation or was cut short. Entries written before version stamps get version None.
+    # With apply, each entry is passed to apply(entry) as it is read instead of being returned; a
+    # journal read from its start is found stale at its first frame, before any entry is applied.
+    path = journal_path(file_path)
+    if not os.path.exists(path):
+        return [], 0, offset > 0
+    entries = []
+    collect = entries.append if apply is None else apply
+    with open(path, 'rb') as file:
+        size = file.seek(0, os.SEEK_END)
+        if size < offset:
+            return [], 0, True
+        file.seek(offset)
+        good_offset = offset
+        while True:
+            payload = _read_frame(file)
+            if payload is None:
+                break
+            if not is_encoded(payload):
+                return [], 0, True  # pickled, so already folded into the snapshot by _migrate_legacy
+            op, key, value, *version = loads(payload)
+            if op == "generation":
+                if key != generation:
+                    return [], 0, True
+            else:
+                collect((op, key, value, version[0] if version else None))
+            good_offset = file.tell()
+    if good_offset < size:
+        # A torn frame at the end (crash during append); the next append overwrites it
+        print("Ignoring incomplete journal entry in", path, file=sys.stderr)
+    return entries, good_offset, False
+
+
+def _read_table(file_path, table_type=JournaledDict):
+    # Snapshot plus journal: returns (records as a table_type, versions, _JournalState)
+    records, versions, generation = _read_snapshot(file_path, table_type)
+    versions = {key: versions.get(key, 0) for key in records}
+    applied = 0
+
+    def apply(entry):
+        nonlocal applied
+        op, key, value, version = entry
+        records._apply(op, key, value)
+        if op == "set":
+            versions[key] = versions.get(key, 0) + 1 if version is None else version
+        else:
+            versions.pop(key, None)
+        applied += 1
+
+    with records._lock:
+        _, offset, stale = _read_journal(file_path, 0, generation, apply)
+    if stale:
+        return records, versions, _JournalState(generation)
+    return records, versions, _JournalState(generation, offset, applied)
+
+
+def load_table(file_path, table_type=JournaledDict):
+    """Load a table from its snapshot and replay its journal on top.
+
+    The table is built as a table_type, by default a JournaledDict: a ChangeTracker with a
+    from_encoded(payload) class method (see JournaledDict.from_encoded), so a table kept in another
+    form, such as Columnar.GuestTable, is built straight from the file. Raises FileNotFoundError
+    when neither the snapshot nor the journal exists.
+    """
+    if not any(os.path.exists(path) for path in [file_path, journal_path(file_path)] + backup_paths(file_path)):
+        raise FileNotFoundError(file_path)
+    if _is_legacy(file_path):
+        with file_lock(file_path):
+            if _is_legacy(file_path):
+                _migrate_legacy(file_path)
+    try:
+        with file_lock(file_path, shared=True):
+            data, versions, state = _read_table(file_path, table_type)
+    except SnapshotDamagedError:
+        with file_lock(file_path):
+            try:
+                data, versions, state = _read_table(file_path, table_type)  # another process may have restored it
+            except SnapshotDamagedError:
+                _restore_snapshot(file_path)
+                data, versions, state = _read_table(file_path, table_type)
+    data.versions = versions
+    _journal_state[file_path] = state
+    return data
+
+
+def _catch_up(data, file_path, state):
+    # With the exclusive lock held: return the entries other processes saved since this process
+    # last read the file, as (op, key, value, version), and bring state up to date. Also returns
+    # whether the file went back to an older copy, in which case the snapshot must be rewritten.
+    generation = _read_generation(file_path)
+    if generation == state.generation:
+        entries, offset, stale = _read_journal(file_path, state.offset, generation)
+        if not stale:
+            state.offset = offset
+            state.entries += len(entries)
+            return [(op, key, value, data.versions.get(key, 0) + 1 if version is None else version)
+                    for op, key, value, version in entries], False
+    records, versions, fresh = _read_table(file_path)
+    if state.generation is not None and generation <= state.generation:
+        # Not a newer snapshot but an older one, restored from a backup (or a journal cut short):
+        # records missing from it were lost with the damaged file, not deleted. Keep what is in
+        # memory, take only the records saved on disk since, and write it all as a new snapshot.
+        # A record another process changed after the restore can reach the same version as the
+        # lost write this process knows, so equal versions are told apart by their contents
+        # (records changed here since the last save are left to the usual conflict check).
+        state.offset, state.entries = fresh.offset, fresh.entries
+        with data._lock:
+            pending = set(data._changed)
+        entries = []
+        for key, record in records.items():
+            version, known = versions[key], data.versions.get(key)
+            if known is None or version > known:
+                entries.append(("set", key, record, version))
+            elif version == known and key not in pending and dumps(record) != dumps(data.get(key)):
+                entries.append(("set", key, record, version + 1))
+        return entries, True
+    # The snapshot was rewritten by another process (or never read here): diff against a fresh load
+    state.generation, state.offset, state.entries = fresh.generation, fresh.offset, fresh.entries
+    entries = [("set", key, record, versions[key]) for key, record in records.items()
+               if versions[key] != data.versions.get(key)]
+    entries += [("del", key, None, version + 1) for key, version in list(data.versions.items())
+                if key not in records]
+    return entries, False
+
+
+def _append_journal(file_path, state, entries):
+    # Write entries at the end of what this process has read (cutting off any torn frame)
+    frames = b"".join(_encode_frame(entry) for entry in entries)
+    new_file = not state.offset
+    if not new_file:
+        file = open(journal_path(file_path), 'r+b')
+    else:
+        file = open(journal_path(file_path), 'wb')
+        frames = _encode_frame(("generation", state.generation or 0, None, None)) + frames
+    with file:
+        file.seek(state.offset)
+        file.truncate()
+        file.write(frames)
+        file.flush()
+        os.fsync(file.fileno())
+        state.offset = file.tell()
+    if new_file:
+        _fsync_directory(file_path)
+    state.entries += len(entries)
+    return len(frames)
+
+
+def _write_snapshot(data, file_path):
+    # With the exclusive lock held: rewrite the whole table as the next generation and start an
+    # empty journal; returns the number of bytes written.
+    # items() is copied in one step, so the GUI thread may keep editing while this encodes.
+    records = dict(data.items())
+    versions = getattr(data, "versions", {})
+    state = _journal_state.get(file_path)
+    known = state.generation if state is not None and state.generation is not None else 0
+    try:
+        on_disk, damaged = _read_generation(file_path), False
+    except SnapshotDamagedError:
+        on_disk, damaged = 0, True  # replaced below without becoming a backup
+    generation = max(known, on_disk) + 1
+    payload = _SNAPSHOT_MAGIC + b"".join(_encode_frame(part) for part in (
+        (_SNAPSHOT_TAG, generation), records, {key: versions.get(key, 0) for key in records}))
+    temporary_path = file_path + TEMPORARY_SUFFIX
+    with open(temporary_path, 'wb') as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+        identity = _identity(file)  # renaming the file keeps its inode and modification time
+    # Keep the snapshots this one replaces by renaming them, dropping the oldest; nothing is copied.
+    # A crash between these renames leaves guests.pkl missing, which loading restores from .bak1.
+    backups = backup_paths(file_path)
+    if backups and os.path.exists(file_path) and not damaged:
+        for newer, older in zip(reversed(backups[:-1]), reversed(backups[1:])):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        os.replace(file_path, backups[0])
+    os.replace(temporary_path, file_path)
+    _fsync_directory(file_path)
+    if os.path.exists(journal_path(file_path)):
+        os.remove(journal_path(file_path))
+    _journal_state[file_path] = _JournalState(generation)
+    _generations[file_path] = (identity, generation)
+    return len(payload)
+
+
+def write_snapshot(data, file_path):
+    """Rewrite the whole table file from data, replacing whatever other processes saved."""
+    with file_lock(file_path):
+        return _write_snapshot(data, file_path)
+
+
+def _save_locked(data, file_path, compact=False):
+    # save_table with the exclusive lock held; returns (bytes written, conflicting keys)
+    state = _journal_state.setdefault(file_path, _JournalState())
+    try:
+        remote, rewound = _catch_up(data, file_path, state)
+    except SnapshotDamagedError:
+        _restore_snapshot(file_path)
+        remote, rewound = _catch_up(data, file_path, state)
+    compact = compact or rewound
+    entries = data.drain_changes()
+    if entries is None:
+        return _write_snapshot(data, file_path), set()  # the table was cleared here: that wins
+    conflicts = data.merge_remote(remote, {key: (op, base) for op, key, _, base in entries})
+    entries = [(op, key, value, data.versions.get(key, 0) + 1)
+               for op, key, value, _ in entries if key not in conflicts]
+    try:
+        if compact or state.entries + len(entries) > max(COMPACT_MIN_ENTRIES, len(data)):
+            data.saved(entries)
+            written = _write_snapshot(data, file_path)
+        else:
+            written = _append_journal(file_path, state, entries) if entries else 0
+            data.saved(entries)
+    except OSError:
+        # Keep the records marked as changed so the next save retries them
+        for _, key, _, _ in entries:
+            data.touch(key)
+        raise
+    return written, conflicts
+
+
+def save_table(data, file_path):
+    """Persist the changes made to data since it was loaded or last saved.
+
+    Tables that track their changes (see JournaledDict.drain_changes) only append those records
+    to the journal, after merging in what other processes saved to the file meanwhile; records
+    changed both here and elsewhere raise ConflictError. Anything else is written out as a full
+    snapshot. Returns the number of bytes written.
+    """
+    commit = getattr(data, "commit", None)
+    if commit is not None:
+        # Tables that write through to their own store (see Repository.py) only need committing
+        return commit()
+    if not hasattr(data, "drain_changes"):
+        return write_snapshot(data, file_path)
+    with file_lock(file_path):
+        written, conflicts = _save_locked(data, file_path)
+    if conflicts:
+        raise ConflictError(file_path, conflicts)
+    return written
+
+
+def save_table_locked(data, file_path):
+    """save_table for a caller that already holds file_path's exclusive file_lock, e.g. to save
+    as one step of a larger change no other process may interleave with."""
+    written, conflicts = _save_locked(data, file_path)
+    if conflicts:
+        raise ConflictError(file_path, conflicts)
+    return written
+
+
+def compact_table(data, file_path):
+    """Fold the journal into a fresh snapshot, e.g. before archiving or copying the data files."""
+    if not hasattr(data, "drain_changes"):
+        return write_snapshot(data, file_path)
+    with file_lock(file_path):
+        written, conflicts = _save_locked(data, file_path, compact=True)
+    if conflicts:
+        raise ConflictError(file_path, conflicts)
+    return written
+
+
+# Next free ID of every table, kept next to the data files.
+SEQUENCES_FILE = "sequences.pkl"
+
+
+class SequenceAllocator:
+    """Hands out record IDs per table in O(1); an ID is never handed out twice, even after a delete.
+
+    A table's sequence is seeded once from its highest existing ID and persisted from then on.
+    next_id reserves block_size IDs at a time and hands them out from memory, so only one call in
+    block_size touches the sequence file; IDs left in a block when the process exits are skipped.
+    """
+    def __init__(self, file_path=SEQUENCES_FILE, block_size=1):
+        self.file_path = file_path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}  # table -> range of reserved IDs not handed out yet
+        try:
+            self.next_ids = load_table(file_path)
+        except FileNotFoundError:
+            self.next_ids = JournaledDict()
+
+    def next_id(self, table, data):
+        with self._lock:
+            block = self._blocks.get(table)
+            if block:
+                self._blocks[table] = block[1:]
+                return block[0]
+        block = self.reserve(table, data, self.block_size)
+        with self._lock:
+            self._blocks[table] = block[1:]
+        return block[0]
+
+    def reserve(self, table, data, count):
+        """Reserve a block of count consecutive IDs, e.g. for a bulk import; returns them as a range.
+
+        The sequence is re-read and saved under the file lock, so processes sharing the data
+        files never hand out the same ID.
+        """
+        with self._lock, file_lock(self.file_path):
+            _save_locked(self.next_ids, self.file_path)
+            start = self.next_ids.get(table)
+            if start is None:
+                start = self._seed(data)
+            self.next_ids[table] = start + count
+            _save_locked(self.next_ids, self.file_path)
+        return range(start, start + count)
+
+    def _seed(self, data):
+        max_id = getattr(data, "max_id", None)
+        if max_id is not None:
+            return (max_id() or 0) + 1  # indexed lookup in the SQLite repository
+        return max((int(key) for key in data.keys()), default=0) + 1
+
+
+class BackgroundWriter:
+    """Saves tables on a worker thread so the GUI never waits on disk I/O.
+
+    Edits are coalesced: a table marked dirty is written once no further edit has arrived for
+    `delay` seconds (or at most `max_delay` seconds after the first unsaved edit), however many
+    records changed in between. Failed saves are put on the `errors` queue for the GUI to report.
+    """
+    def __init__(self, save=save_table, delay=0.5, max_delay=5.0):
+        self.save = save
+        self.delay = delay
+        self.max_delay = max_delay
+        self.errors = queue.Queue()
+        self._condition = threading.Condition()
+        self._dirty = {}  # file path -> table waiting to be saved
+        self._first_dirty = None
+        self._deadline = None
+        self._writing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="BackgroundWriter", daemon=True)
+        self._thread.start()
+
+    def schedule_save(self, data, file_path):
+        with self._condition:
+            now = time.monotonic()
+            if not self._dirty:
+                self._first_dirty = now
+            self._dirty[file_path] = data
+            self._deadline = min(now + self.delay, self._first_dirty + self.max_delay)
+            self._condition.notify_all()
+
+    def flush(self):
+        """Write every pending table now and wait until it is on disk."""
+        with self._condition:
+            self._deadline = 0
+            self._condition.notify_all()
+            while self._dirty or self._writing:
+                self._condition.wait()
+
+    def close(self):
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and (not self._dirty or time.monotonic() < self._deadline):
+                    timeout = self._deadline - time.monotonic() if self._dirty else None
+                    self._condition.wait(timeout)
+                if not self._dirty:
+                    return  # closed with nothing left to write
+                batch, self._dirty = self._dirty, {}
+                self._writing = True
+            for file_path, data in batch.items():
+                try:
+                    self.save(data, file_path)
+                except Exception as error:
+                    self.errors.put((file_path, error))
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
@@ -0,0 +1,206 @@
+import tkinter as tk
+from bisect import bisect_left, insort
+from tkinter import ttk
+
+
+class VirtualTreeview(tk.Frame):
+    """Treeview for large tables that only creates items for the rows currently scrolled into view.
+
+    The rows come from a mapping of record ID -> record plus a function turning one record into
+    the tuple of column values, so showing a page costs the same for 100 or 100,000 records.
+    widgets=(tree, scrollbar) stands in for the ttk widgets, e.g. to run without a display; the
+    view is then not a widget itself and master is not used.
+    """
+    def __init__(self, master, columns, height=20, widgets=None):
+        if widgets is None:
+            super().__init__(master)
+            self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height)
+            self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+            self.tree.pack(side=tk.LEFT, expand=True, fill='both')
+            self.scrollbar.pack(side=tk.RIGHT, fill='y')
+        else:
+            self.tree, self.scrollbar = widgets
+
+        self.page_size = height
+        self.first = 0          # position in self.keys of the top visible row
+        self.keys = []          # IDs of every row in display order
+        self.sequence = {}      # record ID -> number it was given when added to self.keys
+        self.removed = []       # sorted numbers of the rows removed since, see _position
+        self.source = {}
+        self.row_values = None
+        self.predicate = None   # record -> bool, when the rows are filtered
+        self.items = {}         # record ID -> Treeview item ID, for the visible rows only
+
+        if widgets is not None:
+            return  # no keyboard or mouse to bind
+        for widget in (self.tree, self.scrollbar):
+            widget.bind("<MouseWheel>", self._on_mousewheel)
+            widget.bind("<Button-4>", self._on_mousewheel)
+            widget.bind("<Button-5>", self._on_mousewheel)
+        self.tree.bind("<Up>", lambda event: self._step_selection(-1))
+        self.tree.bind("<Down>", lambda event: self._step_selection(1))
+        self.tree.bind("<Prior>", lambda event: self.yview("scroll", -1, "pages"))
+        self.tree.bind("<Next>", lambda event: self.yview("scroll", 1, "pages"))
+
+    # The parts of the ttk.Treeview interface the management screens use
+    def heading(self, column, **kwargs):
+        return self.tree.heading(column, **kwargs)
+
+    def column(self, column, **kwargs):
+        return self.tree.column(column, **kwargs)
+
+    def selection(self):
+        return self.tree.selection()
+
+    def item(self, item, option=None, **kwargs):
+        return self.tree.item(item, option, **kwargs)
+
+    def set_rows(self, source, row_values, keys=None, predicate=None):
+        """Show the records of source (all of them, or only the given keys) using row_values(key, record).
+
+        predicate(record) tells whether a record added or modified later belongs among the given keys.
+        """
+        self.source = source
+        self.row_values = row_values
+        self.keys = list(source.keys() if keys is None else keys)
+        self.sequence = {key: number for number, key in enumerate(self.keys)}
+        self.removed = []
+        self.predicate = None if keys is None else predicate
+        self.first = max(0, min(self.first, len(self.keys) - self.page_size))
+        self._render()
+
+    def filter(self, keys=None, predicate=None):
+        """Show only the given record IDs (or every record again when keys is None), from the top.
+
+        predicate(record) is the filter the keys were chosen by, applied to records changed from now on.
+        """
+        self.first = 0
+        self.set_rows(self.source, self.row_values, keys, predicate)
+
+    def apply_change(self, key):
+        """Reflect one added, modified or deleted record, touching at most two Treeview items."""
+        if key in self.source:
+            self._upsert(key)
+        else:
+            self._remove(key)
+        self._update_scrollbar()
+
+    def _insert(self, key, index="end"):
+        self.items[key] = self.tree.insert("", index, values=self.row_values(key, self.source[key]))
+
+    def _upsert(self, key):
+        if self.predicate is not None and not self.predicate(self.source[key]):
+            self._remove(key)  # no longer matches the filter, if it ever did
+        elif key in self.items:
+            self.tree.item(self.items[key], values=self.row_values(key, self.source[key]))
+        elif key not in self.sequence:
+            self.sequence[key] = len(self.keys) + len(self.removed)
+            self.keys.append(key)
+            if len(self.keys) - self.first <= self.page_size:
+                self._insert(key)
+
+    def _position(self, key):
+        # Rows are only ever appended or removed, so a row's position is its number less the
+        # number of rows removed before it
+        number = self.sequence[key]
+        return number - bisect_left(self.removed, number)
+
+    def _remove(self, key):
+        if key not in self.sequence:
+            return
+        position = self._position(key)
+        del self.keys[position]
+        insort(self.removed, self.sequence.pop(key))
+        if position < self.first:
+            self.first -= 1  # a row above the window went away; the visible rows stay the same
+        elif key in self.items:
+            self.tree.delete(self.items.pop(key))
+            end = self.first + self.page_size - 1
+            if end < len(self.keys):
+                # Pull the next row up into the window
+                self._insert(self.keys[end])
+            elif self.first > 0:
+                # Already at the bottom: scroll back one row to keep the window full
+                self.first -= 1
+                self._insert(self.keys[self.first], 0)
+
+    def selected_keys(self):
+        by_item = {item: key for key, item in self.items.items()}
+        return [by_item[item] for item in self.tree.selection() if item in by_item]
+
+    def _render(self):
+        selected = self.selected_keys()
+        self.tree.delete(*self.tree.get_children())
+        self.items = {}
+        for key in self.keys[self.first:self.first + self.page_size]:
+            self._insert(key)
+        self.tree.selection_set([self.items[key] for key in selected if key in self.items])
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.keys)
+        if total <= self.page_size:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first / total, (self.first + self.page_size) / total)
+
+    def yview(self, *args):
+        # Scrollbar command: ("moveto", fraction) or ("scroll", count, "units"/"pages")
+        if args[0] == "moveto":
+            first = int(float(args[1]) * len(self.keys))
+        else:
+            step = self.page_size if args[2] == "pages" else 1
+            first = self.first + int(args[1]) * step
+        first = max(0, min(first, len(self.keys) - self.page_size))
+        if first != self.first:
+            self.first = first
+            self._render()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        return self.yview("scroll", direction * 3, "units")
+
+    def _step_selection(self, direction):
+        # Let the arrow keys move past the visible window instead of stopping at its edge
+        selected = self.selected_keys()
+        if not selected or not self.keys:
+            return None
+        visible = self.keys[self.first:self.first + self.page_size]
+        position = self.first + visible.index(selected[0]) + direction
+        if 0 <= position < len(self.keys) and not self.first <= position < self.first + len(visible):
+            self.yview("scroll", direction, "units")
+            key = self.keys[position]
+            if key in self.items:
+                self.tree.selection_set(self.items[key])
+                self.tree.focus(self.items[key])
+            return "break"
+        return None
+
+
+class SearchBar(tk.Frame):
+    """Search box with a field selector that calls command(field label, text) as the user types."""
+    def __init__(self, master, fields, command):
+        super().__init__(master)
+        self.command = command
+        tk.Label(self, text="Search:").pack(side=tk.LEFT)
+        self.field_var = tk.StringVar(value=fields[0])
+        field_dropdown = ttk.Combobox(self, textvariable=self.field_var, state="readonly", values=fields, width=14)
+        field_dropdown.pack(side=tk.LEFT, padx=5)
+        field_dropdown.bind("<<ComboboxSelected>>", self._changed)
+        self.text_var = tk.StringVar()
+        entry = tk.Entry(self, textvariable=self.text_var)
+        entry.pack(side=tk.LEFT, expand=True, fill='x')
+        entry.bind("<KeyRelease>", self._changed)
+        tk.Button(self, text="Clear", command=self.clear).pack(side=tk.LEFT, padx=5)
+
+    def clear(self):
+        self.text_var.set("")
+        self._changed()
+
+    def search(self):
+        # Run the current search again, e.g. after the table was reloaded
+        self._changed()
+
+    def _changed(self, event=None):
+        self.command(self.field_var.get(), self.text_var.get())
@@ -0,0 +1,90 @@
+import pytest
+
+import RecordFormat
+from Classes import Event, EventType, Guest, Supplier
+from RecordFormat import FormatError, dumps, loads, loads_columns, migration, register_record
+
+
+def fields(record):
+    return {field: getattr(record, field) for field in RecordFormat._RECORDS[type(record)].fields}
+
+
+def events(count):
+    return {key: Event(key, list(EventType)[key % 4], f"Theme {key % 3}", f"2025-01-{key % 28 + 1:02d}", "18:00",
+                       key % 5 + 0.5, key % 7 or None, guest_list=[key, key + 1][:key % 3], invoice=key * 10,
+                       client_id=key if key % 2 else None, suppliers=[f"Supplier {key}"] * (key % 2))
+            for key in range(1, count + 1)}
+
+
+def test_table_of_records_round_trips():
+    table = events(100)
+    decoded = loads(dumps(table))
+    assert list(decoded) == list(table)
+    assert all(type(decoded[key]) is Event and fields(decoded[key]) == fields(table[key]) for key in table)
+
+
+def test_table_of_dicts_round_trips():
+    table = {key: {"type": "Wedding" if key % 2 else None, "budget": key * 1.5, "flag": key % 3 == 0,
+                   "count": key - 50, "tags": ["a"] * (key % 4), "text": f"line\0{key}"}
+             for key in range(100)}
+    assert loads(dumps(table)) == table
+
+
+def test_columns_keep_values_that_compare_equal_apart():
+    table = {key: {"value": [1, True, 1.0, 0.0, -0.0, 2 ** 70, "1"][key % 7]} for key in range(70)}
+    decoded = loads(dumps(table))
+    assert [(type(record["value"]), repr(record["value"])) for record in decoded.values()] == \
+           [(type(record["value"]), repr(record["value"])) for record in table.values()]
+
+
+def test_table_decodes_to_columns():
+    table = {key: Guest(key, f"First {key % 5}", "Last", f"guest{key}@example.com", key % 3 or None)
+             for key in range(1, 41)}
+    keys, columns = loads_columns(dumps(table), Guest)
+    assert keys == list(table)
+    assert columns == {field: [getattr(guest, field) for guest in table.values()] for field in Guest.__slots__}
+    assert loads_columns(dumps(dict(list(table.items())[:3])), Guest) is None  # too small to be a table
+
+
+def test_small_and_mixed_dicts_are_not_tables():
+    for table in ({key: Supplier(key, "S", "", "x") for key in range(3)},
+                  {**{key: Supplier(key, "S", "", "x") for key in range(20)}, 20: {"name": "S"}}):
+        decoded = loads(dumps(table))
+        assert {key: type(value) for key, value in decoded.items()} == {key: type(value) for key, value in table.items()}
+
+
+def test_table_written_with_an_older_schema_is_migrated():
+    class Badge:
+        __slots__ = ("badge_id", "label", "colour")
+
+    register_record(Badge, ("badge_id", "label"))
+    old = dumps({key: _badge(Badge, key) for key in range(20)})
+
+    @migration("Badge", 1)
+    def add_colour(values):
+        return {**values, "colour": "blue" if values["badge_id"] % 2 else "red"}
+
+    register_record(Badge, ("badge_id", "label", "colour"), version=2)
+    decoded = loads(old)
+    assert [(badge.label, badge.colour) for badge in decoded.values()][:2] == [("Badge 0", "red"), ("Badge 1", "blue")]
+
+
+def _badge(cls, key):
+    badge = cls.__new__(cls)
+    badge.badge_id, badge.label = key, f"Badge {key}"
+    return badge
+
+
+def test_format_version_1_still_decodes():
+    guest = Guest(7, "Ada", "Lovelace", "ada@example.com", 3)
+    version_1 = dumps([guest, {"name": "Ada"}, {"name": "Bob"}])  # no tables, so nothing version 1 lacks
+    version_1 = version_1[:len(RecordFormat.MAGIC)] + bytes([1]) + version_1[len(RecordFormat.MAGIC) + 1:]
+    decoded = loads(version_1)
+    assert fields(decoded[0]) == fields(guest) and decoded[1:] == [{"name": "Ada"}, {"name": "Bob"}]
+
+
+def test_truncated_table_is_rejected():
+    encoded = dumps(events(50))
+    for end in (len(encoded) // 3, len(encoded) - 1):
+        with pytest.raises(FormatError):
+            loads(encoded[:end])
@@ -0,0 +1,296 @@
+import os
+import pickle
+import sqlite3
+import struct
+import subprocess
+import sys
+import zlib
+
+import pytest
+
+from Classes import Supplier
+from Repository import open_repository
+from Storage import (LEGACY_SUFFIX, TEMPORARY_SUFFIX, JournaledDict, SnapshotDamagedError, backup_paths,
+                     compact_table, journal_path, load_table, save_table)
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exit status of a child process that was made to crash on purpose
+CRASHED = 17
+
+
+def supplier(key, name=None):
+    return Supplier(key, name or f"Supplier {key}", f"supplier{key}@example.com", "Catering")
+
+
+def names(data):
+    return {key: record.name for key, record in data.items()}
+
+
+def first_names(count):
+    return {key: f"Supplier {key}" for key in range(1, count + 1)}
+
+
+@pytest.fixture
+def table(tmp_path):
+    """A table saved as three snapshots of 4, 8 and 12 records plus two journaled edits.
+
+    Returns its path and {key: name} as it stands; .bak1 holds the 8-record and .bak2 the 4-record snapshot.
+    """
+    file_path = str(tmp_path / "suppliers.pkl")
+    data = JournaledDict()
+    for count in (4, 8, 12):
+        for key in range(len(data) + 1, count + 1):
+            data[key] = supplier(key)
+        compact_table(data, file_path)
+    data[1] = supplier(1, "Edited")
+    data[13] = supplier(13)
+    save_table(data, file_path)
+    return file_path, names(data)
+
+
+def flip_byte(file_path, position=None):
+    with open(file_path, 'r+b') as file:
+        size = file.seek(0, os.SEEK_END)
+        file.seek(size // 2 if position is None else position)
+        byte = file.read(1)
+        file.seek(-1, os.SEEK_CUR)
+        file.write(bytes([byte[0] ^ 0xFF]))
+
+
+def truncate(file_path):
+    with open(file_path, 'r+b') as file:
+        file.truncate(file.seek(0, os.SEEK_END) // 2)
+
+
+def run_child(file_path, crash=""):
+    # Load the table in another process, set up the crash, then rename record 1 and compact
+    script = "\n".join([
+        "import os, sys",
+        f"sys.path.insert(0, {REPOSITORY!r})",
+        "import Storage",
+        "from Classes import Supplier",
+        crash,
+        f"data = Storage.load_table({file_path!r})",
+        "data[1] = Supplier(1, 'Child', '', 'Catering')",
+        f"Storage.compact_table(data, {file_path!r})",
+    ])
+    return subprocess.run([sys.executable, "-c", script], capture_output=True, text=True).returncode
+
+
+# Crashes while a snapshot is being replaced
+
+def test_crash_while_writing_temporary_file_keeps_old_snapshot(table):
+    file_path, expected = table
+    crash = ("def crash(descriptor):\n"
+             "    os.ftruncate(descriptor, os.fstat(descriptor).st_size // 2)\n"
+             f"    os._exit({CRASHED})\n"
+             "os.fsync = crash")
+    assert run_child(file_path, crash) == CRASHED
+    assert os.path.exists(file_path + TEMPORARY_SUFFIX)
+    data = load_table(file_path)
+    assert names(data) == expected
+
+    data[2] = supplier(2, "After crash")
+    compact_table(data, file_path)
+    assert names(load_table(file_path)) == {**expected, 2: "After crash"}
+
+
+def test_crash_between_renames_restores_previous_snapshot_and_journal(table):
+    file_path, expected = table
+    crash = ("replace = os.replace\n"
+             "def crash(source, target):\n"
+             f"    if source.endswith({TEMPORARY_SUFFIX!r}):\n"
+             f"        os._exit({CRASHED})\n"
+             "    replace(source, target)\n"
+             "os.replace = crash")
+    assert run_child(file_path, crash) == CRASHED
+    assert not os.path.exists(file_path)
+    # The snapshot moved to .bak1 and its journal still applies to it
+    assert names(load_table(file_path)) == expected
+    assert not os.path.exists(journal_path(file_path) + ".damaged")
+
+
+def test_crash_after_rename_before_journal_removal(table):
+    file_path, expected = table
+    assert run_child(file_path, f"os.remove = lambda path: os._exit({CRASHED})") == CRASHED
+    # The new snapshot is in place; the old journal belongs to the previous generation and is ignored
+    assert names(load_table(file_path)) == {**expected, 1: "Child"}
+
+
+def test_crash_while_appending_to_journal(table):
+    file_path, expected = table
+    with open(journal_path(file_path), 'ab') as file:
+        file.write(b"\x40\x00\x00\x00\x01\x02")  # a frame header promising more than follows
+    data = load_table(file_path)
+    assert names(data) == expected
+
+    data[3] = supplier(3, "After torn frame")
+    save_table(data, file_path)
+    assert names(load_table(file_path)) == {**expected, 3: "After torn frame"}
+
+
+# Damaged or missing snapshots and backups
+
+@pytest.mark.parametrize("damage", [truncate, flip_byte, os.remove], ids=["truncated", "corrupt", "missing"])
+def test_damaged_snapshot_is_restored_from_newest_backup(table, damage):
+    file_path, _ = table
+    damage(file_path)
+    assert names(load_table(file_path)) == first_names(8)
+    if damage is not os.remove:
+        assert os.path.exists(file_path + ".damaged")
+        assert os.path.exists(journal_path(file_path) + ".damaged")
+    # The restored snapshot is intact on disk for the next process too
+    assert names(load_table(file_path)) == first_names(8)
+
+
+@pytest.mark.parametrize("damage", [truncate, flip_byte, os.remove], ids=["truncated", "corrupt", "missing"])
+def test_damaged_backup_is_skipped(table, damage):
+    file_path, _ = table
+    flip_byte(file_path)
+    damage(backup_paths(file_path)[0])
+    assert names(load_table(file_path)) == first_names(4)
+
+
+def test_no_intact_copy_raises(table):
+    file_path, _ = table
+    flip_byte(file_path)
+    for backup in backup_paths(file_path):
+        if os.path.exists(backup):
+            truncate(backup)
+    with pytest.raises(SnapshotDamagedError):
+        load_table(file_path)
+
+
+def test_damaged_snapshot_is_not_appended_to(table):
+    file_path, expected = table
+    data = load_table(file_path)
+    flip_byte(file_path, position=os.path.getsize(file_path) - 1)  # in the versions frame, past the header
+    data[5] = supplier(5, "Saved over damage")
+    save_table(data, file_path)
+    # The save restored the backup and rewrote the snapshot from memory instead of journaling onto it
+    assert names(load_table(file_path)) == {**expected, 5: "Saved over damage"}
+
+
+# Recovery while another process holds the table
+
+def test_restore_by_another_process_does_not_delete_records(table):
+    file_path, expected = table
+    data = load_table(file_path)
+    flip_byte(file_path)
+    script = (f"import sys; sys.path.insert(0, {REPOSITORY!r}); import Classes, Storage; "
+              f"print(len(Storage.load_table({file_path!r})))")
+    restored = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    assert restored.stdout.split()[-1] == "8"
+
+    data[2] = supplier(2, "Edited after restore")
+    save_table(data, file_path)
+    assert names(data) == {**expected, 2: "Edited after restore"}
+    assert names(load_table(file_path)) == names(data)
+
+
+def test_records_saved_by_another_process_after_restore_are_merged(table):
+    file_path, expected = table
+    data = load_table(file_path)
+    flip_byte(file_path)
+    assert run_child(file_path) == 0  # restores the backup, then saves its own edit to record 1
+
+    data[6] = supplier(6, "Edited here")
+    save_table(data, file_path)
+    assert names(load_table(file_path)) == {**expected, 1: "Child", 6: "Edited here"}
+
+
+# Tables saved before RecordFormat
+
+def pickled_frame(entry):
+    payload = pickle.dumps(entry)
+    return struct.pack("<II", len(payload), zlib.crc32(payload)) + payload
+
+
+@pytest.fixture
+def legacy_table(tmp_path):
+    """A pickled snapshot of 4 records at generation 2 and a pickled journal extending it."""
+    file_path = str(tmp_path / "suppliers.pkl")
+    records = {key: supplier(key) for key in range(1, 5)}
+    with open(file_path, 'wb') as file:
+        for part in (("snapshot", 2), records, {key: 1 for key in records}):
+            pickle.dump(part, file)
+    with open(journal_path(file_path), 'wb') as file:
+        for entry in (("generation", 2, None, None), ("set", 2, supplier(2, "Journaled"), 2), ("del", 4, None, 2)):
+            file.write(pickled_frame(entry))
+    return file_path, {1: "Supplier 1", 2: "Journaled", 3: "Supplier 3"}
+
+
+def test_legacy_table_is_migrated_once(legacy_table):
+    file_path, expected = legacy_table
+    with open(file_path, 'rb') as file:
+        pickled = file.read()
+    data = load_table(file_path)
+    assert names(data) == expected and data.versions == {1: 1, 2: 2, 3: 1}
+    with open(file_path + LEGACY_SUFFIX, 'rb') as file:
+        assert file.read() == pickled
+    assert os.path.exists(journal_path(file_path) + LEGACY_SUFFIX)
+    assert not os.path.exists(journal_path(file_path))
+
+    data[5] = supplier(5)
+    save_table(data, file_path)
+    assert names(load_table(file_path)) == {**expected, 5: "Supplier 5"}
+
+
+def test_pickle_written_after_migration_is_not_loaded(legacy_table):
+    file_path, _ = legacy_table
+    load_table(file_path)
+    with open(file_path, 'wb') as file:
+        pickle.dump({1: supplier(1, "Planted")}, file)
+    with pytest.raises(SnapshotDamagedError):
+        load_table(file_path)  # nothing to restore: the migration kept no backup
+
+
+def test_crash_during_migration_migrates_again(legacy_table):
+    file_path, expected = legacy_table
+    script = "\n".join([
+        "import os, sys",
+        f"sys.path.insert(0, {REPOSITORY!r})",
+        "import Classes, Storage",
+        f"Storage._write_snapshot = lambda data, file_path: os._exit({CRASHED})",
+        f"Storage.load_table({file_path!r})",
+    ])
+    assert subprocess.run([sys.executable, "-c", script]).returncode == CRASHED
+    assert os.path.exists(file_path + LEGACY_SUFFIX)
+    assert names(load_table(file_path)) == expected
+
+
+def test_pickled_rows_are_reencoded_once(tmp_path):
+    db_path = str(tmp_path / "management.db")
+    suppliers = open_repository(db_path)["suppliers"]
+    suppliers[1] = supplier(1)
+    suppliers.commit()
+    connection = sqlite3.connect(db_path)
+    connection.execute("UPDATE suppliers SET record = ? WHERE id = 1", (pickle.dumps(supplier(1, "Pickled")),))
+    connection.execute("PRAGMA user_version = 0")
+    connection.commit()
+    connection.close()
+    assert open_repository(db_path)["suppliers"][1].name == "Pickled"
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT substr(record, 1, 4) FROM suppliers").fetchone()[0] == b"RFMT"
+
+
+# Tables built in memory
+
+def test_records_passed_to_the_constructor_are_saved(tmp_path):
+    file_path = str(tmp_path / "suppliers.pkl")
+    save_table(JournaledDict({key: supplier(key) for key in range(1, 4)}), file_path)
+    assert names(load_table(file_path)) == first_names(3)
+
+
+# Records merged in from other processes
+
+def test_merging_while_iterating_does_not_break_the_iteration():
+    # save_table merges on the BackgroundWriter thread while the GUI may be iterating the table
+    data = JournaledDict({key: supplier(key) for key in range(1, 4)})
+    seen = []
+    for key, record in data.items():
+        data.merge_remote([("set", key + 10, supplier(key + 10), 1), ("del", key, None, 1)], {})
+        seen.append(record.name)
+    assert seen == ["Supplier 1", "Supplier 2", "Supplier 3"]
+    assert sorted(data) == [11, 12, 13]